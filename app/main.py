@@ -1,82 +1,106 @@
-import io
+import asyncio
+import hmac
+import json
 import os
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 import torch
-import torch.nn as nn
-from torchvision import transforms
-from PIL import Image
-
-# Optional runtime install of CLIP if missing, similar to notebook behavior
-try:
-    import clip  # type: ignore
-except Exception:
+
+from configs.logger import get_logger, shutdown_logging
+from src.api.backends import BACKENDS, EagerBackend, InferenceBackend, load_exported_backend
+from src.api.batching import MicroBatcher
+from src.api.cache import PredictionCache, content_key, head_version
+from src.api.execution import ExecutionConfig, ExecutionLayer, decode_and_preprocess_timed
+from src.api.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ServingMetrics
+from src.api.uploads import UploadLimitError, expand_uploads
+from src.models.clip_classifier import CLIPClassifier, IMG_SIZE, build_preprocess
+from src.models.package import load_packaged_classifier
+from src.models.precision import apply_inference_precision
+from src.training.checkpoint import load_checkpoint
+from src.utils.profiling import TorchProfiler
+
+
+logger = get_logger(__name__)
+
+
+def _import_clip():
+    """Import CLIP, only needed when no packaged model file is available."""
     try:
-        import subprocess, sys
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'git+https://github.com/openai/CLIP.git'])
         import clip  # type: ignore
-    except Exception as e:
+    except ImportError:
         clip = None  # We will raise a clear error at startup
+    return clip
 
 
 app = FastAPI(title="Real vs Fake Face Classifier API")
 
 DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 MODEL_PATH = Path(__file__).resolve().parents[1] / 'models' / 'best_model.pth'
-IMG_SIZE = 224
-
-
-class CLIPClassifier(nn.Module):
-    """CLIP visual backbone (frozen) + small linear head for binary classification."""
-    def __init__(self, clip_model, freeze_backbone: bool = True):
-        super().__init__()
-        self.clip_visual = clip_model.visual
-        self.clip_visual.eval()
-
-        if freeze_backbone:
-            for p in self.clip_visual.parameters():
-                p.requires_grad = False
-
-        clip_dim = 768  # CLIP ViT-L/14 visual output dim
-        self.head = nn.Sequential(
-            nn.Linear(clip_dim, 64),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(64, 32),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(32, 1),
-            nn.Sigmoid(),
-        )
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
-        # Match dtype expected by CLIP visual encoder
-        x = x.to(self.clip_visual.conv1.weight.dtype)
-        with torch.no_grad():
-            features = self.clip_visual(x)
-        out = self.head(features.float())  # [B, 1]
-        return out.view(-1)  # [B]
+# Visual encoder + head written by src.models.package: memory-mapped, no CLIP package or text tower needed.
+# Used by the eager backend when present, otherwise CLIP ViT-L/14 + MODEL_PATH are loaded.
+PACKAGED_MODEL_PATH = Path(os.environ.get('PACKAGED_MODEL_PATH', str(MODEL_PATH.parent / 'classifier_visual.pt')))
 
+# Head-only checkpoint (src.training.checkpoint) recombined with the packaged backbone, replacing its head.
+# Checked against the backbone it was trained on; leave unset to serve the packaged head.
+HEAD_CHECKPOINT_PATH = os.environ.get('HEAD_CHECKPOINT_PATH') or None
 
-def build_preprocess() -> transforms.Compose:
-    """Validation-style preprocessing used during training in the notebook."""
-    return transforms.Compose([
-        transforms.Resize(IMG_SIZE),
-        transforms.CenterCrop(IMG_SIZE),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.48145466, 0.4578275, 0.40821073],
-                             std=[0.26862954, 0.26130258, 0.27577711]),
-    ])
+# Images in the warmup batch run before /ready reports ready (0 skips warmup)
+WARMUP_BATCH_SIZE = int(os.environ.get('WARMUP_BATCH_SIZE', 1))
 
+# Micro-batching limits: a batch is flushed when full or when its oldest request has waited this long
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 10))
 
-@app.on_event('startup')
-async def startup_event():
+# /predict_batch: images per forward pass and upper bound on images per request
+PREDICT_BATCH_SIZE = int(os.environ.get('PREDICT_BATCH_SIZE', BATCH_MAX_SIZE))
+PREDICT_BATCH_MAX_IMAGES = int(os.environ.get('PREDICT_BATCH_MAX_IMAGES', 1000))
+# Upper bound on the image bytes one /predict_batch request may expand to (uploads plus archive members)
+PREDICT_BATCH_MAX_BYTES = int(os.environ.get('PREDICT_BATCH_MAX_BYTES', 256 * 1024 * 1024))
+
+# Serving backend: eager PyTorch, or a graph exported by src.models.export (no CLIP package needed)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'eager').lower()
+EXPORT_PATH = os.environ.get('EXPORT_PATH', str(MODEL_PATH.parent / 'exported' / 'classifier.onnx'))
+
+# Backbone inference precision for the eager backend: fp32, bf16 (autocast) or int8 (dynamic quantization, CPU only)
+INFERENCE_PRECISION = os.environ.get('INFERENCE_PRECISION', 'fp32')
+
+# Prediction cache keyed by upload hash: 0 entries disables it, CACHE_DIR enables the on-disk tier
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_DIR = os.environ.get('CACHE_DIR') or None
+
+# torch.profiler sampling of /predict requests (traces in logs/profiles); 0 leaves it to POST /admin/profile
+PROFILE_REQUESTS = float(os.environ.get('PROFILE_REQUESTS', 0))
+PROFILE_TRACES = int(os.environ.get('PROFILE_TRACES', 1))
+
+# Token expected in the X-Admin-Token header of /admin endpoints; unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') or None
+
+
+def _load_eager_backend() -> EagerBackend:
+    if PACKAGED_MODEL_PATH.exists():
+        try:
+            model = load_packaged_classifier(PACKAGED_MODEL_PATH, DEVICE)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load packaged model from {PACKAGED_MODEL_PATH}: {e}")
+        if HEAD_CHECKPOINT_PATH:
+            try:
+                load_checkpoint(model, HEAD_CHECKPOINT_PATH, DEVICE)
+            except Exception as e:
+                raise RuntimeError(f"Failed to load head checkpoint from {HEAD_CHECKPOINT_PATH}: {e}")
+        apply_inference_precision(model, INFERENCE_PRECISION)
+        return EagerBackend(model, DEVICE)
+
+    clip = _import_clip()
     if clip is None:
-        raise RuntimeError("CLIP library is not available and auto-install failed.")
+        raise RuntimeError(
+            f"No packaged model at {PACKAGED_MODEL_PATH} and the CLIP library is not installed. "
+            "Run `python -m src.models.package` or install CLIP."
+        )
 
     # Load CLIP model
     clip_model, _ = clip.load("ViT-L/14", device=DEVICE)
@@ -88,51 +112,182 @@ async def startup_event():
         raise RuntimeError(f"Model checkpoint not found at: {MODEL_PATH}")
 
     try:
-        checkpoint = torch.load(MODEL_PATH, map_location=DEVICE)
-        state_dict = checkpoint.get('model_state_dict', checkpoint)
-        model.load_state_dict(state_dict)
+        # Head-only checkpoints are recombined with the CLIP backbone loaded above
+        load_checkpoint(model, MODEL_PATH, DEVICE)
         model.eval()
     except Exception as e:
         raise RuntimeError(f"Failed to load model weights: {e}")
 
+    apply_inference_precision(model, INFERENCE_PRECISION)
+    return EagerBackend(model, DEVICE)
+
+
+def _load_backend(execution_config: ExecutionConfig) -> InferenceBackend:
+    if INFERENCE_BACKEND == 'eager':
+        return _load_eager_backend()
+    try:
+        return load_exported_backend(INFERENCE_BACKEND, EXPORT_PATH, execution_config.inference_threads)
+    except Exception as e:
+        raise RuntimeError(f"Failed to load exported model from {EXPORT_PATH}: {e}")
+
+
+async def _initialize(execution: ExecutionLayer) -> None:
+    """Load the model and run a warmup batch on the inference thread, then mark the app ready."""
+    loop = asyncio.get_running_loop()
+    try:
+        start = loop.time()
+        backend = await execution.run_inference(_load_backend, execution.config)
+        load_seconds = loop.time() - start
+        backend.metrics = app.state.metrics
+
+        # First forward pass faults in the mapped weights and allocates the working buffers
+        if WARMUP_BATCH_SIZE > 0:
+            warmup = torch.zeros(WARMUP_BATCH_SIZE, 3, IMG_SIZE, IMG_SIZE)
+            await execution.run_inference(backend.infer, warmup)
+        warmup_seconds = loop.time() - start - load_seconds
+
+        batcher = MicroBatcher(
+            backend.infer,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            executor=execution.inference_executor,
+        )
+        await batcher.start()
+    except Exception as e:
+        logger.error("Model initialization failed: %s", e)
+        app.state.load_error = str(e)
+        return
+
     # Attach to app state
-    app.state.model = model
+    app.state.backend = backend
+    app.state.model = getattr(backend, 'model', None)
+    app.state.cache = None
+    if CACHE_MAX_ENTRIES > 0:
+        app.state.cache = PredictionCache(CACHE_MAX_ENTRIES, CACHE_DIR, head_version(backend.head))
+    app.state.startup_seconds = {'load': round(load_seconds, 3), 'warmup': round(warmup_seconds, 3)}
+    app.state.batcher = batcher
+    logger.info("Model ready: load %.2fs, warmup %.2fs", load_seconds, warmup_seconds)
+
+
+def _build_metrics() -> ServingMetrics:
+    metrics = ServingMetrics()
+    metrics.add_gauge('api_model_ready', "1 once the model is loaded and warmed up",
+                      lambda: float(getattr(app.state, 'batcher', None) is not None))
+    metrics.add_gauge('api_batch_queue_depth', "Requests waiting for the micro-batcher",
+                      lambda: float(app.state.batcher.queue_depth if getattr(app.state, 'batcher', None) else 0))
+    return metrics
+
+
+@app.on_event('startup')
+async def startup_event():
+    if INFERENCE_BACKEND not in BACKENDS:
+        raise RuntimeError(f"Unknown INFERENCE_BACKEND '{INFERENCE_BACKEND}', expected one of {BACKENDS}")
+
+    # Decode/preprocess pool and dedicated inference worker, off the event loop
+    execution = ExecutionLayer(ExecutionConfig.from_env())
+
     app.state.preprocess = build_preprocess()
+    app.state.execution = execution
+    app.state.backend = None
+    app.state.batcher = None
+    app.state.cache = None
+    app.state.load_error = None
+    app.state.metrics = _build_metrics()
+    app.state.profiler = TorchProfiler()
+    if PROFILE_REQUESTS > 0:
+        app.state.profiler.arm_requests(PROFILE_REQUESTS, PROFILE_TRACES)
+    # The server accepts connections while the model loads; /ready turns 200 once it has warmed up
+    app.state.init_task = asyncio.create_task(_initialize(execution))
 
 
-@app.post('/predict')
-async def predict(file: UploadFile = File(...)) -> Dict:
-    """
-    Predict whether the uploaded image is Real (0) or Fake (1).
-    Returns predicted class, confidence, and class probabilities.
-    """
-    # Validate content type
-    if not file.content_type or not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image.")
+@app.on_event('shutdown')
+async def shutdown_event():
+    init_task = getattr(app.state, 'init_task', None)
+    if init_task is not None and not init_task.done():
+        init_task.cancel()
+    batcher = getattr(app.state, 'batcher', None)
+    if batcher is not None:
+        await batcher.stop()
+    cache = getattr(app.state, 'cache', None)
+    if cache is not None:
+        cache.close()
+    execution = getattr(app.state, 'execution', None)
+    if execution is not None:
+        execution.shutdown()
+    profiler = getattr(app.state, 'profiler', None)
+    if profiler is not None:
+        profiler.close()
+    # Write out records still queued when LOG_QUEUE=1
+    shutdown_logging()
 
-    try:
+
+async def _cached_prob_fake(key: str) -> Optional[float]:
+    """Fake probability from the cache, re-running only the head if it changed since caching."""
+    cache: Optional[PredictionCache] = getattr(app.state, 'cache', None)
+    if cache is None:
+        return None
+
+    if cache.disk_dir is None:
+        entry = cache.get(key)
+    else:
+        entry = await asyncio.get_running_loop().run_in_executor(None, cache.get, key)
+    if entry is None:
+        return None
+
+    if cache.is_stale(entry):
+        def rerun_head() -> float:
+            backend: InferenceBackend = app.state.backend
+            return float(backend.classify(torch.from_numpy(entry.feature).unsqueeze(0)).item())
+
+        prob_fake = await app.state.execution.run_inference(rerun_head)
+        cache.put(key, entry.feature, prob_fake, head_recompute=True)
+        return prob_fake
+    return entry.prob_fake
+
+
+async def _decode(execution: ExecutionLayer, content: bytes) -> torch.Tensor:
+    """Decode and preprocess on the decode pool, recording both stage timings."""
+    tensor, decode_seconds, preprocess_seconds = await execution.run_decode(decode_and_preprocess_timed, content)
+    metrics: ServingMetrics = app.state.metrics
+    metrics.observe_stage('decode', decode_seconds)
+    metrics.observe_stage('preprocess', preprocess_seconds)
+    return tensor
+
+
+async def _read_upload(file: UploadFile, endpoint: str) -> bytes:
+    metrics: ServingMetrics = app.state.metrics
+    with metrics.stage_seconds['upload_read'].time():
         content = await file.read()
-        image = Image.open(io.BytesIO(content)).convert('RGB')
+    metrics.request_bytes[endpoint].observe(len(content))
+    return content
+
+
+def _predict_unbatched(content: bytes) -> Optional[Tuple[torch.Tensor, float]]:
+    """Decode and score one upload on the calling thread, bypassing the micro-batcher (profiled requests)."""
+    try:
+        tensor, decode_seconds, preprocess_seconds = decode_and_preprocess_timed(content)
     except Exception:
-        raise HTTPException(status_code=400, detail="Invalid image file.")
+        return None
+    metrics: ServingMetrics = app.state.metrics
+    metrics.observe_stage('decode', decode_seconds)
+    metrics.observe_stage('preprocess', preprocess_seconds)
+    features, probs = app.state.backend.infer(tensor.unsqueeze(0))
+    return features[0], float(probs[0])
 
-    # Preprocess
-    preprocess = getattr(app.state, 'preprocess', None)
-    model = getattr(app.state, 'model', None)
-    if preprocess is None or model is None:
-        raise HTTPException(status_code=503, detail="Model not initialized.")
 
-    tensor = preprocess(image).unsqueeze(0).to(DEVICE)  # [1, 3, H, W]
+def _store_prediction(key: str, feature: torch.Tensor, prob_fake: float) -> None:
+    cache: Optional[PredictionCache] = getattr(app.state, 'cache', None)
+    if cache is not None:
+        cache.put(key, feature.numpy(), prob_fake)
 
-    with torch.no_grad():
-        output = model(tensor)  # [1]
-        prob_fake = float(output.item())
-        prob_real = 1.0 - prob_fake
-        pred_label = 1 if prob_fake > 0.5 else 0
-        predicted_class = 'Fake' if pred_label == 1 else 'Real'
-        confidence = max(prob_fake, prob_real)
 
-    return JSONResponse({
+def format_prediction(prob_fake: float) -> Dict:
+    """Turn the model's fake probability into the API response payload."""
+    prob_real = 1.0 - prob_fake
+    pred_label = 1 if prob_fake > 0.5 else 0
+    predicted_class = 'Fake' if pred_label == 1 else 'Real'
+    confidence = max(prob_fake, prob_real)
+    return {
         'predicted_label': pred_label,
         'predicted_class': predicted_class,
         'confidence': round(confidence, 6),
@@ -140,4 +295,245 @@ async def predict(file: UploadFile = File(...)) -> Dict:
             'Real': round(prob_real, 6),
             'Fake': round(prob_fake, 6)
         }
-    })
+    }
+
+
+@app.post('/predict')
+async def predict(file: UploadFile = File(...)) -> Dict:
+    """
+    Predict whether the uploaded image is Real (0) or Fake (1).
+    Returns predicted class, confidence, and class probabilities.
+    """
+    metrics: ServingMetrics = app.state.metrics
+    metrics.request_started('predict')
+    try:
+        # Validate content type
+        if not file.content_type or not file.content_type.startswith('image/'):
+            metrics.error('predict', 'not_an_image')
+            raise HTTPException(status_code=400, detail="File must be an image.")
+
+        execution = getattr(app.state, 'execution', None)
+        batcher = getattr(app.state, 'batcher', None)
+        if execution is None or batcher is None:
+            metrics.error('predict', 'not_ready')
+            raise HTTPException(status_code=503, detail="Model not initialized.")
+
+        content = await _read_upload(file, 'predict')
+
+        # Repeated uploads skip decode and backbone entirely
+        key = content_key(content)
+        prob_fake = await _cached_prob_fake(key)
+        if prob_fake is not None:
+            return JSONResponse(format_prediction(prob_fake))
+
+        profiler: TorchProfiler = app.state.profiler
+        if profiler.sample_request():
+            # Sampled: the whole request runs under torch.profiler on the inference thread
+            prediction = await execution.run_inference(profiler.profile_call, 'predict', _predict_unbatched, content)
+            if prediction is None:
+                metrics.error('predict', 'invalid_image')
+                raise HTTPException(status_code=400, detail="Invalid image file.")
+            feature, prob_fake = prediction
+        else:
+            try:
+                # [3, H, W]; decoded on the decode pool, batched with concurrent requests
+                tensor = await _decode(execution, content)
+            except Exception:
+                metrics.error('predict', 'invalid_image')
+                raise HTTPException(status_code=400, detail="Invalid image file.")
+
+            try:
+                feature, output = await batcher.submit(tensor)
+            except Exception:
+                metrics.error('predict', 'inference')
+                raise
+            prob_fake = float(output.item())
+        _store_prediction(key, feature, prob_fake)
+
+        return JSONResponse(format_prediction(prob_fake))
+    finally:
+        metrics.request_finished('predict')
+
+
+@app.get('/health')
+async def health() -> Dict:
+    """Liveness: the process is up, whether or not the model has loaded."""
+    return {'status': 'ok'}
+
+
+@app.get('/ready')
+async def ready() -> JSONResponse:
+    """Readiness: 200 once the model is loaded and warmed up, 503 before that or if loading failed."""
+    load_error = getattr(app.state, 'load_error', None)
+    if getattr(app.state, 'batcher', None) is None:
+        detail = {'ready': False, 'status': 'failed' if load_error else 'loading'}
+        if load_error:
+            detail['error'] = load_error
+        return JSONResponse(detail, status_code=503)
+    return JSONResponse({'ready': True, 'backend': app.state.backend.name, 'startup_seconds': app.state.startup_seconds})
+
+
+@app.get('/stats/batching')
+async def batching_stats() -> Dict:
+    """Queue depth and batch size statistics of the micro-batcher."""
+    batcher = getattr(app.state, 'batcher', None)
+    if batcher is None:
+        raise HTTPException(status_code=503, detail="Model not initialized.")
+
+    stats = batcher.stats.snapshot()
+    stats['queue_depth'] = batcher.queue_depth
+    stats['max_batch_size'] = batcher.max_batch_size
+    stats['max_wait_ms'] = batcher.max_wait_s * 1000.0
+    stats['execution'] = app.state.execution.describe()
+    stats['backend'] = app.state.backend.describe()
+    return stats
+
+
+@app.get('/stats/cache')
+async def cache_stats() -> Dict:
+    """Hit/miss/eviction counters of the prediction cache."""
+    cache = getattr(app.state, 'cache', None)
+    if cache is None:
+        return {'enabled': False}
+    return {'enabled': True, **cache.stats()}
+
+
+@app.get('/metrics')
+async def metrics() -> Response:
+    """Per-stage latency histograms and request/error counters in the Prometheus text format."""
+    return Response(app.state.metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def _check_admin(token: Optional[str]) -> None:
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled, set ADMIN_TOKEN.")
+    if not hmac.compare_digest((token or '').encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+@app.get('/admin/profile')
+async def profile_status(x_admin_token: Optional[str] = Header(None)) -> Dict:
+    """Armed profiling sessions and the traces written so far."""
+    _check_admin(x_admin_token)
+    return app.state.profiler.status()
+
+
+@app.post('/admin/profile')
+async def start_profiling(fraction: float = 0.1, traces: int = 1, x_admin_token: Optional[str] = Header(None)) -> Dict:
+    """Profile a fraction of the next /predict requests until `traces` of them were profiled."""
+    _check_admin(x_admin_token)
+    try:
+        app.state.profiler.arm_requests(fraction, traces)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return app.state.profiler.status()
+
+
+@app.delete('/admin/profile')
+async def stop_profiling(x_admin_token: Optional[str] = Header(None)) -> Dict:
+    """Cancel the armed profiling sessions."""
+    _check_admin(x_admin_token)
+    app.state.profiler.disarm()
+    return app.state.profiler.status()
+
+
+async def _stream_batch_predictions(items: List[Tuple[str, bytes]], execution: ExecutionLayer, batcher: MicroBatcher):
+    """Decode chunks concurrently and yield one NDJSON line per image as each chunk finishes."""
+    metrics: ServingMetrics = app.state.metrics
+    async def prepare_or_lookup(content: bytes):
+        key = content_key(content)
+        prob_fake = await _cached_prob_fake(key)
+        if prob_fake is not None:
+            return key, prob_fake
+        return key, await _decode(execution, content)
+
+    def start_decoding(start: int):
+        chunk = items[start:start + PREDICT_BATCH_SIZE]
+        return [asyncio.ensure_future(prepare_or_lookup(content)) for _, content in chunk]
+
+    pending = start_decoding(0)
+    for start in range(0, len(items), PREDICT_BATCH_SIZE):
+        decoded = await asyncio.gather(*pending, return_exceptions=True)
+        # Decode the next chunk while this one runs through the model
+        if start + PREDICT_BATCH_SIZE < len(items):
+            pending = start_decoding(start + PREDICT_BATCH_SIZE)
+
+        results: List[Dict] = []
+        to_infer = []
+        for offset, prepared in enumerate(decoded):
+            index = start + offset
+            result = {'index': index, 'filename': items[index][0]}
+            if isinstance(prepared, Exception):
+                metrics.error('predict_batch', 'invalid_image')
+                result['error'] = "Invalid image file."
+            elif isinstance(prepared[1], float):
+                result.update(format_prediction(prepared[1]))
+            else:
+                to_infer.append((offset, *prepared))
+            results.append(result)
+
+        if to_infer:
+            try:
+                features, outputs = await batcher.run_batch(torch.stack([tensor for _, _, tensor in to_infer]))
+                for row, (offset, key, _) in enumerate(to_infer):
+                    prob_fake = float(outputs[row].item())
+                    _store_prediction(key, features[row], prob_fake)
+                    results[offset].update(format_prediction(prob_fake))
+            except Exception:
+                metrics.error('predict_batch', 'inference', len(to_infer))
+                for offset, _, _ in to_infer:
+                    results[offset]['error'] = "Inference failed."
+
+        for result in results:
+            yield json.dumps(result) + '\n'
+
+
+async def _finish_when_streamed(lines, endpoint: str):
+    """Keep a streaming request counted as in flight until its last line is sent."""
+    try:
+        async for line in lines:
+            yield line
+    finally:
+        app.state.metrics.request_finished(endpoint)
+
+
+@app.post('/predict_batch')
+async def predict_batch(files: List[UploadFile] = File(...)) -> StreamingResponse:
+    """
+    Predict Real (0) / Fake (1) for many images in one request.
+    Accepts multiple image files and/or zip/tar archives of images.
+    Streams one JSON object per image (NDJSON) as each batch finishes.
+    """
+    metrics: ServingMetrics = app.state.metrics
+    metrics.request_started('predict_batch')
+    try:
+        execution = getattr(app.state, 'execution', None)
+        batcher = getattr(app.state, 'batcher', None)
+        if execution is None or batcher is None:
+            metrics.error('predict_batch', 'not_ready')
+            raise HTTPException(status_code=503, detail="Model not initialized.")
+
+        # Uploads are read up front: they are closed once this handler returns
+        uploads = [(file.filename or f'file_{i}', file.content_type, await _read_upload(file, 'predict_batch'))
+                   for i, file in enumerate(files)]
+        try:
+            # Archive expansion decompresses: on the decode pool, bounded by the image count and byte limits
+            items = await execution.run_decode(
+                expand_uploads, uploads, PREDICT_BATCH_MAX_IMAGES, PREDICT_BATCH_MAX_BYTES)
+        except UploadLimitError as e:
+            metrics.error('predict_batch', e.reason)
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            metrics.error('predict_batch', 'invalid_upload')
+            raise HTTPException(status_code=400, detail=str(e))
+        if not items:
+            metrics.error('predict_batch', 'no_images')
+            raise HTTPException(status_code=400, detail="No images found in upload.")
+    except BaseException:
+        metrics.request_finished('predict_batch')
+        raise
+
+    return StreamingResponse(
+        _finish_when_streamed(_stream_batch_predictions(items, execution, batcher), 'predict_batch'),
+        media_type='application/x-ndjson',
+    )
@@ -0,0 +1,199 @@
+"""
+In-process load generator for the FastAPI app.
+
+Starts app.main inside this process (httpx's ASGI transport, no socket or
+uvicorn worker), with a randomly initialized stand-in classifier packaged to a
+temporary file unless --packaged points at a real one. For each concurrency
+level, that many clients send requests back to back (closed loop) until
+--requests requests were answered, and the run reports requests/sec and
+latency percentiles. The mean time per serving stage comes from the app's own
+/metrics histograms, and the mean micro-batch size from /stats/batching.
+
+Uploads are distinct synthetic JPEGs and the prediction cache is off by
+default (--cache turns it on), so every request runs the full decode and
+model path. The app's environment variables (BATCH_MAX_SIZE,
+INFERENCE_THREADS, ...) apply as when serving.
+
+Usage:
+    python -m benchmarks.api_bench --concurrency 1 8 32 --requests 200 --output benchmarks/results/api.json
+    python -m benchmarks.api_bench --endpoint predict_batch --batch-images 16 --concurrency 2
+"""
+import argparse
+import asyncio
+import io
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from PIL import Image
+
+from benchmarks.common import STAND_IN_VIT, build_stand_in_classifier, make_report, percentile, write_report
+from benchmarks.process_bench import parse_size, synthetic_image
+from src.models.package import package_classifier
+
+
+ENDPOINTS = ('predict', 'predict_batch')
+_STAGE_SAMPLE = re.compile(r'^api_stage_seconds_(sum|count)\{stage="(\w+)"\} (\S+)$')
+
+
+def make_uploads(count: int, size: str, seed: int) -> List[bytes]:
+    """Distinct JPEG uploads, so neither the cache nor the decoder sees the same bytes twice"""
+    width, height = parse_size(size)
+    uploads = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        Image.fromarray(synthetic_image(width, height, seed + i)).save(buffer, 'JPEG', quality=90)
+        uploads.append(buffer.getvalue())
+    return uploads
+
+
+def parse_stage_totals(metrics_text: str) -> Dict[str, Dict[str, float]]:
+    """{stage: {'sum': seconds, 'count': n}} from the /metrics exposition"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for line in metrics_text.splitlines():
+        match = _STAGE_SAMPLE.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            totals.setdefault(stage, {})[kind] = float(value)
+    return totals
+
+
+def _stage_means(before: Dict, after: Dict) -> Dict[str, float]:
+    means = {}
+    for stage, total in after.items():
+        count = total['count'] - before.get(stage, {}).get('count', 0)
+        if count:
+            means[stage] = round((total['sum'] - before.get(stage, {}).get('sum', 0.0)) / count * 1e3, 3)
+    return means
+
+
+async def _wait_ready(client, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        response = await client.get('/ready')
+        if response.status_code == 200:
+            return
+        if response.json().get('status') == 'failed':
+            raise RuntimeError(f"Model failed to load: {response.json()}")
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"App not ready after {timeout}s")
+
+
+async def _run_level(client, endpoint: str, uploads: List[bytes], concurrency: int, requests: int,
+                     batch_images: int) -> Dict:
+    """Closed loop: concurrency clients, each sending its next request when the previous one returns"""
+    latencies: List[float] = []
+    errors = 0
+    sent = 0
+
+    def next_files(i: int):
+        if endpoint == 'predict':
+            return {'file': ('image.jpg', uploads[i % len(uploads)], 'image/jpeg')}
+        return [('files', (f'image_{j}.jpg', uploads[(i * batch_images + j) % len(uploads)], 'image/jpeg'))
+                for j in range(batch_images)]
+
+    async def worker():
+        nonlocal sent, errors
+        while sent < requests:
+            i = sent
+            sent += 1
+            start = time.perf_counter()
+            response = await client.post(f'/{endpoint}', files=next_files(i))
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    stages_before = parse_stage_totals((await client.get('/metrics')).text)
+    batching_before = (await client.get('/stats/batching')).json()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    stages_after = parse_stage_totals((await client.get('/metrics')).text)
+    batching_after = (await client.get('/stats/batching')).json()
+    batches = batching_after['batches'] - batching_before['batches']
+
+    images = len(latencies) * (1 if endpoint == 'predict' else batch_images)
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'requests_per_sec': round(len(latencies) / seconds, 2),
+        'images_per_sec': round(images / seconds, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1e3, 3),
+        'p90_ms': round(percentile(latencies, 90) * 1e3, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1e3, 3),
+        'max_ms': round(max(latencies) * 1e3, 3),
+        'stage_mean_ms': _stage_means(stages_before, stages_after),
+        # Micro-batcher only (/predict); /predict_batch runs its own fixed-size batches
+        'micro_batches': batches,
+        'mean_micro_batch_size': round((batching_after['requests'] - batching_before['requests']) / batches, 3)
+        if batches else None,
+    }
+
+
+async def run_load(
+    endpoint: str,
+    concurrency_levels: Sequence[int],
+    requests: int,
+    uploads: List[bytes],
+    batch_images: int = 8,
+    warmup_requests: int = 8,
+    ready_timeout: float = 300.0,
+) -> Dict[str, Dict]:
+    """Results keyed '<endpoint>/c<concurrency>'; the app must be configured through the environment first"""
+    import httpx
+    from app.main import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+            await _wait_ready(client, ready_timeout)
+            await _run_level(client, endpoint, uploads, 1, warmup_requests, batch_images)
+            for concurrency in concurrency_levels:
+                results[f'{endpoint}/c{concurrency}'] = await _run_level(
+                    client, endpoint, uploads, concurrency, requests, batch_images)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="In-process load test of the API: latency percentiles and requests/sec")
+    parser.add_argument('--endpoint', default='predict', choices=ENDPOINTS)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help="Concurrent clients per level")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument('--batch-images', type=int, default=8, help="Images per /predict_batch request")
+    parser.add_argument('--image-size', default='640x480', help="Upload size as WIDTHxHEIGHT")
+    parser.add_argument('--unique-images', type=int, default=64, help="Distinct uploads to cycle through")
+    parser.add_argument('--packaged', default=None, help="Packaged model to serve (default: random stand-in)")
+    parser.add_argument('--cache', action='store_true', help="Keep the prediction cache on")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="JSON report path")
+    args = parser.parse_args(argv)
+
+    uploads = make_uploads(args.unique_images, args.image_size, args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        packaged = args.packaged
+        if packaged is None:
+            packaged = str(package_classifier(build_stand_in_classifier(seed=args.seed), Path(tmp_dir) / 'stand_in.pt'))
+        # app.main reads its configuration at import time
+        os.environ['PACKAGED_MODEL_PATH'] = packaged
+        os.environ.pop('HEAD_CHECKPOINT_PATH', None)
+        if not args.cache:
+            os.environ['CACHE_MAX_ENTRIES'] = '0'
+        results = asyncio.run(run_load(args.endpoint, args.concurrency, args.requests, uploads, args.batch_images))
+
+    config = {'endpoint': args.endpoint, 'concurrency': args.concurrency, 'requests': args.requests,
+              'batch_images': args.batch_images, 'image_size': args.image_size,
+              'unique_images': args.unique_images, 'model': args.packaged or {'stand_in': STAND_IN_VIT},
+              'cache': args.cache, 'seed': args.seed,
+              'app_env': {key: os.environ[key] for key in sorted(os.environ)
+                          if key.startswith(('BATCH_', 'DECODE_', 'INFERENCE_', 'INTEROP_', 'PREDICT_BATCH_'))}}
+    write_report(make_report('api', config, results), args.output)
+
+
+if __name__ == "__main__":
+    main()
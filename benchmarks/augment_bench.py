@@ -0,0 +1,115 @@
+"""
+Per-image cost of random_augmentation_pipeline, sequential vs fused.
+
+Runs both modes on the same images with the same random draws and reports
+microseconds per image, the speedup and how close the outputs are. The
+`all-ops` scenario forces every augmentation on (worst case); `default` uses
+the pipeline's own probabilities. Gaussian noise is applied identically in
+both modes and dominates its cost, so `all-ops-no-noise` isolates the fused
+geometric and photometric steps.
+
+Usage:
+    python -m benchmarks.augment_bench --size 256 --images 200
+    python -m benchmarks.augment_bench --image-dir data/processed/sample_1pct/celeba --images 200
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from benchmarks.common import make_report, write_report
+import src.process.augment_images as augment_images
+from src.process.augment_images import random_augmentation_pipeline
+from src.process.resize_images import load_image_with_opencv, resize_short_side
+
+
+def load_images(image_dir: Optional[str], count: int, size: int, seed: int) -> List[np.ndarray]:
+    """Real images from a folder, or smooth random images of size x size"""
+    if image_dir:
+        paths = sorted(p for p in Path(image_dir).rglob('*') if p.suffix.lower() in {'.jpg', '.jpeg', '.png'})[:count]
+        return [resize_short_side(load_image_with_opencv(str(p)), size) for p in paths]
+
+    rng = np.random.default_rng(seed)
+    return [cv2.GaussianBlur(rng.integers(0, 256, (size, size, 3), dtype=np.uint8), (0, 0), 2) for _ in range(count)]
+
+
+def _run_once(images: List[np.ndarray], fused: bool, seed: int):
+    random.seed(seed)
+    np.random.seed(seed)
+    start = time.perf_counter()
+    outputs = [random_augmentation_pipeline(image, fused=fused) for image in images]
+    return outputs, time.perf_counter() - start
+
+
+def _run_pair(images: List[np.ndarray], seed: int, repeats: int) -> Dict[str, Dict]:
+    """Best time of each mode; the modes alternate so machine drift affects both alike"""
+    runs = {False: {'seconds': float('inf')}, True: {'seconds': float('inf')}}
+    for _ in range(repeats):
+        for fused in (False, True):
+            outputs, seconds = _run_once(images, fused, seed)
+            runs[fused]['outputs'] = outputs
+            runs[fused]['seconds'] = min(runs[fused]['seconds'], seconds)
+    for run in runs.values():
+        run['us_per_image'] = run['seconds'] / len(images) * 1e6
+    return {'sequential': runs[False], 'fused': runs[True]}
+
+
+def benchmark(images: List[np.ndarray], seed: int = 42, repeats: int = 5) -> Dict[str, Dict]:
+    results = {}
+    default_prob = augment_images.AUGMENT_PROB
+    add_noise = augment_images.augment_add_noise
+    scenarios = (
+        ('default', default_prob, add_noise),
+        ('all-ops', 1.0, add_noise),
+        ('all-ops-no-noise', 1.0, lambda image_array, std_dev=0.0: image_array),
+    )
+    for scenario, prob, noise_fn in scenarios:
+        augment_images.AUGMENT_PROB = prob
+        augment_images.augment_add_noise = noise_fn
+        try:
+            runs = _run_pair(images, seed, repeats)
+            sequential, fused = runs['sequential'], runs['fused']
+        finally:
+            augment_images.AUGMENT_PROB = default_prob
+            augment_images.augment_add_noise = add_noise
+
+        diffs = [np.abs(a.astype(np.int16) - b.astype(np.int16)) for a, b in zip(sequential['outputs'], fused['outputs'])]
+        results[scenario] = {
+            'images': len(images),
+            'sequential_us_per_image': round(sequential['us_per_image'], 1),
+            'fused_us_per_image': round(fused['us_per_image'], 1),
+            'speedup': round(sequential['us_per_image'] / fused['us_per_image'], 2),
+            'identical_outputs': round(float(np.mean([not d.any() for d in diffs])), 3),
+            'mean_abs_pixel_diff': round(float(np.mean([d.mean() for d in diffs])), 3),
+            'mean_intensity_sequential': round(float(np.mean([o.mean() for o in sequential['outputs']])), 2),
+            'mean_intensity_fused': round(float(np.mean([o.mean() for o in fused['outputs']])), 2),
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs fused image augmentation")
+    parser.add_argument('--image-dir', default=None, help="Folder of real images (default: synthetic images)")
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--size', type=int, default=256, help="Short side of the benchmark images")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--threads', type=int, default=1, help="OpenCV threads")
+    parser.add_argument('--output', default=None, help="JSON report path")
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(args.threads)
+    images = load_images(args.image_dir, args.images, args.size, args.seed)
+    results = benchmark(images, seed=args.seed, repeats=args.repeats)
+
+    config = {'image_dir': args.image_dir, 'images': args.images, 'size': args.size, 'repeats': args.repeats,
+              'seed': args.seed, 'threads': args.threads}
+    write_report(make_report('augment', config, results), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Shared pieces of the benchmark suite: timing, environment capture, JSON reports
+and the randomly initialized stand-in classifier.
+
+Every report has the same layout, so two runs (e.g. before and after a
+commit) can be diffed with benchmarks.compare:
+
+    {"benchmark": "model", "environment": {...}, "config": {...},
+     "results": {"<case>": {"<metric>": value, ...}, ...}}
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import torch
+
+from src.models.clip_classifier import CLIPClassifier
+from src.models.vision_transformer import VisionTransformer
+
+
+# Same layout as CLIP's ViT (224 input, 768-d output for build_head), a fraction of the compute
+STAND_IN_VIT = {
+    'input_resolution': 224,
+    'patch_size': 32,
+    'width': 256,
+    'layers': 4,
+    'heads': 4,
+    'output_dim': 768,
+}
+
+
+def build_stand_in_classifier(vit_config: Optional[Dict] = None, seed: int = 0) -> CLIPClassifier:
+    """CLIPClassifier over a randomly initialized VisionTransformer; runs offline, no CLIP download"""
+    torch.manual_seed(seed)
+    visual = VisionTransformer(**(vit_config or STAND_IN_VIT))
+    model = CLIPClassifier(SimpleNamespace(visual=visual), freeze_backbone=True)
+    return model.eval()
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    return float(np.percentile(np.asarray(values, dtype=np.float64), q))
+
+
+def summarize(seconds: Sequence[float], scale: float = 1e6, unit: str = 'us') -> Dict[str, float]:
+    """Median, p90, min and mean of per-call times, in unit (scale per second)"""
+    return {
+        f'median_{unit}': round(percentile(seconds, 50) * scale, 3),
+        f'p90_{unit}': round(percentile(seconds, 90) * scale, 3),
+        f'min_{unit}': round(min(seconds) * scale, 3),
+        f'mean_{unit}': round(float(np.mean(seconds)) * scale, 3),
+    }
+
+
+def time_calls(fn: Callable[[], object], repeats: int, warmup: int = 1, min_seconds: float = 0.0) -> List[float]:
+    """
+    Seconds per call of fn over repeats timed calls, after warmup untimed calls
+
+    With min_seconds, keeps calling past repeats until that much time was spent,
+    so very fast functions get enough samples for a stable median.
+    """
+    for _ in range(warmup):
+        fn()
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < repeats or time.perf_counter() - start < min_seconds:
+        call_start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - call_start)
+    return timings
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parents[1], timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def environment() -> Dict:
+    """Commit, library versions and thread settings, to tell apart runs that are not comparable"""
+    import cv2
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'torch': torch.__version__,
+        'torch_threads': torch.get_num_threads(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'opencv_threads': cv2.getNumThreads(),
+        'cuda': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+    }
+
+
+def make_report(benchmark: str, config: Dict, results: Dict[str, Dict]) -> Dict:
+    return {'benchmark': benchmark, 'environment': environment(), 'config': config, 'results': results}
+
+
+def write_report(report: Dict, output: Optional[Union[str, Path]]) -> None:
+    """Print the report and, with output, save it as JSON"""
+    print(json.dumps(report, indent=2))
+    if output:
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,87 @@
+"""
+Compare two benchmark reports and flag regressions.
+
+Reports are the JSON files written by the benchmarks (--output) or a
+benchmarks.run_all folder; cases present in both are compared on their
+headline metrics: median/p99 times (lower is better) and images or
+requests per second (higher is better). A change worse than --threshold is
+a regression, and --fail makes the exit status non-zero when there is one.
+Differences in the environment (CPU count, threads, library versions) are
+printed first, since they make the numbers incomparable.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/3f2c1ab benchmarks/results/603d387
+    python -m benchmarks.compare old/model.json new/model.json --threshold 0.05 --fail
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LOWER_IS_BETTER = ('median_us', 'median_ms', 'p50_ms', 'p99_ms', 'sequential_us_per_image', 'fused_us_per_image')
+HIGHER_IS_BETTER = ('images_per_sec', 'requests_per_sec')
+# Environment fields that have to match for a fair comparison
+ENVIRONMENT_KEYS = ('cpu_count', 'processor', 'torch', 'torch_threads', 'numpy', 'opencv', 'opencv_threads', 'cuda')
+
+
+def load_reports(path: str) -> Dict[str, Dict]:
+    """{benchmark name: report} of a report file or a folder of report files"""
+    path = Path(path)
+    files = sorted(path.glob('*.json')) if path.is_dir() else [path]
+    reports = {}
+    for file in files:
+        with open(file, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        reports[report['benchmark']] = report
+    return reports
+
+
+def compare_results(old: Dict[str, Dict], new: Dict[str, Dict], threshold: float) -> List[Tuple]:
+    """(case, metric, old, new, relative change, regressed) for the headline metrics of shared cases"""
+    rows = []
+    for case in old:
+        if case not in new:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            before, after = old[case].get(metric), new[case].get(metric)
+            if not before or after is None:
+                continue
+            change = after / before - 1
+            worse = change if metric in LOWER_IS_BETTER else -change
+            rows.append((case, metric, before, after, change, worse > threshold))
+    return rows
+
+
+def environment_diff(old: Dict, new: Dict) -> Dict[str, Tuple]:
+    return {key: (old.get(key), new.get(key)) for key in ENVIRONMENT_KEYS if old.get(key) != new.get(key)}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs and report regressions")
+    parser.add_argument('old', help="Baseline report file or folder")
+    parser.add_argument('new', help="Candidate report file or folder")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument('--fail', action='store_true', help="Exit with status 1 when something regressed")
+    args = parser.parse_args(argv)
+
+    old_reports, new_reports = load_reports(args.old), load_reports(args.new)
+    regressions = 0
+    for name in sorted(set(old_reports) & set(new_reports)):
+        old, new = old_reports[name], new_reports[name]
+        print(f"== {name}: {old['environment'].get('git_commit')} -> {new['environment'].get('git_commit')}")
+        for key, (before, after) in environment_diff(old['environment'], new['environment']).items():
+            print(f"   environment differs: {key} {before} -> {after}")
+
+        for case, metric, before, after, change, regressed in compare_results(old['results'], new['results'],
+                                                                              args.threshold):
+            regressions += regressed
+            flag = 'REGRESSION' if regressed else ''
+            print(f"   {case:<48} {metric:<17} {before:>12} -> {after:>12} {change:+8.1%} {flag}")
+
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    if args.fail and regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Forward throughput of CLIPClassifier at several batch sizes, offline.
+
+The backbone is a randomly initialized VisionTransformer (src.models.
+vision_transformer) instead of CLIP's pretrained ViT-L/14, so no weights are
+downloaded: the default stand-in keeps CLIP's input and output shapes at a
+fraction of the compute, --vit-l14 uses the real architecture (random
+weights, same cost as the served model). Each batch size and precision
+reports milliseconds per batch and images/sec.
+
+Usage:
+    python -m benchmarks.model_bench --batch-sizes 1 8 32 --output benchmarks/results/model.json
+    python -m benchmarks.model_bench --vit-l14 --batch-sizes 1 8 --precisions fp32 bf16
+"""
+import argparse
+from typing import Dict, List, Optional, Sequence
+
+import torch
+
+from benchmarks.common import STAND_IN_VIT, build_stand_in_classifier, make_report, summarize, time_calls, write_report
+from src.models.precision import PRECISIONS, apply_inference_precision
+from src.models.vision_transformer import VIT_L_14
+
+
+@torch.inference_mode()
+def benchmark(
+    vit_config: Dict,
+    batch_sizes: Sequence[int] = (1, 8, 32),
+    precisions: Sequence[str] = ('fp32',),
+    repeats: int = 10,
+    device: torch.device = torch.device('cpu'),
+    seed: int = 0,
+) -> Dict[str, Dict]:
+    """Per-batch timings keyed '<precision>/batch_<size>'"""
+    results = {}
+    for precision in precisions:
+        # Precisions change the model in place (int8 swaps modules), so each gets a fresh copy
+        model = apply_inference_precision(build_stand_in_classifier(vit_config, seed).to(device), precision)
+        resolution = vit_config['input_resolution']
+        for batch_size in batch_sizes:
+            generator = torch.Generator().manual_seed(seed)
+            batch = torch.randn(batch_size, 3, resolution, resolution, generator=generator).to(device)
+
+            def forward():
+                out = model(batch)
+                if device.type == 'cuda':
+                    torch.cuda.synchronize()
+                return out
+
+            timings = time_calls(forward, repeats, warmup=2)
+            stats = summarize(timings, scale=1e3, unit='ms')
+            results[f'{precision}/batch_{batch_size}'] = {
+                'batch_size': batch_size,
+                **stats,
+                'images_per_sec': round(batch_size / (stats['median_ms'] / 1e3), 2),
+            }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark CLIPClassifier forward throughput with a random backbone")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--precisions', nargs='+', default=['fp32'], choices=PRECISIONS)
+    parser.add_argument('--vit-l14', action='store_true', help="Full ViT-L/14 architecture instead of the small stand-in")
+    parser.add_argument('--repeats', type=int, default=10, help="Timed forward passes per batch size")
+    parser.add_argument('--threads', type=int, default=None, help="torch intra-op threads")
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="JSON report path")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    vit_config = VIT_L_14 if args.vit_l14 else STAND_IN_VIT
+    results = benchmark(vit_config, args.batch_sizes, args.precisions, args.repeats, torch.device(args.device), args.seed)
+    config = {'vit_config': vit_config, 'batch_sizes': args.batch_sizes, 'precisions': args.precisions,
+              'repeats': args.repeats, 'device': args.device, 'seed': args.seed}
+    write_report(make_report('model', config, results), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Micro-benchmarks of the image functions in src/process.
+
+Times every public function of augment_images, resize_images and
+normalize_images on synthetic photos of common sizes (CelebA-like thumbnails
+up to 1080p), with fixed arguments and seeds. load_image_with_opencv reads a
+JPEG of each size from a temporary folder. Results are microseconds per call
+(median, p90, min, mean) per function and image size.
+
+Usage:
+    python -m benchmarks.process_bench --output benchmarks/results/process.json
+    python -m benchmarks.process_bench --sizes 640x480 --only augment_rotation resize_short_side
+"""
+import argparse
+import random
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from benchmarks.common import make_report, summarize, time_calls, write_report
+from src.process import augment_images, normalize_images, resize_images
+
+
+# (width, height)
+DEFAULT_SIZES = ('178x218', '640x480', '1280x720', '1920x1080')
+
+
+def parse_size(size: str) -> Tuple[int, int]:
+    width, height = size.lower().split('x')
+    return int(width), int(height)
+
+
+def synthetic_image(width: int, height: int, seed: int) -> np.ndarray:
+    """Smooth random RGB image: compresses and resamples more like a photo than white noise"""
+    rng = np.random.default_rng(seed)
+    return cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 2)
+
+
+def build_cases(image: np.ndarray, jpeg_path: str) -> Dict[str, Callable[[], object]]:
+    """One zero-argument call per benchmarked function, with representative arguments"""
+    height, width = image.shape[:2]
+    return {
+        'augment_flip': lambda: augment_images.augment_flip(image, flip_code=1),
+        'augment_rotation': lambda: augment_images.augment_rotation(image, angle=10.0),
+        'augment_shift': lambda: augment_images.augment_shift(image, shift_x=10, shift_y=-7),
+        'augment_brightness': lambda: augment_images.augment_brightness(image, factor=25),
+        'augment_contrast': lambda: augment_images.augment_contrast(image, factor=1.2),
+        'augment_add_noise': lambda: augment_images.augment_add_noise(image, std_dev=15.0),
+        'fused_affine_matrix': lambda: augment_images.fused_affine_matrix(height, width, True, 10.0, 10, -7),
+        'brightness_contrast_lut': lambda: augment_images.brightness_contrast_lut(brightness=25, contrast=1.2),
+        'random_augmentation_pipeline': lambda: augment_images.random_augmentation_pipeline(image),
+        'random_augmentation_pipeline_fused': lambda: augment_images.random_augmentation_pipeline(image, fused=True),
+        'load_image_with_opencv': lambda: resize_images.load_image_with_opencv(jpeg_path),
+        'resize_image': lambda: resize_images.resize_image(image, (224, 224)),
+        'resize_short_side': lambda: resize_images.resize_short_side(image, 256),
+        'random_crop': lambda: resize_images.random_crop(image, crop_width=0.5, crop_height=0.5),
+        'standardize_normalize': lambda: normalize_images.standardize_normalize(image),
+    }
+
+
+def benchmark(
+    sizes: Sequence[str] = DEFAULT_SIZES,
+    only: Optional[Sequence[str]] = None,
+    repeats: int = 20,
+    min_seconds: float = 0.2,
+    seed: int = 42,
+) -> Dict[str, Dict]:
+    """Per-call timings keyed '<function>/<width>x<height>'"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            width, height = parse_size(size)
+            image = synthetic_image(width, height, seed)
+            jpeg_path = str(Path(tmp_dir) / f'{width}x{height}.jpg')
+            cv2.imwrite(jpeg_path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])
+
+            for name, call in build_cases(image, jpeg_path).items():
+                if only and name not in only:
+                    continue
+                # The pipelines and random_crop draw from both generators
+                random.seed(seed)
+                np.random.seed(seed)
+                timings = time_calls(call, repeats, warmup=2, min_seconds=min_seconds)
+                results[f'{name}/{width}x{height}'] = {'calls': len(timings), **summarize(timings)}
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmark the src/process image functions")
+    parser.add_argument('--sizes', nargs='+', default=list(DEFAULT_SIZES), help="Image sizes as WIDTHxHEIGHT")
+    parser.add_argument('--only', nargs='+', default=None, help="Benchmark only these functions")
+    parser.add_argument('--repeats', type=int, default=20, help="Minimum timed calls per case")
+    parser.add_argument('--min-seconds', type=float, default=0.2, help="Minimum time spent per case")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--threads', type=int, default=1, help="OpenCV threads")
+    parser.add_argument('--output', default=None, help="JSON report path")
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(args.threads)
+    results = benchmark(args.sizes, args.only, args.repeats, args.min_seconds, args.seed)
+    config = {'sizes': args.sizes, 'repeats': args.repeats, 'min_seconds': args.min_seconds,
+              'seed': args.seed, 'threads': args.threads}
+    write_report(make_report('process', config, results), args.output)
+
+
+if __name__ == "__main__":
+    main()
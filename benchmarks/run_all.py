@@ -0,0 +1,49 @@
+"""
+Run the whole benchmark suite and save one report per benchmark.
+
+Reports go to <out-dir>/<git commit>/{process,model,api}.json (plus
+augment.json from benchmarks.augment_bench), so running this on two commits
+gives two folders that benchmarks.compare can diff. --quick shortens every
+benchmark for a smoke run; numbers from a quick run are noisier and should
+only be compared with other quick runs.
+
+Usage:
+    python -m benchmarks.run_all
+    python -m benchmarks.run_all --only model api --quick
+    python -m benchmarks.compare benchmarks/results/<old commit> benchmarks/results/<new commit>
+"""
+import argparse
+from pathlib import Path
+from typing import List, Optional
+
+from benchmarks import api_bench, augment_bench, model_bench, process_bench
+from benchmarks.common import git_commit
+
+
+# Entry point and its --quick arguments
+BENCHMARKS = {
+    'process': (process_bench.main, ['--sizes', '178x218', '640x480', '--min-seconds', '0.05']),
+    'augment': (augment_bench.main, ['--images', '50', '--repeats', '2']),
+    'model': (model_bench.main, ['--batch-sizes', '1', '8', '--repeats', '3']),
+    'api': (api_bench.main, ['--concurrency', '1', '8', '--requests', '40']),
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run every benchmark and save the JSON reports per commit")
+    parser.add_argument('--out-dir', default='benchmarks/results')
+    parser.add_argument('--name', default=None, help="Sub-folder name (default: current git commit)")
+    parser.add_argument('--only', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--quick', action='store_true', help="Fewer sizes, repeats and requests")
+    args = parser.parse_args(argv)
+
+    out_dir = Path(args.out_dir) / (args.name or git_commit() or 'local')
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name in args.only:
+        run, quick_args = BENCHMARKS[name]
+        run((quick_args if args.quick else []) + ['--output', str(out_dir / f'{name}.json')])
+    print(f"Reports written to {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
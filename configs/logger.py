@@ -1,14 +1,81 @@
 """
 Logger configuration and setup utilities
 Provides centralized logging functionality for the entire project
+
+Queue mode (LOG_QUEUE=1 or setup_logging(use_queue=True)): every configured
+logger gets a single QueueHandler instead of its console/file handlers, and
+one background QueueListener thread owns those handlers. Logging on a request
+or training thread then only enqueues the record; %-style arguments are kept
+on the record and formatted by the listener. LOG_JSON=1 writes the log files
+as one JSON object per line. ProjectLogger.shutdown() (also run at exit)
+drains the queue and flushes the files.
 """
+import atexit
+import json
 import logging
 import logging.config
+import logging.handlers
 import os
+import queue
 import yaml
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+
+
+# Argument types that cannot change between enqueueing a record and formatting it
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and exception"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class _RoutingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records with the id of the handler set of the logger they were logged to"""
+
+    def __init__(self, log_queue, route: int):
+        super().__init__(log_queue)
+        self.route = route
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the listener; only arguments that could be
+        # mutated before then (including a mapping argument) are rendered here
+        if record.args and (isinstance(record.args, dict)
+                            or not all(isinstance(arg, _IMMUTABLE_ARGS) for arg in record.args)):
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.queue.put_nowait((self.route, record))
+
+
+class _RoutingQueueListener(logging.handlers.QueueListener):
+    """Single background thread handing each record to its logger's original handlers"""
+
+    def __init__(self, log_queue, routes: List[List[logging.Handler]]):
+        super().__init__(log_queue, respect_handler_level=True)
+        self.routes = routes
+
+    def handle(self, item: Tuple[int, logging.LogRecord]) -> None:
+        route, record = item
+        for handler in self.routes[route]:
+            if record.levelno >= handler.level:
+                handler.handle(record)
 
 
 class ProjectLogger:
@@ -16,13 +83,18 @@ class ProjectLogger:
     
     _loggers: Dict[str, logging.Logger] = {}
     _config_loaded = False
+    _log_dir: Optional[str] = None
+    _listener: Optional[_RoutingQueueListener] = None
+    _original_handlers: Dict[str, List[logging.Handler]] = {}
     
     @classmethod
     def setup_logging(
         cls, 
         config_path: Optional[str] = None,
         log_level: str = "INFO",
-        log_dir: Optional[str] = None
+        log_dir: Optional[str] = None,
+        use_queue: Optional[bool] = None,
+        json_output: Optional[bool] = None
     ) -> None:
         """
         Setup logging configuration
@@ -31,9 +103,15 @@ class ProjectLogger:
             config_path: Path to logging configuration file
             log_level: Default log level if no config file
             log_dir: Directory to store log files
+            use_queue: Write logs from a background thread (default: LOG_QUEUE env var)
+            json_output: JSON lines in the log files (default: LOG_JSON env var)
         """
         if cls._config_loaded:
             return
+        if use_queue is None:
+            use_queue = os.environ.get('LOG_QUEUE', '0').lower() in ('1', 'true', 'yes')
+        if json_output is None:
+            json_output = os.environ.get('LOG_JSON', '0').lower() in ('1', 'true', 'yes')
             
         # Set default log directory
         if log_dir is None:
@@ -41,6 +119,7 @@ class ProjectLogger:
         
         # Create logs directory if it doesn't exist
         Path(log_dir).mkdir(parents=True, exist_ok=True)
+        cls._log_dir = os.path.abspath(log_dir)
         
         # Try to load config file
         if config_path is None:
@@ -51,8 +130,70 @@ class ProjectLogger:
         else:
             cls._setup_default_logging(log_level, log_dir)
         
+        if json_output:
+            cls._use_json_files()
+        if use_queue:
+            cls._start_queue()
         cls._config_loaded = True
     
+    @classmethod
+    def get_log_dir(cls) -> str:
+        """Directory the log files are written to"""
+        if not cls._config_loaded:
+            cls.setup_logging()
+        return cls._log_dir
+    
+    @staticmethod
+    def _configured_loggers() -> Dict[str, logging.Logger]:
+        """Root plus every logger that has handlers of its own"""
+        loggers = {'': logging.getLogger()}
+        for name, logger in logging.Logger.manager.loggerDict.items():
+            if isinstance(logger, logging.Logger) and logger.handlers:
+                loggers[name] = logger
+        return loggers
+    
+    @classmethod
+    def _use_json_files(cls) -> None:
+        """Switch every file handler to JsonFormatter; the console keeps its format"""
+        formatter = JsonFormatter()
+        for logger in cls._configured_loggers().values():
+            for handler in logger.handlers:
+                if isinstance(handler, logging.FileHandler):
+                    handler.setFormatter(formatter)
+    
+    @classmethod
+    def _start_queue(cls) -> None:
+        """Move every logger's handlers behind one queue and listener thread"""
+        log_queue = queue.SimpleQueue()
+        routes: List[List[logging.Handler]] = []
+        route_ids: Dict[Tuple[int, ...], int] = {}
+        for name, logger in cls._configured_loggers().items():
+            handlers = list(logger.handlers)
+            key = tuple(id(handler) for handler in handlers)
+            if key not in route_ids:
+                route_ids[key] = len(routes)
+                routes.append(handlers)
+            cls._original_handlers[name] = handlers
+            logger.handlers = [_RoutingQueueHandler(log_queue, route_ids[key])]
+        
+        cls._listener = _RoutingQueueListener(log_queue, routes)
+        cls._listener.start()
+        atexit.register(cls.shutdown)
+    
+    @classmethod
+    def shutdown(cls) -> None:
+        """Write every queued record, restore the direct handlers and flush them"""
+        listener, cls._listener = cls._listener, None
+        if listener is None:
+            return
+        # Later records (e.g. from other atexit hooks) go to the handlers directly
+        for name, handlers in cls._original_handlers.items():
+            logging.getLogger(name or None).handlers = handlers
+        listener.stop()  # handles everything enqueued before the sentinel
+        for handlers in listener.routes:
+            for handler in handlers:
+                handler.flush()
+    
     @classmethod
     def _load_config_from_file(cls, config_path: str, log_dir: str) -> None:
         """Load logging configuration from YAML file"""
@@ -121,9 +262,9 @@ class ProjectLogger:
     def log_model_info(cls, model_name: str, params: Dict[str, Any]) -> None:
         """Log model information"""
         logger = cls.get_logger('model_info')
-        logger.info(f"Model: {model_name}")
+        logger.info("Model: %s", model_name)
         for key, value in params.items():
-            logger.info(f"  {key}: {value}")
+            logger.info("  %s: %s", key, value)
     
     @classmethod
     def log_training_metrics(
@@ -132,34 +273,39 @@ class ProjectLogger:
         train_loss: float, 
         val_loss: float, 
         train_acc: float, 
-        val_acc: float
+        val_acc: float,
+        samples_per_sec: Optional[float] = None,
+        data_seconds: Optional[float] = None,
+        compute_seconds: Optional[float] = None
     ) -> None:
-        """Log training metrics"""
+        """Log training metrics, plus throughput and data-wait vs compute time when given"""
         logger = cls.get_logger('training')
-        logger.info(
-            f"Epoch {epoch}: "
-            f"Train Loss: {train_loss:.4f}, "
-            f"Val Loss: {val_loss:.4f}, "
-            f"Train Acc: {train_acc:.4f}, "
-            f"Val Acc: {val_acc:.4f}"
-        )
+        message = "Epoch %d: Train Loss: %.4f, Val Loss: %.4f, Train Acc: %.4f, Val Acc: %.4f"
+        args = [epoch, train_loss, val_loss, train_acc, val_acc]
+        if samples_per_sec is not None:
+            message += ", Samples/s: %.1f"
+            args.append(samples_per_sec)
+        if data_seconds is not None and compute_seconds is not None:
+            message += ", Data Wait: %.2fs, Compute: %.2fs"
+            args.extend([data_seconds, compute_seconds])
+        logger.info(message, *args)
     
     @classmethod
     def log_data_info(cls, dataset_name: str, num_samples: int, num_classes: int) -> None:
         """Log dataset information"""
         logger = cls.get_logger('data_info')
-        logger.info(f"Dataset: {dataset_name}")
-        logger.info(f"  Number of samples: {num_samples}")
-        logger.info(f"  Number of classes: {num_classes}")
+        logger.info("Dataset: %s", dataset_name)
+        logger.info("  Number of samples: %d", num_samples)
+        logger.info("  Number of classes: %d", num_classes)
     
     @classmethod
     def log_error(cls, error: Exception, context: str = "") -> None:
         """Log error with context"""
         logger = cls.get_logger('error')
         if context:
-            logger.error(f"{context}: {str(error)}", exc_info=True)
+            logger.error("%s: %s", context, error, exc_info=True)
         else:
-            logger.error(str(error), exc_info=True)
+            logger.error("%s", error, exc_info=True)
 
 
 # Convenience functions for easy import
@@ -168,9 +314,19 @@ def get_logger(name: str = None) -> logging.Logger:
     return ProjectLogger.get_logger(name)
 
 
-def setup_logging(config_path: Optional[str] = None, log_level: str = "INFO") -> None:
+def setup_logging(
+    config_path: Optional[str] = None,
+    log_level: str = "INFO",
+    use_queue: Optional[bool] = None,
+    json_output: Optional[bool] = None
+) -> None:
     """Setup logging - convenience function"""
-    ProjectLogger.setup_logging(config_path, log_level)
+    ProjectLogger.setup_logging(config_path, log_level, use_queue=use_queue, json_output=json_output)
+
+
+def shutdown_logging() -> None:
+    """Flush queued log records - convenience function"""
+    ProjectLogger.shutdown()
 
 
 def log_info(message: str, logger_name: str = None) -> None:
@@ -211,11 +367,11 @@ def log_execution_time(logger_name: str = None):
             try:
                 result = func(*args, **kwargs)
                 execution_time = time.time() - start_time
-                logger.info(f"{func.__name__} executed in {execution_time:.4f} seconds")
+                logger.info("%s executed in %.4f seconds", func.__name__, execution_time)
                 return result
             except Exception as e:
                 execution_time = time.time() - start_time
-                logger.error(f"{func.__name__} failed after {execution_time:.4f} seconds: {e}")
+                logger.error("%s failed after %.4f seconds: %s", func.__name__, execution_time, e)
                 raise
         return wrapper
     return decorator
@@ -0,0 +1,205 @@
+"""
+Inference backends behind a common interface.
+
+    eager        CLIPClassifier in PyTorch (needs the CLIP package to build)
+    torchscript  traced graph exported by src.models.export
+    onnx         ONNX graph exported by src.models.export, run by ONNX Runtime
+
+Every backend maps a [B, 3, 224, 224] batch to ([B, 768] features, [B] fake
+probability). Exported graphs have a static batch size: batches are padded
+up to it and larger batches are run in chunks. The head is also kept as a
+small torch module so cached features can be re-scored without the backbone.
+"""
+import json
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.profiler import record_function
+
+from configs.logger import get_logger
+from src.api.metrics import ServingMetrics
+from src.models.clip_classifier import CLIPClassifier, build_head
+
+
+logger = get_logger(__name__)
+
+BACKENDS = ('eager', 'torchscript', 'onnx')
+
+
+class InferenceBackend:
+    """Interface shared by all serving backends"""
+
+    name = 'base'
+
+    def __init__(self, head: nn.Module):
+        self.head = head.eval()
+        # Set by the app to record backbone/head time; None skips the timing
+        self.metrics: Optional[ServingMetrics] = None
+
+    def _observe(self, stage: str, seconds: float) -> None:
+        if self.metrics is not None:
+            self.metrics.observe_stage(stage, seconds)
+
+    def infer(self, batch: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """[B, 3, H, W] -> ([B, 768] features, [B] fake probability), on CPU"""
+        raise NotImplementedError
+
+    @torch.no_grad()
+    def classify(self, features: torch.Tensor) -> torch.Tensor:
+        """Head only, [B, 768] -> [B] fake probability"""
+        start = time.perf_counter()
+        probs = self.head(features.to(next(self.head.parameters()).device)).view(-1).cpu()
+        self._observe('head', time.perf_counter() - start)
+        return probs
+
+    def describe(self) -> Dict:
+        return {'backend': self.name}
+
+
+class EagerBackend(InferenceBackend):
+    """CLIPClassifier run directly in PyTorch"""
+
+    name = 'eager'
+
+    def __init__(self, model: CLIPClassifier, device: torch.device):
+        super().__init__(model.head)
+        self.model = model.eval()
+        self.device = device
+
+    @torch.no_grad()
+    def infer(self, batch: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        start = time.perf_counter()
+        features = self.model.extract_features(batch.to(self.device))
+        features_cpu = features.cpu()  # waits for the device, so the backbone time is complete
+        backbone_done = time.perf_counter()
+        probs = self.model.classify(features).cpu()
+        self._observe('backbone', backbone_done - start)
+        self._observe('head', time.perf_counter() - backbone_done)
+        return features_cpu, probs
+
+
+class _StaticBatchBackend(InferenceBackend):
+    """Pads/chunks batches to the fixed batch size of an exported graph"""
+
+    def __init__(self, head: nn.Module, batch_size: int):
+        super().__init__(head)
+        self.batch_size = batch_size
+
+    def _run_static(self, batch: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        raise NotImplementedError
+
+    @torch.no_grad()
+    def infer(self, batch: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        features, probs = [], []
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start:start + self.batch_size].float()
+            valid = len(chunk)
+            if valid < self.batch_size:
+                padding = chunk.new_zeros((self.batch_size - valid, *chunk.shape[1:]))
+                chunk = torch.cat([chunk, padding])
+            t0 = time.perf_counter()
+            with record_function('backbone'):
+                chunk_features, chunk_probs = self._run_static(chunk.contiguous())
+            # The exported graph includes the head: its time is counted as backbone
+            self._observe('backbone', time.perf_counter() - t0)
+            features.append(chunk_features[:valid])
+            probs.append(chunk_probs[:valid])
+        return torch.cat(features), torch.cat(probs)
+
+    def describe(self) -> Dict:
+        return {'backend': self.name, 'static_batch_size': self.batch_size}
+
+
+class TorchScriptBackend(_StaticBatchBackend):
+    name = 'torchscript'
+
+    def __init__(self, path: Union[str, Path], head: nn.Module, batch_size: int):
+        super().__init__(head, batch_size)
+        self.module = torch.jit.load(str(path), map_location='cpu').eval()
+
+    def _run_static(self, batch: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        features, probs = self.module(batch)
+        return features.float(), probs.float()
+
+
+class OnnxRuntimeBackend(_StaticBatchBackend):
+    name = 'onnx'
+
+    def __init__(self, path: Union[str, Path], head: nn.Module, batch_size: int, num_threads: Optional[int] = None):
+        super().__init__(head, batch_size)
+        import onnxruntime as ort  # optional dependency, only needed for this backend
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(str(path), sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _run_static(self, batch: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        features, probs = self.session.run(None, {self.input_name: batch.numpy()})
+        return torch.from_numpy(np.asarray(features, dtype=np.float32)), torch.from_numpy(np.asarray(probs, dtype=np.float32))
+
+
+def read_export_meta(path: Union[str, Path]) -> Dict:
+    """Sidecar metadata written next to an exported graph"""
+    with open(Path(str(path) + '.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_exported_backend(kind: str, path: Union[str, Path], num_threads: Optional[int] = None) -> InferenceBackend:
+    """
+    Load a graph exported by src.models.export
+
+    Args:
+        kind: 'torchscript' or 'onnx'
+        path: Exported graph; its .json sidecar and .head.pt head weights must sit next to it
+        num_threads: Intra-op threads for ONNX Runtime
+    """
+    meta = read_export_meta(path)
+    if meta['format'] != kind:
+        raise ValueError(f"{path} was exported as {meta['format']}, not {kind}")
+
+    head = build_head()
+    head.load_state_dict(torch.load(Path(str(path) + '.head.pt'), map_location='cpu'))
+
+    if kind == 'torchscript':
+        backend = TorchScriptBackend(path, head, meta['batch_size'])
+    elif kind == 'onnx':
+        backend = OnnxRuntimeBackend(path, head, meta['batch_size'], num_threads)
+    else:
+        raise ValueError(f"Unknown exported backend '{kind}', expected torchscript or onnx")
+
+    logger.info("Loaded %s backend from %s (static batch %s)", kind, path, meta['batch_size'])
+    return backend
+
+
+@torch.no_grad()
+def check_parity(
+    reference: InferenceBackend,
+    candidate: InferenceBackend,
+    batch: torch.Tensor,
+    atol: float = 1e-3,
+) -> Dict:
+    """
+    Compare two backends on the same inputs
+
+    Returns:
+        Max absolute feature/probability differences and whether both are within atol
+    """
+    ref_features, ref_probs = reference.infer(batch)
+    cand_features, cand_probs = candidate.infer(batch)
+    feature_diff = (ref_features - cand_features).abs().max().item()
+    prob_diff = (ref_probs - cand_probs).abs().max().item()
+    return {
+        'reference': reference.name,
+        'candidate': candidate.name,
+        'max_abs_feature_diff': feature_diff,
+        'max_abs_prob_diff': prob_diff,
+        'atol': atol,
+        'ok': prob_diff <= atol and feature_diff <= atol * max(1.0, ref_features.abs().max().item()),
+    }
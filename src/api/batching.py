@@ -0,0 +1,206 @@
+"""
+Dynamic micro-batching for the inference endpoints.
+
+Concurrent requests are collected into a single batch, bounded by a maximum
+batch size and a maximum wait time, so the CLIP visual encoder runs one
+batched forward instead of many batch-size-1 forwards.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+
+
+# Batched inference function: [B, ...] input -> tuple of tensors with leading dim B
+InferenceFn = Callable[[torch.Tensor], Tuple[torch.Tensor, ...]]
+
+
+class BatchingStats:
+    """Counters describing queue depth and batch sizes of a MicroBatcher"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.total_wait_s = 0.0
+        self.total_infer_s = 0.0
+        self.batch_size_counts: Counter = Counter()
+
+    def record_batch(self, size: int, wait_s: float, infer_s: float) -> None:
+        with self._lock:
+            self.requests += size
+            self.batches += 1
+            self.total_wait_s += wait_s
+            self.total_infer_s += infer_s
+            self.batch_size_counts[size] += 1
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def observe_queue_depth(self, depth: int) -> None:
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            batches = max(self.batches, 1)
+            requests = max(self.requests, 1)
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'errors': self.errors,
+                'max_queue_depth': self.max_queue_depth,
+                'mean_batch_size': round(self.requests / batches, 3),
+                'mean_queue_wait_ms': round(1000.0 * self.total_wait_s / requests, 3),
+                'mean_batch_infer_ms': round(1000.0 * self.total_infer_s / batches, 3),
+                'batch_size_histogram': {str(k): v for k, v in sorted(self.batch_size_counts.items())},
+            }
+
+
+class _PendingItem:
+    __slots__ = ('tensor', 'future', 'enqueued_at')
+
+    def __init__(self, tensor: torch.Tensor, future: asyncio.Future):
+        self.tensor = tensor
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collect single-sample requests into batches and run them through one forward.
+
+    Args:
+        infer_fn: Batched inference function, called with a stacked [B, ...] tensor.
+            It must return a tuple of tensors whose first dimension is B.
+        max_batch_size: Upper bound on the number of samples per forward.
+        max_wait_ms: How long the first request of a batch may wait for company.
+        executor: Executor used to run ``infer_fn``. A dedicated single-thread
+            executor is created when omitted, so batches never overlap.
+    """
+
+    def __init__(
+        self,
+        infer_fn: InferenceFn,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10.0,
+        executor: Optional[Executor] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0")
+
+        self.infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.stats = BatchingStats()
+
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='micro-batcher')
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        """Start the background batching task on the running event loop"""
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the batching task and fail any request still waiting"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while self._queue is not None and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Batcher stopped."))
+
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def submit(self, tensor: torch.Tensor) -> Tuple[torch.Tensor, ...]:
+        """
+        Queue one sample (without batch dimension) and wait for its outputs
+
+        Returns:
+            Tuple with this sample's row of every tensor returned by ``infer_fn``.
+        """
+        if self._queue is None:
+            raise RuntimeError("Batcher is not started.")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingItem(tensor, future))
+        self.stats.observe_queue_depth(self._queue.qsize())
+        return await future
+
+    async def run_batch(self, batch: torch.Tensor) -> Tuple[torch.Tensor, ...]:
+        """Run an already-assembled batch on the inference executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.infer_fn, batch)
+
+    async def _collect(self) -> List[_PendingItem]:
+        """Block for the first item, then gather more until size or time limit"""
+        first = await self._queue.get()
+        items = [first]
+        deadline = first.enqueued_at + self.max_wait_s
+
+        while len(items) < self.max_batch_size:
+            # Drain whatever is already queued without waiting
+            while len(items) < self.max_batch_size and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            if len(items) >= self.max_batch_size:
+                break
+
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return items
+
+    async def _run(self) -> None:
+        while True:
+            items = await self._collect()
+            # Requests cancelled by their client do not need a forward pass
+            items = [item for item in items if not item.future.done()]
+            if not items:
+                continue
+
+            started = time.perf_counter()
+            wait_s = sum(started - item.enqueued_at for item in items)
+            try:
+                batch = torch.stack([item.tensor for item in items])
+                outputs = await self.run_batch(batch)
+            except Exception as e:
+                self.stats.record_error()
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+
+            self.stats.record_batch(len(items), wait_s, time.perf_counter() - started)
+            for i, item in enumerate(items):
+                if not item.future.done():
+                    item.future.set_result(tuple(out[i] for out in outputs))
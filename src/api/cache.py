@@ -0,0 +1,201 @@
+"""
+Content-addressed cache of CLIP features and head outputs for the API.
+
+Entries are keyed by the SHA-256 of the uploaded bytes, so a repeated upload
+skips decode, preprocessing and the backbone forward entirely. Each entry
+records the version of the head that produced its output: after the head
+weights change, the cached 768-d feature stays valid and only the head has to
+be re-run.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+import torch.nn as nn
+
+from configs.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    """Cached result for one image"""
+    feature: np.ndarray  # [768] float32 CLIP feature
+    prob_fake: float
+    head_version: str
+
+
+def content_key(content: bytes) -> str:
+    """Cache key for uploaded bytes"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def head_version(head: nn.Module) -> str:
+    """Fingerprint of the head weights; changes whenever the head is retrained"""
+    digest = hashlib.sha1()
+    for name, tensor in sorted(head.state_dict().items()):
+        digest.update(name.encode('utf-8'))
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    In-memory LRU of CacheEntry with an optional on-disk tier
+
+    Args:
+        max_entries: Maximum number of entries kept in memory
+        disk_dir: Directory of the on-disk tier, disabled when None. Entries
+            evicted from memory remain available there.
+        head_version: Version of the head currently serving requests
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        disk_dir: Optional[Union[str, Path]] = None,
+        head_version: str = '',
+    ):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.head_version = head_version
+
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'head_recomputes': 0,
+            'disk_errors': 0,
+        }
+
+        # Disk writes happen behind the request on a single background thread
+        self._disk_writer = None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-disk')
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.npz"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Look up an entry in memory, then on disk
+
+        The returned entry may carry an outdated head_version; see is_stale().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                return entry
+
+        entry = self._read_disk(key)
+        if entry is None:
+            self._count('misses')
+            return None
+
+        self._count('disk_hits')
+        self._insert(key, entry)
+        return entry
+
+    def is_stale(self, entry: CacheEntry) -> bool:
+        """Whether the entry's head output was produced by a different head"""
+        return entry.head_version != self.head_version
+
+    def put(self, key: str, feature: np.ndarray, prob_fake: float, head_recompute: bool = False) -> CacheEntry:
+        """Store the feature and current-head output for an image"""
+        entry = CacheEntry(
+            # Copy so a row of a batch output does not keep the whole batch alive
+            feature=np.array(feature, dtype=np.float32, copy=True),
+            prob_fake=float(prob_fake),
+            head_version=self.head_version,
+        )
+        if head_recompute:
+            self._count('head_recomputes')
+        self._insert(key, entry)
+        if self._disk_writer is not None:
+            self._disk_writer.submit(self._write_disk, key, entry)
+        return entry
+
+    def _insert(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def _read_disk(self, key: str) -> Optional[CacheEntry]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                return CacheEntry(
+                    feature=data['feature'].astype(np.float32),
+                    prob_fake=float(data['prob_fake']),
+                    head_version=str(data['head_version']),
+                )
+        except Exception as e:
+            self._count('disk_errors')
+            logger.warning("Failed to read cache entry %s: %s", path, e)
+            return None
+
+    def _write_disk(self, key: str, entry: CacheEntry) -> None:
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    feature=entry.feature,
+                    prob_fake=np.float32(entry.prob_fake),
+                    head_version=np.str_(entry.head_version),
+                )
+            # Atomic so concurrent readers never see a partial file
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self._count('disk_errors')
+            logger.warning("Failed to write cache entry %s: %s", path, e)
+
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['disk_tier'] = str(self.disk_dir) if self.disk_dir is not None else None
+        stats['head_version'] = self.head_version
+        return stats
+
+    def close(self) -> None:
+        """Wait for pending disk writes"""
+        if self._disk_writer is not None:
+            self._disk_writer.shutdown(wait=True)
@@ -0,0 +1,152 @@
+"""
+Execution layer that keeps blocking work off the asyncio event loop.
+
+Image decode and preprocessing run on a bounded thread or process pool;
+model inference runs on one dedicated worker thread with its own torch
+intra-op thread count. Sizing both explicitly lets CPU deployments use every
+core without decode workers and torch threads oversubscribing them.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import torch
+from torch.profiler import record_function
+
+from configs.logger import get_logger
+from src.api.uploads import decode_image
+from src.models.clip_classifier import build_preprocess
+
+
+logger = get_logger(__name__)
+
+_preprocess = None
+
+
+def decode_and_preprocess(content: bytes) -> torch.Tensor:
+    """Decode upload bytes and apply validation preprocessing, [3, 224, 224]
+
+    Module level so it can be shipped to a process pool.
+    """
+    return decode_and_preprocess_timed(content)[0]
+
+
+def decode_and_preprocess_timed(content: bytes) -> Tuple[torch.Tensor, float, float]:
+    """decode_and_preprocess, plus the seconds spent decoding and preprocessing
+
+    Timed inside the worker, so the timings are right with a process pool too.
+    """
+    global _preprocess
+    if _preprocess is None:
+        _preprocess = build_preprocess()
+    start = time.perf_counter()
+    with record_function('decode'):
+        image = decode_image(content)
+    decoded = time.perf_counter()
+    with record_function('preprocess'):
+        tensor = _preprocess(image)
+    return tensor, decoded - start, time.perf_counter() - decoded
+
+
+def _init_decode_process() -> None:
+    # Decode workers must not each start a full torch thread pool
+    torch.set_num_threads(1)
+
+
+def _init_inference_thread(num_threads: int) -> None:
+    torch.set_num_threads(num_threads)
+
+
+@dataclass
+class ExecutionConfig:
+    """
+    Worker limits of the execution layer
+
+    Attributes:
+        decode_workers: Size of the decode/preprocess pool
+        decode_pool: 'thread' or 'process'
+        inference_threads: torch intra-op threads used by the inference worker
+        interop_threads: torch inter-op threads, left at torch's default when None
+    """
+    decode_workers: int
+    decode_pool: str = 'thread'
+    inference_threads: int = 1
+    interop_threads: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> 'ExecutionConfig':
+        """
+        Read DECODE_WORKERS, DECODE_POOL, INFERENCE_THREADS and INTEROP_THREADS
+
+        By default a quarter of the cores decode and the rest run inference.
+        """
+        cpus = os.cpu_count() or 1
+        decode_workers = int(os.environ.get('DECODE_WORKERS', max(1, cpus // 4)))
+        inference_threads = int(os.environ.get('INFERENCE_THREADS', max(1, cpus - decode_workers)))
+        interop = os.environ.get('INTEROP_THREADS')
+        return cls(
+            decode_workers=decode_workers,
+            decode_pool=os.environ.get('DECODE_POOL', 'thread').lower(),
+            inference_threads=inference_threads,
+            interop_threads=int(interop) if interop else None,
+        )
+
+    def __post_init__(self):
+        if self.decode_pool not in ('thread', 'process'):
+            raise ValueError(f"decode_pool must be 'thread' or 'process', got: {self.decode_pool}")
+        if self.decode_workers < 1 or self.inference_threads < 1:
+            raise ValueError("decode_workers and inference_threads must be >= 1")
+
+
+class ExecutionLayer:
+    """Bounded decode pool plus a single dedicated inference worker"""
+
+    def __init__(self, config: ExecutionConfig):
+        self.config = config
+
+        if config.interop_threads is not None:
+            try:
+                torch.set_num_interop_threads(config.interop_threads)
+            except RuntimeError as e:
+                # Only allowed before any inter-op parallel work has started
+                logger.warning("Could not set torch inter-op threads: %s", e)
+
+        if config.decode_pool == 'process':
+            # spawn: forking a process that already runs torch threads can deadlock
+            self.decode_executor: Executor = ProcessPoolExecutor(
+                max_workers=config.decode_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_decode_process,
+            )
+        else:
+            self.decode_executor = ThreadPoolExecutor(
+                max_workers=config.decode_workers,
+                thread_name_prefix='decode',
+            )
+
+        self.inference_executor: Executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix='inference',
+            initializer=_init_inference_thread,
+            initargs=(config.inference_threads,),
+        )
+        logger.info("Execution layer: %s", asdict(config))
+
+    async def run_decode(self, fn: Callable, *args) -> Any:
+        """Run decode/preprocess work on the decode pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.decode_executor, fn, *args)
+
+    async def run_inference(self, fn: Callable, *args) -> Any:
+        """Run model work on the inference worker"""
+        return await asyncio.get_running_loop().run_in_executor(self.inference_executor, fn, *args)
+
+    def describe(self) -> Dict:
+        return asdict(self.config)
+
+    def shutdown(self) -> None:
+        self.decode_executor.shutdown(wait=False, cancel_futures=True)
+        self.inference_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,240 @@
+"""
+Low-overhead serving metrics, exposed at /metrics in the Prometheus text format.
+
+Every counter and histogram keeps one accumulator list per thread: the
+event loop, each decode thread and the inference thread only ever write to
+their own list, so recording a value takes no lock (the lock is only taken
+once per thread, when its list is created). A scrape sums the lists of all
+threads. The in-flight gauge is derived at scrape time from two counters
+(started and finished requests) instead of a shared value that every
+request would have to update under a lock.
+
+Series:
+    api_stage_seconds{stage}              upload_read, decode, preprocess, backbone, head
+    api_request_bytes{endpoint}           size of the uploaded files
+    api_requests_total{endpoint}
+    api_requests_in_flight{endpoint}
+    api_errors_total{endpoint, reason}
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGES = ('upload_read', 'decode', 'preprocess', 'backbone', 'head')
+ENDPOINTS = ('predict', 'predict_batch')
+
+# Upper bounds in seconds: sub-millisecond decode up to multi-second CPU forwards
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds in bytes: thumbnails up to large archives
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 5e7, 1e8)
+
+
+class _ThreadShards:
+    """Per-thread accumulator lists; each thread only writes its own, totals() sums them"""
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def get(self) -> List[float]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0] * self._size
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            shards = list(self._shards)
+        totals = [0] * self._size
+        for shard in shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter of one labelled series"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self._shards = _ThreadShards(1)
+
+    def inc(self, amount: float = 1) -> None:
+        self._shards.get()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+    def samples(self) -> Iterator[str]:
+        yield f"{self.name}{_format_labels(self.labels)} {_format_value(self.value)}"
+
+
+class Gauge:
+    """Gauge whose value is computed by a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float], labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self._fn = fn
+
+    def samples(self) -> Iterator[str]:
+        yield f"{self.name}{_format_labels(self.labels)} {_format_value(self._fn())}"
+
+
+class Histogram:
+    """
+    Histogram of one labelled series
+
+    The shard layout is [count per bucket..., count above the last bound, sum, count].
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _ThreadShards(len(self.buckets) + 3)
+
+    def observe(self, value: float) -> None:
+        shard = self._shards.get()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self) -> Iterator[str]:
+        totals = self._shards.totals()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), totals):
+            cumulative += count
+            yield f"{self.name}_bucket{_format_labels(self.labels, ('le', _format_value(bound)))} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(self.labels)} {_format_value(totals[-2])}"
+        yield f"{self.name}_count{_format_labels(self.labels)} {int(totals[-1])}"
+
+
+class ServingMetrics:
+    """
+    Metrics of the inference endpoints
+
+    Series of known stages/endpoints are created up front; error series are
+    created on first use of a (endpoint, reason) pair.
+    """
+
+    def __init__(self):
+        self._series: List = []
+        self._lock = threading.Lock()
+        self.stage_seconds = {
+            stage: self._add(Histogram('api_stage_seconds', "Seconds spent per serving stage",
+                                       LATENCY_BUCKETS, {'stage': stage}))
+            for stage in STAGES
+        }
+        self.request_bytes = {
+            endpoint: self._add(Histogram('api_request_bytes', "Size of the uploaded files in bytes",
+                                          SIZE_BUCKETS, {'endpoint': endpoint}))
+            for endpoint in ENDPOINTS
+        }
+        self.requests = {
+            endpoint: self._add(Counter('api_requests_total', "Requests received", {'endpoint': endpoint}))
+            for endpoint in ENDPOINTS
+        }
+        self._finished = {endpoint: Counter('api_requests_finished', '', {'endpoint': endpoint}) for endpoint in ENDPOINTS}
+        for endpoint in ENDPOINTS:
+            self._add(Gauge(
+                'api_requests_in_flight', "Requests being processed",
+                lambda endpoint=endpoint: self.requests[endpoint].value - self._finished[endpoint].value,
+                {'endpoint': endpoint},
+            ))
+        self._errors: Dict[Tuple[str, str], Counter] = {}
+
+    def _add(self, series):
+        with self._lock:
+            self._series.append(series)
+        return series
+
+    def add_gauge(self, name: str, help: str, fn: Callable[[], float]) -> None:
+        """Expose a value owned by another component (queue depth, cache size...)"""
+        self._add(Gauge(name, help, fn))
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        self.stage_seconds[stage].observe(seconds)
+
+    def error(self, endpoint: str, reason: str, count: int = 1) -> None:
+        counter = self._errors.get((endpoint, reason))
+        if counter is None:
+            with self._lock:
+                counter = self._errors.get((endpoint, reason))
+                if counter is None:
+                    counter = Counter('api_errors_total', "Failed requests and images",
+                                      {'endpoint': endpoint, 'reason': reason})
+                    self._errors[(endpoint, reason)] = counter
+                    self._series.append(counter)
+        counter.inc(count)
+
+    def request_started(self, endpoint: str) -> None:
+        self.requests[endpoint].inc()
+
+    def request_finished(self, endpoint: str) -> None:
+        self._finished[endpoint].inc()
+
+    def render(self) -> str:
+        """All series in the Prometheus text exposition format"""
+        with self._lock:
+            series = list(self._series)
+        families: Dict[str, List] = {}
+        for item in series:
+            families.setdefault(item.name, []).append(item)
+
+        lines = []
+        for name, items in families.items():
+            lines.append(f"# HELP {name} {items[0].help}")
+            lines.append(f"# TYPE {name} {items[0].kind}")
+            for item in items:
+                lines.extend(item.samples())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,159 @@
+"""
+Helpers for turning uploaded files into images for the inference endpoints.
+"""
+import io
+import tarfile
+import zipfile
+from pathlib import PurePosixPath
+from typing import Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+
+ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+ARCHIVE_CONTENT_TYPES = {
+    'application/zip',
+    'application/x-zip-compressed',
+    'application/x-tar',
+    'application/gzip',
+    'application/x-gzip',
+    'application/x-compressed-tar',
+}
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+
+class UploadLimitError(ValueError):
+    """An upload holds more images or more bytes than one request may expand to"""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+    def __reduce__(self):
+        # Raised in decode worker processes too: keep reason when pickled back
+        return type(self), (str(self), self.reason)
+
+
+def decode_image(content: bytes) -> Image.Image:
+    """Decode raw upload bytes into an RGB PIL image"""
+    return Image.open(io.BytesIO(content)).convert('RGB')
+
+
+def is_archive(filename: Optional[str], content_type: Optional[str]) -> bool:
+    """Whether an upload should be treated as a zip/tar archive of images"""
+    if content_type and content_type in ARCHIVE_CONTENT_TYPES:
+        return True
+    return bool(filename) and filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_image_member(name: str) -> bool:
+    path = PurePosixPath(name)
+    # Skip macOS resource forks and hidden files
+    if any(part.startswith('.') or part == '__MACOSX' for part in path.parts):
+        return False
+    return path.suffix.lower() in ALLOWED_EXT
+
+
+def iter_archive_images(filename: str, content: bytes, max_bytes: Optional[int] = None) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield (member name, bytes) for every image inside a zip or tar archive
+
+    Members are read one at a time as the iterator advances, so a caller that
+    stops early never decompresses the rest of the archive.
+
+    Args:
+        filename: Name of the uploaded archive, used to prefix member names
+        content: Raw archive bytes
+        max_bytes: Limit on the uncompressed size of the yielded members, checked
+            against each member's declared size before it is read
+
+    Raises:
+        ValueError: If the content is neither a zip nor a tar archive
+        UploadLimitError: If the members would exceed max_bytes
+    """
+    remaining = max_bytes
+
+    def reserve(name: str, size: int) -> None:
+        nonlocal remaining
+        if remaining is None:
+            return
+        if size > remaining:
+            raise UploadLimitError(f"Archive {filename} expands past {max_bytes} bytes at {name}", 'too_large')
+        remaining -= size
+
+    buffer = io.BytesIO(content)
+
+    if zipfile.is_zipfile(buffer):
+        buffer.seek(0)
+        with zipfile.ZipFile(buffer) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_image_member(info.filename):
+                    # zipfile stops reading at the declared file_size, so the check bounds the read
+                    reserve(info.filename, info.file_size)
+                    yield f"{filename}/{info.filename}", archive.read(info)
+        return
+
+    buffer.seek(0)
+    try:
+        archive = tarfile.open(fileobj=buffer, mode='r:*')
+    except tarfile.TarError:
+        raise ValueError(f"Unsupported archive: {filename}")
+
+    with archive:
+        for member in archive:
+            if member.isfile() and _is_image_member(member.name):
+                reserve(member.name, member.size)
+                extracted = archive.extractfile(member)
+                if extracted is not None:
+                    yield f"{filename}/{member.name}", extracted.read()
+
+
+def expand_uploads(
+    uploads: List[Tuple[str, Optional[str], bytes]],
+    max_images: int,
+    max_bytes: int,
+) -> List[Tuple[str, bytes]]:
+    """
+    Flatten uploaded images and zip/tar archives into (name, image bytes) pairs
+
+    Archives are expanded member by member and expansion stops as soon as a
+    limit is hit. Blocking: run it off the event loop.
+
+    Args:
+        uploads: (filename, content type, raw bytes) per uploaded file
+        max_images: Most images the uploads may expand to
+        max_bytes: Most bytes of image data the uploads may expand to
+
+    Raises:
+        UploadLimitError: If a limit is exceeded
+        ValueError: If a file is neither an image nor a readable archive
+    """
+    items: List[Tuple[str, bytes]] = []
+    total_bytes = 0
+
+    def add(name: str, content: bytes) -> None:
+        nonlocal total_bytes
+        if len(items) >= max_images:
+            raise UploadLimitError(f"Too many images, at most {max_images} per request.", 'too_many_images')
+        total_bytes += len(content)
+        if total_bytes > max_bytes:
+            raise UploadLimitError(f"Upload too large, at most {max_bytes} bytes of images per request.", 'too_large')
+        items.append((name, content))
+
+    for filename, content_type, content in uploads:
+        if is_archive(filename, content_type):
+            try:
+                for name, member in iter_archive_images(filename, content, max_bytes - total_bytes):
+                    add(name, member)
+            except UploadLimitError as e:
+                raise UploadLimitError(
+                    f"Upload too large, at most {max_bytes} bytes of images per request." if e.reason == 'too_large'
+                    else str(e), e.reason,
+                )
+            except Exception:
+                raise ValueError(f"Invalid archive: {filename}")
+        elif content_type and content_type.startswith('image/'):
+            add(filename, content)
+        else:
+            raise ValueError(f"File must be an image or archive: {filename}")
+    return items
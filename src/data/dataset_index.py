@@ -0,0 +1,266 @@
+"""
+Persistent SQLite index of the image corpus with stable, hash-based splits.
+
+One row per image: path (relative to the data root), source, label, byte
+size, mtime, width, height, SHA-256 of the content and split. Rescans walk
+the tree with os.scandir and only read files that are new or whose size or
+mtime changed; removed files are dropped from the index.
+
+The split of an image is derived from its content hash (70/15/15 like
+split_source), so adding images never moves existing ones to another split
+and byte-identical copies always land in the same split.
+
+Usage:
+    python -m src.data.dataset_index --data-root data/processed/sample_1pct --db data/index.sqlite
+"""
+import argparse
+import hashlib
+import io
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from PIL import Image
+
+from configs.logger import get_logger
+from src.data.face_dataset import ALLOWED_EXT, FAKE_SOURCES, REAL_SOURCES, SEED, SPLITS, build_splits, shuffle_data
+
+
+logger = get_logger(__name__)
+
+SPLIT_FRACTIONS = {'train': 0.70, 'val': 0.15, 'test': 0.15}
+COMMIT_EVERY = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    label INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    sha256 TEXT NOT NULL,
+    split TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_split ON images (split, source);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images (sha256);
+"""
+
+
+def split_for_hash(sha256: str) -> str:
+    """Deterministic split from the first 64 bits of a content hash"""
+    position = int(sha256[:16], 16) / float(1 << 64)
+    cumulative = 0.0
+    for split in SPLITS:
+        cumulative += SPLIT_FRACTIONS[split]
+        if position < cumulative:
+            return split
+    return SPLITS[-1]
+
+
+def scan_images(root: Union[str, Path]) -> Iterator[Tuple[str, int, int]]:
+    """Yield (path, size, mtime_ns) of every image under root, with os.scandir"""
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif os.path.splitext(entry.name)[1] in ALLOWED_EXT:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime_ns
+
+
+def _read_image_info(path: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """SHA-256 and dimensions, reading the file once"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    sha256 = hashlib.sha256(content).hexdigest()
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            width, height = image.size
+    except Exception:
+        width = height = None
+    return sha256, width, height
+
+
+class DatasetIndex:
+    """
+    SQLite index of one data root (e.g. data/processed/sample_1pct)
+
+    Args:
+        db_path: SQLite file, created if missing
+        data_root: Folder with one sub-folder per source; stored in the index
+            on first use and read back afterwards
+    """
+
+    def __init__(self, db_path: Union[str, Path], data_root: Optional[Union[str, Path]] = None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+        stored = self.conn.execute("SELECT value FROM meta WHERE key = 'data_root'").fetchone()
+        if data_root is not None:
+            data_root = str(Path(data_root).resolve())
+            if stored and stored[0] != data_root:
+                raise ValueError(f"{self.db_path} indexes {stored[0]}, not {data_root}")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('data_root', ?)", (data_root,))
+            self.conn.commit()
+        elif stored is None:
+            raise ValueError(f"{self.db_path} is empty; pass data_root to create it")
+        self.data_root = Path(data_root or stored[0])
+
+    def update(self, sources: Optional[Sequence[str]] = None, num_workers: int = 8) -> Dict:
+        """
+        Rescan the sources and bring the index up to date
+
+        Only new files and files whose size or mtime changed are read.
+
+        Returns:
+            Counts of added, updated, unchanged, removed and failed images
+        """
+        if sources is None:
+            sources = REAL_SOURCES + FAKE_SOURCES
+        start = time.time()
+        stats = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+
+        for source in sources:
+            label = 0 if source in REAL_SOURCES else 1
+            known = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in self.conn.execute(
+                    "SELECT path, size, mtime_ns FROM images WHERE source = ?", (source,)
+                )
+            }
+
+            changed = []
+            source_dir = self.data_root / source
+            if source_dir.exists():
+                for path, size, mtime_ns in scan_images(source_dir):
+                    rel_path = os.path.relpath(path, self.data_root)
+                    previous = known.pop(rel_path, None)
+                    if previous == (size, mtime_ns):
+                        stats['unchanged'] += 1
+                    else:
+                        changed.append((path, rel_path, size, mtime_ns, previous is None))
+
+            # Files that were not seen again have been removed
+            if known:
+                self.conn.executemany("DELETE FROM images WHERE path = ?", [(path,) for path in known])
+                stats['removed'] += len(known)
+
+            # Hashing is I/O bound and hashlib releases the GIL: threads are enough
+            with ThreadPoolExecutor(max_workers=num_workers) as pool:
+                infos = pool.map(lambda item: self._safe_info(item[0]), changed)
+                rows = []
+                for (path, rel_path, size, mtime_ns, is_new), info in zip(changed, infos):
+                    if info is None:
+                        stats['failed'] += 1
+                        continue
+                    sha256, width, height = info
+                    rows.append((rel_path, source, label, size, mtime_ns, width, height, sha256, split_for_hash(sha256)))
+                    stats['added' if is_new else 'updated'] += 1
+                    if len(rows) >= COMMIT_EVERY:
+                        self._upsert(rows)
+                        rows = []
+                self._upsert(rows)
+            self.conn.commit()
+
+        stats['seconds'] = round(time.time() - start, 2)
+        logger.info("Index update: %s", stats)
+        return stats
+
+    @staticmethod
+    def _safe_info(path: str) -> Optional[Tuple[str, Optional[int], Optional[int]]]:
+        try:
+            return _read_image_info(path)
+        except OSError as e:
+            logger.warning("Cannot read %s: %s", path, e)
+            return None
+
+    def _upsert(self, rows: List[tuple]) -> None:
+        if rows:
+            self.conn.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def split(self, name: str, sources: Optional[Sequence[str]] = None) -> Tuple[List[str], List[int]]:
+        """Absolute paths and labels of one split, sorted by path"""
+        query = "SELECT path, label FROM images WHERE split = ?"
+        params: list = [name]
+        if sources is not None:
+            query += f" AND source IN ({','.join('?' * len(sources))})"
+            params.extend(sources)
+        rows = self.conn.execute(query + " ORDER BY path", params).fetchall()
+        return [str(self.data_root / path) for path, _ in rows], [label for _, label in rows]
+
+    def splits(self, random_state: int = SEED) -> Dict[str, Tuple[List[str], List[int]]]:
+        """Same shape as face_dataset.build_splits, without scanning the tree"""
+        return {name: shuffle_data(*self.split(name), random_state=random_state) for name in SPLITS}
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Number of images per source and split"""
+        counts: Dict[str, Dict[str, int]] = {}
+        for source, split, count in self.conn.execute(
+            "SELECT source, split, COUNT(*) FROM images GROUP BY source, split ORDER BY source, split"
+        ):
+            counts.setdefault(source, {})[split] = count
+        return counts
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_splits(
+    data_root: Union[str, Path],
+    index_path: Optional[Union[str, Path]] = None,
+    random_state: int = SEED,
+) -> Dict[str, Tuple[List[str], List[int]]]:
+    """
+    Splits from the dataset index when one is given (updated first), otherwise
+    from a full scan with build_splits
+    """
+    if index_path is None:
+        return build_splits(Path(data_root), random_state=random_state)
+    with DatasetIndex(index_path, data_root) as index:
+        index.update()
+        return index.splits(random_state=random_state)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build or update the SQLite dataset index")
+    parser.add_argument('--data-root', default=None, help="Folder with the source sub-folders (stored on first run)")
+    parser.add_argument('--db', default='data/index.sqlite', help="SQLite index file")
+    parser.add_argument('--sources', nargs='+', default=None, help="Sources to rescan (default: all)")
+    parser.add_argument('--num-workers', type=int, default=8, help="Threads hashing new/changed files")
+    args = parser.parse_args(argv)
+
+    with DatasetIndex(args.db, args.data_root) as index:
+        index.update(sources=args.sources, num_workers=args.num_workers)
+        for source, splits in index.counts().items():
+            logger.info("%s: %s", source, splits)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Near-duplicate detection and cross-split leakage report for the image corpus.
+
+Every image gets a 64-bit perceptual hash (pHash: low-frequency 8x8 DCT of a
+32x32 grayscale thumbnail, thresholded at its median), computed on a process
+pool. Near-duplicates are pairs within a Hamming distance threshold. They are
+found with multi-index hashing instead of comparing all pairs:
+
+    the 64 bits are cut into 4 blocks of 16 bits. Two hashes within distance
+    7 differ by at most 1 bit in at least one block (pigeonhole), so every
+    candidate pair shares a block value or differs by one bit in it. Candidates
+    are produced by bucket-table joins on each block, and their exact distance
+    is computed with a vectorized XOR + popcount.
+
+Pairs are merged into clusters with connected components. The report counts
+clusters that span several splits and the val/test images with a near
+duplicate in train.
+
+Usage:
+    python -m src.data.dedup --data-root data/processed/sample_1pct --out reports/dedup --max-distance 6
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from configs.logger import get_logger
+from src.data.dataset_index import load_splits
+from src.data.face_dataset import SPLITS
+
+
+logger = get_logger(__name__)
+
+HASH_BITS = 64
+BLOCK_BITS = 16
+NUM_BLOCKS = HASH_BITS // BLOCK_BITS
+# With one bit flipped per probed block, pigeonhole guarantees recall up to this distance
+MAX_SUPPORTED_DISTANCE = 2 * NUM_BLOCKS - 1
+QUERY_CHUNK = 1 << 16
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Number of set bits of each uint64"""
+    if hasattr(np, 'bitwise_count'):  # numpy >= 2.0
+        return np.bitwise_count(values).astype(np.uint8)
+    return _POPCOUNT_TABLE[values.view(np.uint8).reshape(-1, 8)].sum(axis=1, dtype=np.uint8)
+
+
+def phash(image_gray: np.ndarray) -> int:
+    """64-bit perceptual hash of a grayscale image"""
+    thumb = cv2.resize(image_gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(thumb)[:8, :8]
+    bits = (low > np.median(low)).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _init_worker() -> None:
+    cv2.setNumThreads(1)
+
+
+def _hash_file(path: str) -> Optional[int]:
+    # Reduced decoding lets libjpeg skip most of the DCT work for large JPEGs
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    if image is None:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    return phash(image)
+
+
+def compute_hashes(paths: Sequence[str], num_workers: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Perceptual hashes of many images in parallel
+
+    Returns:
+        (uint64 hashes, bool mask of images that could be decoded)
+    """
+    hashes = np.zeros(len(paths), dtype=np.uint64)
+    valid = np.zeros(len(paths), dtype=bool)
+    with multiprocessing.Pool(num_workers, initializer=_init_worker) as pool:
+        for i, value in enumerate(pool.imap(_hash_file, paths, chunksize=64)):
+            if value is not None:
+                hashes[i] = value
+                valid[i] = True
+    return hashes, valid
+
+
+def find_near_duplicates(hashes: np.ndarray, max_distance: int = 6) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Near-duplicate pairs of hashes, without comparing all pairs
+
+    Every pair of distinct hash values within max_distance is returned once.
+    Images with identical hashes are linked to the first of them instead of
+    to each other, which gives the same clusters with far fewer pairs.
+
+    Args:
+        hashes: uint64 perceptual hashes
+        max_distance: Largest Hamming distance of a near-duplicate (at most 7)
+
+    Returns:
+        (i, j, distance) arrays of image indices with i < j
+    """
+    if max_distance > MAX_SUPPORTED_DISTANCE:
+        raise ValueError(f"max_distance must be at most {MAX_SUPPORTED_DISTANCE}")
+
+    # Identical hashes are searched once, then expanded back to images
+    unique, inverse = np.unique(hashes, return_inverse=True)
+    inverse = inverse.ravel()
+    n = len(unique)
+    found_i, found_j, found_d = [], [], []
+    probes = [0] + [1 << bit for bit in range(BLOCK_BITS)]
+
+    for block in range(NUM_BLOCKS):
+        keys = ((unique >> np.uint64(block * BLOCK_BITS)) & np.uint64((1 << BLOCK_BITS) - 1)).astype(np.int64)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        sorted_values = unique[order]
+        # Bucket table: elements with block value k sit at sorted positions [start[k], start[k + 1])
+        bucket_start = np.zeros((1 << BLOCK_BITS) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=1 << BLOCK_BITS), out=bucket_start[1:])
+
+        for flip in probes:
+            for chunk_start in range(0, n, QUERY_CHUNK):
+                positions = np.arange(chunk_start, min(chunk_start + QUERY_CHUNK, n))
+                query_keys = sorted_keys[positions]
+                if flip:
+                    # Pairs of buckets k and k ^ flip are generated from the lower bucket only
+                    lower = (query_keys & flip) == 0
+                    positions, query_keys = positions[lower], query_keys[lower] ^ flip
+                    lo = bucket_start[query_keys]
+                else:
+                    # Same bucket: only the elements after this one, so each pair appears once
+                    lo = positions + 1
+                counts = np.maximum(bucket_start[query_keys + 1] - lo, 0)
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+
+                left = np.repeat(positions, counts)
+                right = np.arange(total) + np.repeat(lo - (np.cumsum(counts) - counts), counts)
+                distance = popcount64(sorted_values[left] ^ sorted_values[right])
+                close = distance <= max_distance
+                found_i.append(order[left[close]])
+                found_j.append(order[right[close]])
+                found_d.append(distance[close])
+
+    ui = np.concatenate(found_i) if found_i else np.empty(0, dtype=np.int64)
+    uj = np.concatenate(found_j) if found_j else np.empty(0, dtype=np.int64)
+    ud = np.concatenate(found_d) if found_d else np.empty(0, dtype=np.uint8)
+    # The same pair can be found through several blocks
+    ui, uj = np.minimum(ui, uj), np.maximum(ui, uj)
+    _, first_found = np.unique(ui * n + uj, return_index=True)
+    ui, uj, ud = ui[first_found], uj[first_found], ud[first_found]
+
+    # Expand unique-hash pairs back to images
+    members = np.argsort(inverse, kind='stable')
+    representative = members[np.searchsorted(inverse[members], np.arange(n))]
+    group_first = representative[inverse]
+    copies = np.flatnonzero(group_first != np.arange(len(hashes)))
+
+    i = np.concatenate([group_first[copies], representative[ui]])
+    j = np.concatenate([copies, representative[uj]])
+    d = np.concatenate([np.zeros(len(copies), dtype=np.uint8), ud])
+    swap = i > j
+    i[swap], j[swap] = j[swap], i[swap]
+    return i, j, d
+
+
+def cluster_pairs(num_items: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Cluster label of every item from the connected components of the pair graph"""
+    graph = coo_matrix((np.ones(len(i), dtype=np.int8), (i, j)), shape=(num_items, num_items))
+    _, labels = connected_components(graph, directed=False)
+    return labels
+
+
+def leakage_report(
+    labels: np.ndarray,
+    splits: np.ndarray,
+    sources: np.ndarray,
+) -> Dict:
+    """
+    Cross-split statistics of the duplicate clusters
+
+    Args:
+        labels: Cluster label of every image
+        splits: Split name of every image
+        sources: Source name of every image
+    """
+    sizes = np.bincount(labels)
+    in_cluster = sizes[labels] > 1
+
+    report: Dict = {
+        'images': int(len(labels)),
+        'images_in_duplicate_clusters': int(in_cluster.sum()),
+        'duplicate_clusters': int((sizes > 1).sum()),
+        'largest_cluster': int(sizes.max()) if len(sizes) else 0,
+    }
+
+    cluster_splits: Dict[int, set] = {}
+    cluster_sources: Dict[int, set] = {}
+    for label, split, source in zip(labels[in_cluster], splits[in_cluster], sources[in_cluster]):
+        cluster_splits.setdefault(int(label), set()).add(split)
+        cluster_sources.setdefault(int(label), set()).add(source)
+
+    report['clusters_spanning_splits'] = sum(1 for s in cluster_splits.values() if len(s) > 1)
+    report['clusters_spanning_sources'] = sum(1 for s in cluster_sources.values() if len(s) > 1)
+    report['split_pairs'] = dict(Counter(
+        '+'.join(sorted(s)) for s in cluster_splits.values() if len(s) > 1
+    ))
+
+    # Evaluation images whose cluster also has a train image leak into training
+    train_clusters = {label for label, s in cluster_splits.items() if 'train' in s}
+    for split in SPLITS:
+        if split == 'train':
+            continue
+        mask = (splits == split) & in_cluster
+        leaked = int(sum(1 for label in labels[mask] if int(label) in train_clusters))
+        total = int((splits == split).sum())
+        report[f'{split}_leaked_from_train'] = leaked
+        report[f'{split}_leak_rate'] = round(leaked / total, 6) if total else 0.0
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Find near-duplicate images and cross-split leakage")
+    parser.add_argument('--data-root', required=True, help="Folder with the source sub-folders")
+    parser.add_argument('--out', default='reports/dedup', help="Output folder for clusters.csv and report.json")
+    parser.add_argument('--index', default=None, help="SQLite dataset index to take the splits from")
+    parser.add_argument('--max-distance', type=int, default=6,
+                        help=f"Hamming distance of near-duplicates (at most {MAX_SUPPORTED_DISTANCE})")
+    parser.add_argument('--num-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    data_root = Path(args.data_root)
+    paths, split_names = [], []
+    for split, (split_paths, _) in load_splits(data_root, args.index).items():
+        paths.extend(split_paths)
+        split_names.extend([split] * len(split_paths))
+    if not paths:
+        raise SystemExit(f"No images found under {data_root}")
+
+    start = time.time()
+    hashes, valid = compute_hashes(paths, args.num_workers)
+    hash_seconds = time.time() - start
+    logger.info("Hashed %s images in %.1fs (%.0f img/s), %s unreadable",
+                len(paths), hash_seconds, len(paths) / max(hash_seconds, 1e-9), int((~valid).sum()))
+
+    keep = np.flatnonzero(valid)
+    paths = [paths[k] for k in keep]
+    hashes = hashes[keep]
+    splits = np.asarray([split_names[k] for k in keep])
+    sources = np.asarray([Path(os.path.relpath(p, data_root)).parts[0] for p in paths])
+
+    start = time.time()
+    i, j, distance = find_near_duplicates(hashes, args.max_distance)
+    labels = cluster_pairs(len(paths), i, j)
+    logger.info("Found %s near-duplicate pairs in %.1fs", len(i), time.time() - start)
+
+    report = leakage_report(labels, splits, sources)
+    report.update({'max_distance': args.max_distance, 'pairs': int(len(i)), 'unreadable': int((~valid).sum())})
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    sizes = np.bincount(labels)
+    with open(out_dir / 'clusters.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['cluster', 'path', 'source', 'split', 'phash'])
+        for k in np.lexsort((np.arange(len(labels)), labels)):
+            if sizes[labels[k]] > 1:
+                writer.writerow([int(labels[k]), paths[k], sources[k], splits[k], f"{int(hashes[k]):016x}"])
+    with open(out_dir / 'report.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    logger.info("Leakage report: %s", report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import zipfile
 import os
-import gdown
+
+from src.data.fetch import download_file, extract_zip
 # --- Thiết lập Cấu hình ---
 # Thay thế CHUỖI_ID_FILE_CỦA_BẠN bằng ID thực của file Zip trên Google Drive
 # ID là phần nằm giữa "/d/" và "/view" trong link chia sẻ.
@@ -18,13 +19,17 @@ def download_file_from_google_drive(file_id, destination):
     # Tạo thư mục đích nếu nó chưa tồn tại
     os.makedirs(os.path.dirname(destination), exist_ok=True)
     
-    # URL cơ bản để tải file trực tiếp với confirm parameter
-    URL = f"https://drive.google.com/uc?id={file_id}"
-
-    result = gdown.download(URL, destination, quiet=False)
+    # Link tải trực tiếp (confirm=t bỏ qua trang cảnh báo virus của file lớn).
+    # File dở dang (.part) được tải tiếp bằng HTTP Range thay vì tải lại từ đầu.
+    # Nếu Drive trả về trang HTML (hết hạn mức, cảnh báo virus) thay vì file zip,
+    # download_file báo lỗi thay vì lưu trang đó thành file zip.
+    URL = f"https://drive.usercontent.google.com/download?id={file_id}&export=download&confirm=t"
 
-    if not result or not os.path.exists(destination):
-        print("Lỗi: Không thể tải file từ Google Drive.")
+    try:
+        download_file(URL, destination)
+    except Exception as e:
+        print(f"Lỗi: Không thể tải file từ Google Drive: {e}")
+        return
 
     # Kiểm tra kích thước file
     file_size = os.path.getsize(destination)
@@ -33,26 +38,6 @@ def download_file_from_google_drive(file_id, destination):
     print(f"Kích thước: {file_size:,} bytes ({file_size/1024/1024:.2f} MB)")
     print()
 
-# --- Hàm lấy token xác nhận cho file lớn ---
-def get_confirm_token(response):
-    # First try to get from cookies
-    for key, value in response.cookies.items():
-        if key.startswith('download_warning'):
-            return value
-    
-    # If not found in cookies, try to parse from HTML content
-    try:
-        content = response.text
-        if 'confirm=' in content:
-            import re
-            match = re.search(r'confirm=([^&"\']+)', content)
-            if match:
-                return match.group(1)
-    except:
-        pass
-    
-    return None
-
 # --- 2. Hàm Giải Nén File Zip ---
 def unzip_file(zip_path, extract_to):
     """
@@ -105,13 +90,14 @@ def unzip_file(zip_path, extract_to):
     os.makedirs(extract_to, exist_ok=True)
     
     try:
-        # Kiểm tra zipfile có hợp lệ không trước khi giải nén
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # Test zip file integrity
-            zip_ref.testzip()
-            # Nếu không có lỗi, tiến hành giải nén
-            zip_ref.extractall(extract_to)
-        print(f"Giải nén thành công vào thư mục: {extract_to}")
+        # Giải nén song song; CRC của từng file được kiểm tra ngay khi giải nén
+        # (không cần testzip() đọc lại cả file), file đã có sẵn đúng CRC được bỏ qua
+        stats = extract_zip(zip_path, extract_to)
+        if stats['failed']:
+            print(f"Lỗi: {len(stats['failed'])} file bị hỏng (sai CRC): {stats['failed'][:5]}")
+            return False
+        print(f"Giải nén thành công vào thư mục: {extract_to} "
+              f"({stats['extracted']} file mới, {stats['skipped']} file đã có)")
         return True
     except zipfile.BadZipFile:
         print("Lỗi: File tải về không phải là file Zip hợp lệ hoặc bị hỏng.")
@@ -1,17 +1,34 @@
 """Module to handle downloading datasets from Kaggle."""
+import os
+
 import kaggle
 
-def download_dataset(dataset_name: str, download_path: str) -> None:
+from src.data.fetch import extract_zip
+
+
+def download_dataset(dataset_name: str, download_path: str, num_workers: int = 8, keep_archive: bool = False) -> None:
     """
     Download a dataset from Kaggle.
 
+    The archive is extracted with src.data.fetch.extract_zip: members are
+    extracted in parallel with their CRC checked on the fly, and members that
+    are already present are skipped.
+
     Args:
         dataset_name (str): The name of the dataset on Kaggle (e.g., 'username/dataset-name').
         download_path (str): The local path where the dataset should be downloaded.
+        num_workers (int): Extraction threads.
+        keep_archive (bool): Keep the zip after a clean extraction.
     """
     try:
-        kaggle.api.dataset_download_files(dataset_name, path=download_path, unzip=True)
+        kaggle.api.dataset_download_files(dataset_name, path=download_path, unzip=False)
+        archive = os.path.join(download_path, dataset_name.split('/')[-1] + '.zip')
+        stats = extract_zip(archive, download_path, num_workers=num_workers)
+        if stats['failed']:
+            print(f"Dataset '{dataset_name}': {len(stats['failed'])} corrupted members, archive kept at '{archive}'.")
+            return
+        if not keep_archive:
+            os.remove(archive)
         print(f"Dataset '{dataset_name}' downloaded successfully to '{download_path}'.")
     except Exception as e:
         print(f"An error occurred while downloading the dataset: {e}")
-
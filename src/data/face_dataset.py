@@ -0,0 +1,109 @@
+"""
+Image listing, per-source splits and Dataset for the real vs fake face data.
+
+Mirrors the data preparation cells of
+notebooks/train-real-vs-fake-face-classifier.ipynb so scripts and the
+notebook see the same splits.
+"""
+import random
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+from PIL import Image
+from sklearn.model_selection import train_test_split
+from torch.utils.data import Dataset
+
+
+ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+REAL_SOURCES = ["celeba"]  # label 0
+FAKE_SOURCES = ["fairfacegen", "person_face_dataset", "stable_diffusion_faces"]  # label 1
+SPLITS = ("train", "val", "test")
+SEED = 42
+
+
+def collect_images(root_path: Path) -> List[Path]:
+    """Collect all images under a directory, sorted so splits are reproducible"""
+    images = []
+    for ext in ALLOWED_EXT:
+        images.extend(Path(root_path).rglob(f"*{ext}"))
+    # Set iteration order changes between processes; sort to keep the listing stable
+    return sorted(images)
+
+
+def split_source(
+    images: List[Path],
+    label: int,
+    test_size: float = 0.15,
+    val_size: float = 0.15,
+    random_state: int = SEED
+) -> Tuple[List[str], List[int], List[str], List[int], List[str], List[int]]:
+    """Split one source into train/val/test paths and labels"""
+    if len(images) == 0:
+        return [], [], [], [], [], []
+
+    paths = [str(img) for img in images]
+    labels_list = [label] * len(images)
+
+    train_paths, temp_paths, train_labels, temp_labels = train_test_split(
+        paths, labels_list, test_size=(test_size + val_size), random_state=random_state, shuffle=True
+    )
+    val_paths, test_paths, val_labels, test_labels = train_test_split(
+        temp_paths, temp_labels, test_size=(test_size / (test_size + val_size)),
+        random_state=random_state, shuffle=True
+    )
+    return train_paths, train_labels, val_paths, val_labels, test_paths, test_labels
+
+
+def shuffle_data(paths: List[str], labels: List[int], random_state: int = SEED) -> Tuple[List[str], List[int]]:
+    """Shuffle paths and labels together"""
+    combined = list(zip(paths, labels))
+    random.Random(random_state).shuffle(combined)
+    if not combined:
+        return [], []
+    paths, labels = zip(*combined)
+    return list(paths), list(labels)
+
+
+def build_splits(data_root: Path, random_state: int = SEED) -> Dict[str, Tuple[List[str], List[int]]]:
+    """
+    Split every source separately, then merge and shuffle each split
+
+    Returns:
+        Mapping split name -> (paths, labels)
+    """
+    data_root = Path(data_root)
+    splits = {split: ([], []) for split in SPLITS}
+
+    sources = [(name, 0) for name in REAL_SOURCES] + [(name, 1) for name in FAKE_SOURCES]
+    for source, label in sources:
+        source_path = data_root / source
+        images = collect_images(source_path) if source_path.exists() else []
+        parts = split_source(images, label=label, random_state=random_state)
+        for i, split in enumerate(SPLITS):
+            splits[split][0].extend(parts[2 * i])
+            splits[split][1].extend(parts[2 * i + 1])
+
+    return {split: shuffle_data(paths, labels, random_state) for split, (paths, labels) in splits.items()}
+
+
+class FaceDataset(Dataset):
+    """Loose image files with binary labels"""
+
+    def __init__(self, image_paths: List[str], labels: List[int], transform: Optional[Callable] = None):
+        self.image_paths = image_paths
+        self.labels = labels
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, idx):
+        img_path = self.image_paths[idx]
+        label = self.labels[idx]
+
+        image = Image.open(img_path).convert('RGB')
+        if self.transform:
+            image = self.transform(image)
+
+        return image, torch.tensor(label, dtype=torch.float32)
@@ -0,0 +1,461 @@
+"""
+Precomputed CLIP feature store.
+
+The frozen CLIP visual encoder is run once per image and its 768-d features
+are written to sharded float16 .npy files, memory-mapped at read time, plus
+a path/label manifest. Training the head then reads features instead of
+decoding images and running ViT-L/14 every epoch.
+
+Layout of one split:
+    <root>/<split>/meta.json      dim, dtype, shard list and counts
+    <root>/<split>/manifest.csv   index,path,label
+    <root>/<split>/shard_00000.npy
+
+Augmented views of the training split (see extract_views) live next to it:
+    <root>/<split>/views/views.json         view ids, seeds, image count
+    <root>/<split>/views/manifest.csv       shared by all views
+    <root>/<split>/views/view_0000/...      meta.json + shards, one per view
+
+Usage:
+    python -m src.data.feature_store --data-root data/processed/sample_1pct --out data/features
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from configs.logger import get_logger
+from src.data.dataset_index import load_splits
+from src.data.face_dataset import FaceDataset
+from src.models.clip_classifier import (
+    CLIP_DIM,
+    CLIPClassifier,
+    build_preprocess,
+    build_train_transform,
+    load_clip_model,
+)
+from src.training.checkpoint import backbone_fingerprint
+
+
+logger = get_logger(__name__)
+
+META_FILE = 'meta.json'
+MANIFEST_FILE = 'manifest.csv'
+VIEWS_DIR = 'views'
+VIEWS_META_FILE = 'views.json'
+DEFAULT_SHARD_SIZE = 16384  # rows per shard, 24 MB in float16
+SEED = 42
+
+
+def _save_npy_atomic(path: Path, array: np.ndarray) -> None:
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path: Path):
+    """Paths and labels of a manifest.csv"""
+    paths, labels = [], []
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            paths.append(row['path'])
+            labels.append(int(row['label']))
+    return paths, labels
+
+
+def write_manifest(path: Path, paths: Sequence[str], labels: Sequence[int]) -> None:
+    """Write a manifest.csv of paths and labels"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['index', 'path', 'label'])
+        for index, (image_path, label) in enumerate(zip(paths, labels)):
+            writer.writerow([index, image_path, int(label)])
+
+
+def paths_digest(paths: Sequence[str]) -> str:
+    """SHA-1 of an ordered path list, to tell whether two runs cover the same images"""
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(path.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class FeatureStoreWriter:
+    """
+    Append features of one split to float16 shards
+
+    Args:
+        split_dir: Output directory of the split
+        dim: Feature dimension
+        shard_size: Rows per shard file
+        write_manifest: Write manifest.csv; disabled for augmented views,
+            which share one manifest
+        backbone: backbone_fingerprint of the encoder, recorded in meta.json
+            so head checkpoints trained on the features can carry it
+    """
+
+    def __init__(
+        self,
+        split_dir: Union[str, Path],
+        dim: int = CLIP_DIM,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        write_manifest: bool = True,
+        backbone: Optional[Dict] = None,
+    ):
+        self.split_dir = Path(split_dir)
+        self.split_dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.shard_size = shard_size
+        self.backbone = backbone
+
+        self._buffer = np.empty((shard_size, dim), dtype=np.float16)
+        self._fill = 0
+        self._shards: List[Dict] = []
+        self._count = 0
+        self._manifest_file = None
+        if write_manifest:
+            self._manifest_file = open(self.split_dir / MANIFEST_FILE, 'w', newline='', encoding='utf-8')
+            self._manifest = csv.writer(self._manifest_file)
+            self._manifest.writerow(['index', 'path', 'label'])
+
+    def add(self, features: np.ndarray, paths: Sequence[str], labels: Sequence[int]) -> None:
+        """Append a [B, dim] batch of features with their paths and labels"""
+        if features.shape[0] != len(paths) or len(paths) != len(labels):
+            raise ValueError("features, paths and labels must have the same length")
+
+        start = 0
+        while start < len(features):
+            take = min(self.shard_size - self._fill, len(features) - start)
+            self._buffer[self._fill:self._fill + take] = features[start:start + take]
+            self._fill += take
+            start += take
+            if self._fill == self.shard_size:
+                self._flush_shard()
+
+        for path, label in zip(paths, labels):
+            if self._manifest_file is not None:
+                self._manifest.writerow([self._count, path, int(label)])
+            self._count += 1
+
+    def _flush_shard(self) -> None:
+        if self._fill == 0:
+            return
+        name = f"shard_{len(self._shards):05d}.npy"
+        _save_npy_atomic(self.split_dir / name, self._buffer[:self._fill])
+        self._shards.append({'file': name, 'count': self._fill})
+        self._fill = 0
+
+    def close(self) -> None:
+        """Write the last partial shard and the metadata"""
+        self._flush_shard()
+        if self._manifest_file is not None:
+            self._manifest_file.close()
+        meta = {
+            'dim': self.dim,
+            'dtype': 'float16',
+            'count': self._count,
+            'shards': self._shards,
+        }
+        if self.backbone is not None:
+            meta['backbone'] = self.backbone
+        with open(self.split_dir / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FeatureStore:
+    """
+    Read-only, memory-mapped view of one split of the feature store
+
+    Args:
+        split_dir: Directory written by FeatureStoreWriter
+        manifest_dir: Directory holding manifest.csv, defaults to split_dir
+    """
+
+    def __init__(self, split_dir: Union[str, Path], manifest_dir: Optional[Union[str, Path]] = None):
+        self.split_dir = Path(split_dir)
+        with open(self.split_dir / META_FILE, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.dim = self.meta['dim']
+        self.shards = [np.load(self.split_dir / shard['file'], mmap_mode='r') for shard in self.meta['shards']]
+        counts = [shard['count'] for shard in self.meta['shards']]
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        self.paths, labels = read_manifest(Path(manifest_dir or self.split_dir) / MANIFEST_FILE)
+        self.labels = np.asarray(labels, dtype=np.float32)
+
+        if len(self.labels) != self.offsets[-1]:
+            raise ValueError(f"Manifest and shards disagree in {self.split_dir}")
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def gather(self, indices: np.ndarray) -> np.ndarray:
+        """Features for the given global indices as float32, [len(indices), dim]"""
+        indices = np.asarray(indices, dtype=np.int64)
+        out = np.empty((len(indices), self.dim), dtype=np.float32)
+        shard_ids = np.searchsorted(self.offsets, indices, side='right') - 1
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            local = indices[mask] - self.offsets[shard_id]
+            # Sorted reads keep the access pattern sequential within a shard
+            order = np.argsort(local)
+            rows = self.shards[shard_id][local[order]]
+            out[np.flatnonzero(mask)[order]] = rows
+        return out
+
+    def load_all(self) -> np.ndarray:
+        """Whole split as one float32 array"""
+        if not self.shards:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.concatenate([np.asarray(shard, dtype=np.float32) for shard in self.shards])
+
+
+class MultiViewFeatureStore:
+    """
+    K augmented feature views per image, one view sampled per image per epoch
+
+    Exposes the same len/labels/paths/gather interface as FeatureStore;
+    call set_epoch() at the start of every epoch to draw new views.
+
+    Args:
+        split_dir: Split directory containing views/
+        seed: Base seed of the per-epoch view sampling
+    """
+
+    def __init__(self, split_dir: Union[str, Path], seed: int = SEED):
+        self.views_dir = Path(split_dir) / VIEWS_DIR
+        with open(self.views_dir / VIEWS_META_FILE, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.views = [
+            FeatureStore(self.views_dir / view['dir'], manifest_dir=self.views_dir)
+            for view in self.meta['views']
+        ]
+        if not self.views:
+            raise ValueError(f"No feature views in {self.views_dir}")
+
+        self.dim = self.views[0].dim
+        self.paths = self.views[0].paths
+        self.labels = self.views[0].labels
+        self.seed = seed
+        self._assignment = np.zeros(len(self), dtype=np.int64)
+
+    @property
+    def num_views(self) -> int:
+        return len(self.views)
+
+    def __len__(self) -> int:
+        return len(self.views[0])
+
+    def set_epoch(self, epoch: int) -> None:
+        """Draw which view every image uses this epoch"""
+        rng = np.random.default_rng(self.seed + epoch)
+        self._assignment = rng.integers(0, self.num_views, size=len(self))
+
+    def gather(self, indices: np.ndarray) -> np.ndarray:
+        """Features of the given indices from their current views, float32"""
+        indices = np.asarray(indices, dtype=np.int64)
+        out = np.empty((len(indices), self.dim), dtype=np.float32)
+        view_ids = self._assignment[indices]
+        for view_id in np.unique(view_ids):
+            mask = view_ids == view_id
+            out[mask] = self.views[view_id].gather(indices[mask])
+        return out
+
+
+class FeatureDataset(Dataset):
+    """(feature, label) pairs of a FeatureStore for use with a DataLoader"""
+
+    def __init__(self, store: FeatureStore):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, idx):
+        feature = self.store.gather(np.array([idx]))[0]
+        return torch.from_numpy(feature), torch.tensor(self.store.labels[idx])
+
+
+@torch.no_grad()
+def extract_split(
+    model,
+    image_paths: List[str],
+    labels: List[int],
+    split_dir: Union[str, Path],
+    device: torch.device,
+    batch_size: int = 64,
+    num_workers: int = 4,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    transform=None,
+    seed: Optional[int] = None,
+    write_manifest: bool = True,
+) -> int:
+    """
+    Run the frozen backbone once over every image of a split and store the features
+
+    Args:
+        model: CLIPClassifier (only extract_features is used)
+        image_paths, labels: Images of the split
+        split_dir: Output directory of the split
+        transform: Image transform, defaults to the validation preprocessing
+        seed: Seeds random transforms in the main process and the loader
+            workers, so an augmented view can be reproduced
+
+    Returns:
+        Number of images written
+    """
+    generator = None
+    if seed is not None:
+        torch.manual_seed(seed)
+        generator = torch.Generator().manual_seed(seed)
+
+    dataset = FaceDataset(image_paths, labels, transform=transform or build_preprocess())
+    loader = DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+        pin_memory=device.type == 'cuda',
+        generator=generator,
+    )
+
+    model.eval()
+    start_time = time.time()
+    written = 0
+    backbone = backbone_fingerprint(model.clip_visual)
+    with FeatureStoreWriter(split_dir, shard_size=shard_size, write_manifest=write_manifest,
+                            backbone=backbone) as writer:
+        for images, batch_labels in loader:
+            features = model.extract_features(images.to(device, non_blocking=True))
+            batch_paths = image_paths[written:written + len(images)]
+            writer.add(features.cpu().numpy(), batch_paths, batch_labels.int().tolist())
+            written += len(images)
+
+    elapsed = time.time() - start_time
+    logger.info("Extracted %s features to %s in %.1fs (%.1f img/s)",
+                written, split_dir, elapsed, written / max(elapsed, 1e-9))
+    return written
+
+
+def extract_views(
+    model,
+    image_paths: List[str],
+    labels: List[int],
+    split_dir: Union[str, Path],
+    device: torch.device,
+    num_views: int,
+    seed: int = SEED,
+    batch_size: int = 64,
+    num_workers: int = 4,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    transform=None,
+) -> int:
+    """
+    Append num_views augmented feature views of a split
+
+    Existing views are kept; new views get the next ids and seeds, so more
+    views can be added later without recomputing the old ones.
+
+    Args:
+        transform: Augmentation transform, defaults to the notebook's training transform
+
+    Returns:
+        Total number of views after extraction
+    """
+    views_dir = Path(split_dir) / VIEWS_DIR
+    views_dir.mkdir(parents=True, exist_ok=True)
+    meta_path = views_dir / VIEWS_META_FILE
+    digest = paths_digest(image_paths)
+
+    if meta_path.exists():
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['paths_digest'] != digest:
+            raise ValueError(f"Image list differs from the existing views in {views_dir}")
+    else:
+        write_manifest(views_dir / MANIFEST_FILE, image_paths, labels)
+        meta = {'count': len(image_paths), 'paths_digest': digest, 'views': []}
+
+    transform = transform or build_train_transform()
+    first = len(meta['views'])
+    for view_id in range(first, first + num_views):
+        view = {'id': view_id, 'dir': f"view_{view_id:04d}", 'seed': seed + view_id}
+        extract_split(
+            model, image_paths, labels, views_dir / view['dir'], device,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            shard_size=shard_size,
+            transform=transform,
+            seed=view['seed'],
+            write_manifest=False,
+        )
+        # Record each finished view right away so an interrupted run keeps it
+        meta['views'].append(view)
+        tmp_path = meta_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, meta_path)
+
+    return len(meta['views'])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute CLIP features for head training")
+    parser.add_argument('--data-root', required=True, help="Directory containing the source folders")
+    parser.add_argument('--out', required=True, help="Output feature store directory")
+    parser.add_argument('--splits', nargs='+', default=['train', 'val', 'test'])
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--num-workers', type=int, default=4)
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument('--views', type=int, default=0,
+                        help="Also append this many augmented views of the train split")
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--index', default=None,
+                        help="SQLite dataset index (src.data.dataset_index) to take the splits from")
+    args = parser.parse_args(argv)
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model = CLIPClassifier(load_clip_model(device), freeze_backbone=True).to(device)
+
+    splits = load_splits(args.data_root, args.index)
+    for split in args.splits:
+        paths, labels = splits[split]
+        extract_split(
+            model, paths, labels, Path(args.out) / split, device,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            shard_size=args.shard_size,
+        )
+
+    if args.views > 0:
+        paths, labels = splits['train']
+        total = extract_views(
+            model, paths, labels, Path(args.out) / 'train', device, args.views,
+            seed=args.seed,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            shard_size=args.shard_size,
+        )
+        logger.info("Train split now has %s augmented views", total)
+
+
+if __name__ == "__main__":
+    main()
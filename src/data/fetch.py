@@ -0,0 +1,397 @@
+"""
+Resumable downloads and parallel, CRC-checked zip extraction for dataset archives.
+
+download_file streams a URL into <dest>.part and resumes an interrupted
+download with an HTTP Range request. The ETag (or Last-Modified) of the
+response is saved to <dest>.part.json and sent back as If-Range, so a file
+that changed on the server is downloaded again from the start instead of
+being spliced onto the old prefix; a .part without a saved validator is never
+resumed. The SHA-256 is computed while streaming (the already-downloaded
+prefix is hashed once when resuming), so verification costs no extra pass
+over the archive. HTML responses (quota or warning pages served in place of
+the file) are rejected.
+
+extract_zip extracts members on a thread pool, each thread with its own
+ZipFile handle (zlib and file I/O release the GIL). zipfile checks each
+member's CRC-32 as it is read, so corruption is caught during extraction
+rather than by a separate testzip() pass. Members that already exist with the
+right size and CRC are skipped, so a re-run only extracts what is missing.
+
+Plain urllib is used, so any HTTP server that honours Range requests (or a
+local http.server stand-in) can serve the archives.
+
+Usage:
+    python -m src.data.fetch --url https://host/celeba.zip --out data/archives/celeba.zip --extract-to data/raw/celeba
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from configs.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 1 << 20
+DEFAULT_RETRIES = 5
+DEFAULT_TIMEOUT = 60
+USER_AGENT = 'BTL-Deep-Learning-fetch/1.0'
+
+# Network errors after which the download is resumed rather than abandoned
+_TRANSIENT = (urllib.error.URLError, http.client.HTTPException, ConnectionError, socket.timeout, TimeoutError)
+
+
+class ChecksumError(ValueError):
+    """Downloaded content does not match the expected SHA-256"""
+
+
+class UnexpectedContentError(ValueError):
+    """The server answered with something other than the file (e.g. an HTML error page)"""
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_crc32(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> int:
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _hash_prefix(path: Path, size: int):
+    """SHA-256 state of the first size bytes of a partial download"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        remaining = size
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+def _content_range_start(header: Optional[str]) -> Optional[int]:
+    match = re.match(r'bytes (\d+)-', header or '')
+    return int(match.group(1)) if match else None
+
+
+def _content_range_total(header: Optional[str]) -> Optional[int]:
+    """Full size from 'bytes a-b/total' or 'bytes */total'"""
+    match = re.match(r'bytes (?:\d+-\d+|\*)/(\d+)', header or '')
+    return int(match.group(1)) if match else None
+
+
+def _validator(headers) -> Optional[str]:
+    """Value usable in If-Range: a strong ETag, else Last-Modified"""
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def _read_validator(meta: Path, url: str) -> Optional[str]:
+    try:
+        with open(meta, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return saved.get('validator') if saved.get('url') == url else None
+
+
+def _write_validator(meta: Path, url: str, validator: Optional[str]) -> None:
+    if validator is None:
+        meta.unlink(missing_ok=True)
+        return
+    with open(meta, 'w', encoding='utf-8') as f:
+        json.dump({'url': url, 'validator': validator}, f)
+
+
+def _discard_partial(part: Path, meta: Path) -> None:
+    part.unlink(missing_ok=True)
+    meta.unlink(missing_ok=True)
+
+
+def download_file(
+    url: str,
+    dest: Union[str, Path],
+    sha256: Optional[str] = None,
+    retries: int = DEFAULT_RETRIES,
+    timeout: float = DEFAULT_TIMEOUT,
+    headers: Optional[Dict[str, str]] = None,
+    reject_html: bool = True,
+) -> Path:
+    """
+    Download url to dest, resuming a previous partial download
+
+    An existing dest is kept when it matches sha256 (or when no checksum is
+    given). A partial download is only resumed with the validator saved when
+    it was started; servers that ignore Range or If-Range, or whose file
+    changed, make the download restart from zero.
+
+    Args:
+        sha256: Expected hex digest; ChecksumError (and the partial file
+            removed) on mismatch
+        retries: Resume attempts after a network error
+        headers: Extra request headers (e.g. authorization)
+        reject_html: Raise UnexpectedContentError on a text/html response
+
+    Returns:
+        dest
+    """
+    dest = Path(dest)
+    if dest.exists():
+        if sha256 is None or file_sha256(dest) == sha256.lower():
+            logger.info("%s already downloaded", dest)
+            return dest
+        logger.warning("%s does not match the expected checksum, downloading again", dest)
+        dest.unlink()
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = dest.with_name(dest.name + '.part')
+    meta = part.with_name(part.name + '.json')
+    start = time.time()
+    received = 0
+    digest = None
+
+    attempt = 0
+    while True:
+        offset = part.stat().st_size if part.exists() else 0
+        validator = _read_validator(meta, url) if offset else None
+        if offset and validator is None:
+            # Without a validator there is no telling whether the prefix is from the current file
+            logger.warning("No validator saved for %s, downloading %s from the start", part.name, dest.name)
+            _discard_partial(part, meta)
+            offset = 0
+
+        request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT, **(headers or {})})
+        if offset:
+            request.add_header('Range', f'bytes={offset}-')
+            # A server whose file no longer matches the validator answers 200 with the whole file
+            request.add_header('If-Range', validator)
+
+        try:
+            try:
+                response = urllib.request.urlopen(request, timeout=timeout)
+            except urllib.error.HTTPError as e:
+                if e.code == 416 and offset:
+                    total = _content_range_total(e.headers.get('Content-Range'))
+                    if total == offset:
+                        # Nothing left to fetch: the partial file is already complete
+                        digest = None
+                        break
+                    logger.warning("%s has %d bytes but the server file has %s bytes, downloading %s from the start",
+                                   part.name, offset, total if total is not None else 'an unknown number of', dest.name)
+                    _discard_partial(part, meta)
+                    continue
+                raise
+
+            with response:
+                content_type = response.headers.get('Content-Type', '')
+                if reject_html and content_type.split(';')[0].strip().lower() == 'text/html':
+                    raise UnexpectedContentError(f"{url} returned an HTML page instead of the file")
+
+                if offset and response.status == 206 and _content_range_start(response.headers.get('Content-Range')) == offset:
+                    mode, digest = 'ab', _hash_prefix(part, offset)
+                    logger.info("Resuming %s at %d bytes", dest.name, offset)
+                else:
+                    mode, digest, offset = 'wb', hashlib.sha256(), 0
+                    _write_validator(meta, url, _validator(response.headers))
+                length = response.headers.get('Content-Length')
+                expected = offset + int(length) if length is not None else None
+
+                with open(part, mode) as f:
+                    for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        received += len(chunk)
+
+            size = part.stat().st_size
+            if expected is not None and size < expected:
+                raise http.client.IncompleteRead(b'', expected - size)
+            break
+        except _TRANSIENT as e:
+            if isinstance(e, urllib.error.HTTPError) and e.code < 500:
+                raise
+            if attempt == retries:
+                raise
+            delay = min(2 ** attempt, 30)
+            attempt += 1
+            logger.warning("Download of %s interrupted (%s), resuming in %ss (%s/%s)",
+                           dest.name, e, delay, attempt, retries)
+            time.sleep(delay)
+
+    if sha256 is not None:
+        # Without a streamed digest (part completed by an earlier run) hash the file once
+        actual = digest.hexdigest() if digest is not None else file_sha256(part)
+        if actual != sha256.lower():
+            _discard_partial(part, meta)
+            raise ChecksumError(f"SHA-256 mismatch for {url}: expected {sha256}, got {actual}")
+
+    os.replace(part, dest)
+    meta.unlink(missing_ok=True)
+    elapsed = time.time() - start
+    size = dest.stat().st_size
+    logger.info("Downloaded %s (%.1f MB, %.1f MB/s)", dest, size / 1e6, received / 1e6 / max(elapsed, 1e-9))
+    return dest
+
+
+def _member_target(out_dir: Path, name: str) -> Path:
+    target = (out_dir / name).resolve()
+    if target != out_dir and out_dir not in target.parents:
+        raise zipfile.BadZipFile(f"Member escapes the output folder: {name}")
+    return target
+
+
+def _is_extracted(target: Path, info: zipfile.ZipInfo) -> bool:
+    try:
+        if target.stat().st_size != info.file_size:
+            return False
+    except OSError:
+        return False
+    return file_crc32(target) == info.CRC
+
+
+def extract_zip(
+    zip_path: Union[str, Path],
+    out_dir: Union[str, Path],
+    num_workers: int = 8,
+    skip_existing: bool = True,
+) -> Dict:
+    """
+    Extract a zip archive in parallel, checking CRCs while extracting
+
+    Each member is written to a temporary file and renamed only once its
+    CRC-32 matched, so an interrupted or failed run never leaves a truncated
+    file behind under its final name.
+
+    Args:
+        skip_existing: Keep members already present with the same size and CRC
+
+    Returns:
+        Counts of extracted and skipped members, extracted bytes, and the
+        names of failed members
+    """
+    zip_path, out_dir = Path(zip_path), Path(out_dir).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    start = time.time()
+
+    with zipfile.ZipFile(zip_path) as archive:
+        infos = archive.infolist()
+    members = [info for info in infos if not info.is_dir()]
+    for info in infos:
+        if info.is_dir():
+            _member_target(out_dir, info.filename).mkdir(parents=True, exist_ok=True)
+
+    # ZipFile handles share one file position; every thread gets its own
+    local = threading.local()
+    handles: List[zipfile.ZipFile] = []
+    handles_lock = threading.Lock()
+
+    def _archive() -> zipfile.ZipFile:
+        if not hasattr(local, 'archive'):
+            local.archive = zipfile.ZipFile(zip_path)
+            with handles_lock:
+                handles.append(local.archive)
+        return local.archive
+
+    def _extract(info: zipfile.ZipInfo) -> str:
+        target = _member_target(out_dir, info.filename)
+        if skip_existing and _is_extracted(target, info):
+            return 'skipped'
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + '.part')
+        try:
+            # Reading to EOF makes zipfile compare the CRC-32 (BadZipFile on mismatch)
+            with _archive().open(info) as src, open(tmp, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(tmp, target)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+        return 'extracted'
+
+    stats: Dict = {'extracted': 0, 'skipped': 0, 'bytes': 0, 'failed': []}
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            futures = [(info, pool.submit(_extract, info)) for info in members]
+            for info, future in futures:
+                try:
+                    outcome = future.result()
+                except (zipfile.BadZipFile, OSError, zlib.error, EOFError) as e:
+                    logger.error("Failed to extract %s: %s", info.filename, e)
+                    stats['failed'].append(info.filename)
+                    continue
+                stats[outcome] += 1
+                if outcome == 'extracted':
+                    stats['bytes'] += info.file_size
+    finally:
+        for handle in handles:
+            handle.close()
+
+    elapsed = time.time() - start
+    logger.info("Extracted %s: %s members, %s already present, %s failed, %.1f MB/s",
+                zip_path.name, stats['extracted'], stats['skipped'], len(stats['failed']),
+                stats['bytes'] / 1e6 / max(elapsed, 1e-9))
+    return stats
+
+
+def fetch_archive(
+    url: str,
+    archive_path: Union[str, Path],
+    extract_to: Union[str, Path],
+    sha256: Optional[str] = None,
+    num_workers: int = 8,
+    keep_archive: bool = True,
+) -> Dict:
+    """Download (or resume) an archive, then extract it"""
+    archive_path = download_file(url, archive_path, sha256=sha256)
+    stats = extract_zip(archive_path, extract_to, num_workers=num_workers)
+    if not keep_archive and not stats['failed']:
+        archive_path.unlink()
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Download a dataset archive with resume and extract it in parallel")
+    parser.add_argument('--url', required=True)
+    parser.add_argument('--out', required=True, help="Where to store the archive")
+    parser.add_argument('--extract-to', default=None, help="Extract the zip into this folder")
+    parser.add_argument('--sha256', default=None, help="Expected SHA-256 of the archive")
+    parser.add_argument('--num-workers', type=int, default=8, help="Extraction threads")
+    parser.add_argument('--delete-archive', action='store_true', help="Remove the archive after a clean extraction")
+    args = parser.parse_args(argv)
+
+    if args.extract_to is None:
+        download_file(args.url, args.out, sha256=args.sha256)
+        return
+    stats = fetch_archive(args.url, args.out, args.extract_to, sha256=args.sha256,
+                          num_workers=args.num_workers, keep_archive=not args.delete_archive)
+    if stats['failed']:
+        raise SystemExit(f"{len(stats['failed'])} members failed CRC/extraction")
+
+
+if __name__ == "__main__":
+    main()
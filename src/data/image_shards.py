@@ -0,0 +1,297 @@
+"""
+Packed, memory-mapped image shards for the training dataset.
+
+Images are decoded once, resized to a fixed short side with
+src/process/resize_images.py and appended as raw uint8 HxWx3 bytes to large
+shard files. Reading a sample is then a slice of a memory-mapped file instead
+of opening and decoding a loose JPEG/PNG every epoch.
+
+Layout of one split:
+    <root>/<split>/meta.json        short side, sources, shard list and counts
+    <root>/<split>/index.npy        per sample: shard, offset, height, width, label, source
+    <root>/<split>/manifest.csv     index,path,label
+    <root>/<split>/shard_00000.bin  concatenated uint8 RGB images
+
+Usage:
+    python -m src.data.image_shards --data-root data/processed/sample_1pct --out data/shards --short-side 256
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+
+from configs.logger import get_logger
+from src.data.dataset_index import load_splits
+from src.data.face_dataset import FAKE_SOURCES, REAL_SOURCES, SPLITS
+from src.data.feature_store import MANIFEST_FILE, META_FILE, read_manifest, write_manifest
+from src.process.resize_images import load_image_with_opencv, resize_short_side
+
+
+logger = get_logger(__name__)
+
+INDEX_FILE = 'index.npy'
+DEFAULT_SHORT_SIDE = 256
+DEFAULT_SHARD_BYTES = 1 << 30  # start a new shard file after 1 GB
+INDEX_DTYPE = np.dtype([
+    ('shard', np.uint32),
+    ('offset', np.uint64),
+    ('height', np.uint32),
+    ('width', np.uint32),
+    ('label', np.uint8),
+    ('source', np.uint16),
+])
+
+
+class ImageShardWriter:
+    """
+    Append resized uint8 RGB images of one split to shard files
+
+    Args:
+        split_dir: Output directory of the split
+        short_side: Short side the images were resized to (recorded in meta.json)
+        sources: Source names; samples store their position in this list
+        shard_bytes: Size after which a new shard file is started
+    """
+
+    def __init__(
+        self,
+        split_dir: Union[str, Path],
+        short_side: int,
+        sources: Sequence[str],
+        shard_bytes: int = DEFAULT_SHARD_BYTES,
+    ):
+        self.split_dir = Path(split_dir)
+        self.split_dir.mkdir(parents=True, exist_ok=True)
+        self.short_side = short_side
+        self.sources = list(sources)
+        self.shard_bytes = shard_bytes
+
+        self._rows: List[tuple] = []
+        self._paths: List[str] = []
+        self._labels: List[int] = []
+        self._shards: List[Dict] = []
+        self._file = None
+        self._written = 0
+
+    def _open_shard(self) -> None:
+        name = f"shard_{len(self._shards):05d}.bin"
+        self._file = open(self.split_dir / (name + '.tmp'), 'wb')
+        self._shards.append({'file': name, 'count': 0, 'bytes': 0})
+        self._written = 0
+
+    def _close_shard(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        name = self._shards[-1]['file']
+        os.replace(self.split_dir / (name + '.tmp'), self.split_dir / name)
+        self._file = None
+
+    def add(self, image: np.ndarray, path: str, label: int, source: str) -> None:
+        """Append one HxWx3 uint8 image"""
+        if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3:
+            raise ValueError(f"Expected an HxWx3 uint8 image, got {image.dtype} {image.shape}")
+
+        if self._file is None or self._written >= self.shard_bytes:
+            self._close_shard()
+            self._open_shard()
+
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        self._rows.append((len(self._shards) - 1, self._written, height, width, label, self.sources.index(source)))
+        self._file.write(image.data)
+        self._written += image.nbytes
+        self._shards[-1]['count'] += 1
+        self._shards[-1]['bytes'] = self._written
+        self._paths.append(path)
+        self._labels.append(label)
+
+    def close(self) -> None:
+        """Finish the last shard and write the index, manifest and metadata"""
+        self._close_shard()
+        np.save(self.split_dir / INDEX_FILE, np.array(self._rows, dtype=INDEX_DTYPE))
+        write_manifest(self.split_dir / MANIFEST_FILE, self._paths, self._labels)
+        meta = {
+            'short_side': self.short_side,
+            'channels': 3,
+            'dtype': 'uint8',
+            'count': len(self._rows),
+            'sources': self.sources,
+            'shards': self._shards,
+        }
+        with open(self.split_dir / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ShardedImageDataset(Dataset):
+    """
+    Images of one split read straight from memory-mapped shards
+
+    Samples are zero-copy views into the page cache; shards are mapped lazily
+    in each DataLoader worker.
+
+    Args:
+        split_dir: Directory written by ImageShardWriter
+        transform: Applied to each image, as for FaceDataset
+        as_pil: Hand the transform a PIL image (for torchvision PIL transforms);
+            otherwise an HxWx3 uint8 array view
+    """
+
+    def __init__(self, split_dir: Union[str, Path], transform: Optional[Callable] = None, as_pil: bool = True):
+        self.split_dir = Path(split_dir)
+        with open(self.split_dir / META_FILE, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.index = np.load(self.split_dir / INDEX_FILE)
+        self.labels = self.index['label'].astype(np.float32)
+        self.sources = self.meta['sources']
+        self.transform = transform
+        self.as_pil = as_pil
+        self._maps: Dict[int, np.memmap] = {}
+
+        if len(self.index) != self.meta['count']:
+            raise ValueError(f"Index and metadata disagree in {self.split_dir}")
+
+    def __getstate__(self):
+        # Memory maps are reopened in each worker process rather than pickled
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        return state
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def paths(self) -> List[str]:
+        return read_manifest(self.split_dir / MANIFEST_FILE)[0]
+
+    def source(self, idx: int) -> str:
+        return self.sources[int(self.index['source'][idx])]
+
+    def _shard(self, shard: int) -> np.memmap:
+        if shard not in self._maps:
+            path = self.split_dir / self.meta['shards'][shard]['file']
+            # Copy-on-write: writable views for torch without touching the file
+            self._maps[shard] = np.memmap(path, dtype=np.uint8, mode='c')
+        return self._maps[shard]
+
+    def get_image(self, idx: int) -> np.ndarray:
+        """HxWx3 uint8 view of one sample, without copying"""
+        row = self.index[idx]
+        height, width = int(row['height']), int(row['width'])
+        offset = int(row['offset'])
+        data = self._shard(int(row['shard']))[offset:offset + height * width * 3]
+        return data.reshape(height, width, 3)
+
+    def __getitem__(self, idx):
+        image = self.get_image(idx)
+        if self.as_pil:
+            image = Image.fromarray(image)
+        if self.transform:
+            image = self.transform(image)
+
+        return image, torch.tensor(self.labels[idx], dtype=torch.float32)
+
+
+def _init_worker() -> None:
+    # One image per process; OpenCV's own threads would only oversubscribe the pool
+    cv2.setNumThreads(1)
+
+
+def _load_resized(task):
+    path, short_side = task
+    try:
+        return resize_short_side(load_image_with_opencv(path), short_side)
+    except Exception:
+        return None
+
+
+def write_split(
+    paths: Sequence[str],
+    labels: Sequence[int],
+    sources: Sequence[str],
+    split_dir: Union[str, Path],
+    short_side: int = DEFAULT_SHORT_SIDE,
+    num_workers: int = 4,
+    shard_bytes: int = DEFAULT_SHARD_BYTES,
+) -> Dict:
+    """
+    Decode, resize and pack the images of one split
+
+    Args:
+        paths: Image paths
+        labels: Labels aligned with paths
+        sources: Source name of every image, aligned with paths
+        num_workers: Decode/resize processes
+
+    Returns:
+        Counts of written and failed images and elapsed seconds
+    """
+    source_names = [name for name in REAL_SOURCES + FAKE_SOURCES if name in set(sources)]
+    source_names += sorted(set(sources) - set(source_names))
+
+    start = time.time()
+    failed = 0
+    tasks = ((path, short_side) for path in paths)
+    with ImageShardWriter(split_dir, short_side, source_names, shard_bytes) as writer, \
+            multiprocessing.Pool(num_workers, initializer=_init_worker) as pool:
+        # imap keeps input order, so the index lines up with paths/labels
+        for path, label, source, image in zip(paths, labels, sources, pool.imap(_load_resized, tasks, chunksize=32)):
+            if image is None:
+                failed += 1
+                logger.warning("Skipping unreadable image: %s", path)
+                continue
+            writer.add(image, path, int(label), source)
+
+    elapsed = time.time() - start
+    written = len(paths) - failed
+    logger.info("Packed %s images (%s failed) into %s in %.1fs (%.1f img/s)",
+                written, failed, split_dir, elapsed, written / max(elapsed, 1e-9))
+    return {'written': written, 'failed': failed, 'seconds': round(elapsed, 2)}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Pack resized images into memory-mapped shards")
+    parser.add_argument('--data-root', required=True, help="Folder with the source sub-folders")
+    parser.add_argument('--out', default='data/shards', help="Output directory")
+    parser.add_argument('--splits', nargs='+', default=list(SPLITS), choices=SPLITS)
+    parser.add_argument('--short-side', type=int, default=DEFAULT_SHORT_SIDE)
+    parser.add_argument('--num-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--shard-mb', type=int, default=DEFAULT_SHARD_BYTES >> 20, help="Shard file size in MB")
+    parser.add_argument('--index', default=None,
+                        help="SQLite dataset index (src.data.dataset_index) to take the splits from")
+    args = parser.parse_args(argv)
+
+    data_root = Path(args.data_root)
+    splits = load_splits(data_root, args.index)
+    for split in args.splits:
+        paths, labels = splits[split]
+        if not paths:
+            logger.warning("No images for split '%s', skipping", split)
+            continue
+        sources = [Path(os.path.relpath(path, data_root)).parts[0] for path in paths]
+        write_split(
+            paths, labels, sources, Path(args.out) / split,
+            short_side=args.short_side,
+            num_workers=args.num_workers,
+            shard_bytes=args.shard_mb << 20,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Streaming per-source sampling of data/raw into data/processed/sample_1pct.
+
+Replaces the collect-everything-then-random.sample approach of
+notebooks/sample_1pct.ipynb. Directory entries are streamed with os.scandir
+and never held in memory:
+
+    1. one pass counts the images of a source (no stat calls), which fixes
+       the sample size max(min, int(count * ratio));
+    2. a second pass keeps a bounded reservoir of the entries with the
+       smallest seeded hash of their relative path (bottom-k sampling).
+
+Memory is proportional to the sample, not to the raw tree, and the sample
+only depends on the seed and the relative paths, not on the order in which
+the filesystem lists them.
+
+The sample is materialized with reflinks or hardlinks where the filesystem
+allows it and falls back to copying on a thread pool.
+
+Usage:
+    python -m src.data.sampler --raw-root data/raw --out data/processed/sample_1pct --ratio 0.1
+"""
+import argparse
+import errno
+import hashlib
+import heapq
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from configs.logger import get_logger
+from src.data.face_dataset import ALLOWED_EXT, SEED
+
+
+logger = get_logger(__name__)
+
+DEFAULT_RATIO = 0.1
+DEFAULT_MIN = 1
+LINK_MODES = ('auto', 'reflink', 'hardlink', 'copy')
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+# Errors meaning "this filesystem cannot link/clone here", as opposed to a real I/O failure
+_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTTY,
+                getattr(errno, 'EOPNOTSUPP', errno.ENOTSUP), errno.ENOTSUP, errno.EINVAL, errno.ENOSYS}
+
+
+def iter_image_paths(root: Union[str, Path]) -> Iterator[str]:
+    """Yield the path of every image under root, streaming os.scandir entries"""
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != '__pycache__':
+                        stack.append(entry.path)
+                elif os.path.splitext(entry.name)[1] in ALLOWED_EXT:
+                    yield entry.path
+
+
+def sample_priority(rel_path: str, seed: int = SEED) -> int:
+    """Seeded 64-bit pseudo-random priority of a path; the smallest ones are sampled"""
+    digest = hashlib.blake2b(f"{seed}:{rel_path}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def sample_size(count: int, ratio: float, minimum: int) -> int:
+    return min(count, max(minimum, int(count * ratio)))
+
+
+def reservoir_sample(root: Union[str, Path], k: int, seed: int = SEED, rel_to: Optional[Union[str, Path]] = None) -> List[str]:
+    """
+    Uniform sample of k images under root in one streaming pass
+
+    Keeps a max-heap of the k smallest priorities seen so far, so memory is
+    O(k) whatever the number of files.
+
+    Returns:
+        Paths relative to rel_to (default: root), sorted
+    """
+    rel_to = str(rel_to if rel_to is not None else root)
+    heap: List[Tuple[int, str]] = []  # (-priority, rel_path)
+    if k <= 0:
+        return []
+    for path in iter_image_paths(root):
+        rel_path = Path(os.path.relpath(path, rel_to)).as_posix()
+        priority = sample_priority(rel_path, seed)
+        if len(heap) < k:
+            heapq.heappush(heap, (-priority, rel_path))
+        elif priority < -heap[0][0]:
+            heapq.heapreplace(heap, (-priority, rel_path))
+    return sorted(rel_path for _, rel_path in heap)
+
+
+def _reflink(src: str, dst: str) -> None:
+    import fcntl  # POSIX only; ImportError is treated as "unsupported"
+
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        try:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        except OSError:
+            fout.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+class Linker:
+    """
+    Materialize files as reflinks, hardlinks or copies
+
+    In 'auto' mode reflink is tried first, then hardlink, then copy; a method
+    that fails with an "unsupported" error is not tried again.
+
+    Args:
+        mode: One of LINK_MODES
+    """
+
+    def __init__(self, mode: str = 'auto'):
+        if mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode '{mode}', expected one of {LINK_MODES}")
+        self.methods = ['reflink', 'hardlink', 'copy'] if mode == 'auto' else [mode]
+        self._lock = threading.Lock()
+
+    def __call__(self, src: str, dst: str) -> str:
+        """Create dst from src and return the method that was used"""
+        for method in list(self.methods):
+            try:
+                if method == 'reflink':
+                    _reflink(src, dst)
+                elif method == 'hardlink':
+                    os.link(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+                return method
+            except (OSError, ImportError) as e:
+                unsupported = isinstance(e, ImportError) or e.errno in _UNSUPPORTED
+                if method == 'copy' or not unsupported or len(self.methods) == 1:
+                    raise
+                with self._lock:
+                    # Another thread may already have given up on this method
+                    if method in self.methods:
+                        self.methods.remove(method)
+                        logger.info("%s not supported for %s (%s), falling back to %s", method, dst, e, self.methods[0])
+        raise OSError(f"No link method left for {dst}")
+
+
+def materialize(
+    rel_paths: Sequence[str],
+    src_root: Union[str, Path],
+    dst_root: Union[str, Path],
+    mode: str = 'auto',
+    num_workers: int = 16,
+    linker: Optional[Linker] = None,
+) -> Dict[str, int]:
+    """
+    Link or copy files to the same relative paths under dst_root
+
+    Existing destination files are left untouched. Pass a shared linker to
+    remember unsupported methods across calls (mode is then ignored).
+
+    Returns:
+        Number of files per method used, plus 'existing' and 'failed'
+    """
+    src_root, dst_root = Path(src_root), Path(dst_root)
+    linker = linker or Linker(mode)
+    stats: Dict[str, int] = {'existing': 0, 'failed': 0}
+
+    def _one(rel_path: str) -> str:
+        src, dst = src_root / rel_path, dst_root / rel_path
+        if dst.exists():
+            return 'existing'
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            return linker(str(src), str(dst))
+        except OSError as e:
+            logger.warning("Cannot materialize %s: %s", src, e)
+            return 'failed'
+
+    # Link/copy calls are syscall- or I/O-bound and release the GIL
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        for outcome in pool.map(_one, rel_paths):
+            stats[outcome] = stats.get(outcome, 0) + 1
+    return stats
+
+
+def sample_tree(
+    raw_root: Union[str, Path],
+    out_root: Union[str, Path],
+    ratio: float = DEFAULT_RATIO,
+    minimum: int = DEFAULT_MIN,
+    seed: int = SEED,
+    source_ratios: Optional[Dict[str, float]] = None,
+    source_minimums: Optional[Dict[str, int]] = None,
+    sources: Optional[Sequence[str]] = None,
+    mode: str = 'auto',
+    num_workers: int = 16,
+) -> Dict[str, Dict]:
+    """
+    Sample every source folder of raw_root into out_root
+
+    Args:
+        ratio, minimum: Default fraction and minimum number of images per source
+        source_ratios, source_minimums: Per-source overrides
+        sources: Source folders to sample (default: every sub-folder)
+        mode: How files are materialized, see Linker
+
+    Returns:
+        Per source: total, sampled and materialize counts
+    """
+    raw_root, out_root = Path(raw_root), Path(out_root)
+    source_ratios = source_ratios or {}
+    source_minimums = source_minimums or {}
+    if sources is None:
+        sources = sorted(entry.name for entry in os.scandir(raw_root)
+                         if entry.is_dir() and entry.name != '__pycache__')
+
+    linker = Linker(mode)
+    summary = {}
+    for source in sources:
+        start = time.time()
+        source_dir = raw_root / source
+        total = sum(1 for _ in iter_image_paths(source_dir))
+        if total == 0:
+            logger.warning("%s: no images, skipping", source)
+            continue
+
+        k = sample_size(total, source_ratios.get(source, ratio), source_minimums.get(source, minimum))
+        rel_paths = reservoir_sample(source_dir, k, seed, rel_to=raw_root)
+        stats = materialize(rel_paths, raw_root, out_root, num_workers=num_workers, linker=linker)
+        summary[source] = {'total': total, 'sampled': len(rel_paths), **stats}
+        logger.info("%s: sampled %s/%s (%.2f%%) in %.1fs: %s",
+                    source, len(rel_paths), total, 100 * len(rel_paths) / total, time.time() - start, stats)
+    return summary
+
+
+def _parse_overrides(items: Sequence[str], cast) -> Dict:
+    overrides = {}
+    for item in items:
+        name, sep, value = item.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected SOURCE=VALUE, got '{item}'")
+        overrides[name] = cast(value)
+    return overrides
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Sample a fraction of every raw source folder")
+    parser.add_argument('--raw-root', default='data/raw', help="Folder with one sub-folder per source")
+    parser.add_argument('--out', default='data/processed/sample_1pct', help="Output folder")
+    parser.add_argument('--ratio', type=float, default=DEFAULT_RATIO, help="Fraction of images per source")
+    parser.add_argument('--min', type=int, default=DEFAULT_MIN, dest='minimum', help="Minimum images per source")
+    parser.add_argument('--source-ratio', nargs='*', default=[], metavar='SOURCE=RATIO',
+                        help="Per-source ratio overrides")
+    parser.add_argument('--source-min', nargs='*', default=[], metavar='SOURCE=N',
+                        help="Per-source minimum overrides")
+    parser.add_argument('--sources', nargs='+', default=None, help="Source folders to sample (default: all)")
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--mode', default='auto', choices=LINK_MODES,
+                        help="reflink/hardlink/copy, or auto to use the cheapest that works")
+    parser.add_argument('--num-workers', type=int, default=16, help="Threads linking/copying files")
+    args = parser.parse_args(argv)
+
+    summary = sample_tree(
+        args.raw_root, args.out,
+        ratio=args.ratio,
+        minimum=args.minimum,
+        seed=args.seed,
+        source_ratios=_parse_overrides(args.source_ratio, float),
+        source_minimums=_parse_overrides(args.source_min, int),
+        sources=args.sources,
+        mode=args.mode,
+        num_workers=args.num_workers,
+    )
+    total = sum(s['sampled'] for s in summary.values())
+    logger.info("Done: %s images sampled into %s", total, args.out)
+
+
+if __name__ == "__main__":
+    main()
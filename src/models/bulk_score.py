@@ -0,0 +1,303 @@
+"""
+Offline bulk scoring of stored images with CLIPClassifier, resumable after a crash.
+
+Images come from a directory (scanned recursively, sorted) or a manifest
+(.csv with a 'path' column, e.g. a feature store manifest.csv, or a text file
+with one path per line). They are cut into fixed shards of --shard-size
+images; every shard is written to <out>/scores_NNNNN.parquet (or .csv) via a
+temporary file and a rename, so a file under its final name is always
+complete. A re-run with the same input skips the shards already on disk and
+only scores the rest.
+
+Decoding and build_preprocess run in DataLoader worker processes, the model
+sees fixed-size batches (the last batch of a shard may be smaller), and the
+run ends with images/sec and the time spent waiting for decoded batches,
+in the model and writing shards. Unreadable images get an empty score and
+their error in the 'error' column instead of stopping the run.
+
+Usage:
+    python -m src.models.bulk_score --input-dir /mnt/images --packaged models/classifier_visual.pt --out scores/nightly
+    python -m src.models.bulk_score --manifest data/features/test/manifest.csv --checkpoint models/best_model.pth \\
+        --out scores/test --format csv
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+from configs.logger import get_logger
+from src.data.feature_store import paths_digest
+from src.data.sampler import iter_image_paths
+from src.models.clip_classifier import CLIPClassifier, build_preprocess, load_clip_model
+from src.models.package import load_packaged_classifier
+from src.models.precision import PRECISIONS, apply_inference_precision
+from src.training.checkpoint import load_checkpoint
+
+
+logger = get_logger(__name__)
+
+FORMATS = ('parquet', 'csv')
+RUN_FILE = 'run.json'
+SHARD_FILE = 'scores_{shard:05d}.{ext}'
+DEFAULT_SHARD_SIZE = 50000
+COLUMNS = ('path', 'prob_fake', 'predicted_label', 'predicted_class', 'error')
+
+
+def read_input_paths(input_dir: Optional[str] = None, manifest: Optional[str] = None) -> List[str]:
+    """Image paths of a directory (sorted) or a manifest (in manifest order)"""
+    if input_dir is not None:
+        return sorted(iter_image_paths(input_dir))
+    with open(manifest, 'r', newline='', encoding='utf-8') as f:
+        if manifest.endswith('.csv'):
+            return [row['path'] for row in csv.DictReader(f)]
+        return [line.strip() for line in f if line.strip()]
+
+
+class ScoringDataset(Dataset):
+    """Decoded, preprocessed images; unreadable files yield a blank image and their error"""
+
+    def __init__(self, image_paths: List[str], transform=None):
+        self.image_paths = image_paths
+        self.transform = transform or build_preprocess()
+        self._blank = None
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, idx):
+        try:
+            with Image.open(self.image_paths[idx]) as image:
+                return self.transform(image.convert('RGB')), ''
+        except Exception as e:
+            if self._blank is None:
+                self._blank = self.transform(Image.new('RGB', (1, 1)))
+            return self._blank, f"{type(e).__name__}: {e}"
+
+
+class ShardBatchSampler(Sampler[List[int]]):
+    """
+    Index batches of the pending shards, generated lazily; no batch crosses a shard boundary
+
+    Args:
+        pending: Shards still to score, in order
+        total: Number of images of the whole run
+    """
+
+    def __init__(self, pending: Sequence[int], total: int, shard_size: int, batch_size: int):
+        self.pending = list(pending)
+        self.total = total
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+
+    def _shard_range(self, shard: int) -> range:
+        return range(shard * self.shard_size, min((shard + 1) * self.shard_size, self.total))
+
+    def __iter__(self) -> Iterator[List[int]]:
+        for shard in self.pending:
+            indices = self._shard_range(shard)
+            for start in range(0, len(indices), self.batch_size):
+                yield list(indices[start:start + self.batch_size])
+
+    def __len__(self) -> int:
+        return sum(-(-len(self._shard_range(shard)) // self.batch_size) for shard in self.pending)
+
+
+def write_shard(rows: Dict[str, list], path: Path, fmt: str) -> None:
+    """Write a shard of scores atomically"""
+    frame = pd.DataFrame(rows, columns=list(COLUMNS))
+    tmp_path = path.with_name(path.name + '.tmp')
+    if fmt == 'parquet':
+        frame.to_parquet(tmp_path, index=False)
+    else:
+        frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _check_format(fmt: str) -> None:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401  optional dependency, only needed for Parquet output
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow); use --format csv without it")
+
+
+def _open_run(out_dir: Path, paths: Sequence[str], shard_size: int, fmt: str) -> None:
+    """Record the run parameters, or check that a resumed run uses the same ones"""
+    run = {'count': len(paths), 'paths_sha1': paths_digest(paths), 'shard_size': shard_size, 'format': fmt}
+    run_path = out_dir / RUN_FILE
+    if run_path.exists():
+        with open(run_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous != run:
+            raise ValueError(f"{out_dir} holds a run over a different input or shard layout "
+                             f"({previous} != {run}); use another --out")
+        return
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(run_path, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+
+
+@torch.no_grad()
+def score_paths(
+    model: CLIPClassifier,
+    paths: List[str],
+    out_dir: Union[str, Path],
+    device: torch.device,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    batch_size: int = 64,
+    num_workers: int = 4,
+    fmt: str = 'parquet',
+) -> Dict:
+    """
+    Score every image and write the results shard by shard, skipping finished shards
+
+    Returns:
+        Counts (images scored, shards written/skipped, decode errors), images/sec
+        and seconds per stage (decode wait, model, write)
+    """
+    _check_format(fmt)
+    out_dir = Path(out_dir)
+    _open_run(out_dir, paths, shard_size, fmt)
+
+    num_shards = -(-len(paths) // shard_size)
+
+    def shard_path(shard: int) -> Path:
+        return out_dir / SHARD_FILE.format(shard=shard, ext=fmt)
+
+    pending = [shard for shard in range(num_shards) if not shard_path(shard).exists()]
+    if len(pending) < num_shards:
+        logger.info("Resuming: %s/%s shards already written", num_shards - len(pending), num_shards)
+
+    loader = DataLoader(
+        ScoringDataset(paths),
+        batch_sampler=ShardBatchSampler(pending, len(paths), shard_size, batch_size),
+        num_workers=num_workers,
+        pin_memory=device.type == 'cuda',
+    )
+
+    model.eval()
+    stats = {'images': 0, 'errors': 0, 'shards_written': 0, 'shards_skipped': num_shards - len(pending),
+             'decode_seconds': 0.0, 'model_seconds': 0.0, 'write_seconds': 0.0}
+    rows: Dict[str, list] = {column: [] for column in COLUMNS}
+    shard_iter = iter(pending)
+    shard = next(shard_iter, None)
+    start_time = time.perf_counter()
+    mark = start_time
+
+    for images, errors in loader:
+        now = time.perf_counter()
+        stats['decode_seconds'] += now - mark
+
+        probs = model(images.to(device, non_blocking=True)).float().view(-1).cpu()
+        stats['model_seconds'] += time.perf_counter() - now
+
+        offset = shard * shard_size + len(rows['path'])
+        for i, (prob, error) in enumerate(zip(probs.tolist(), errors)):
+            rows['path'].append(paths[offset + i])
+            rows['error'].append(error or None)
+            if error:
+                stats['errors'] += 1
+                prob = None
+            rows['prob_fake'].append(prob)
+            rows['predicted_label'].append(None if prob is None else int(prob > 0.5))
+            rows['predicted_class'].append(None if prob is None else ('Fake' if prob > 0.5 else 'Real'))
+        stats['images'] += len(probs)
+
+        if len(rows['path']) == min(shard_size, len(paths) - shard * shard_size):
+            write_start = time.perf_counter()
+            write_shard(rows, shard_path(shard), fmt)
+            stats['write_seconds'] += time.perf_counter() - write_start
+            stats['shards_written'] += 1
+            logger.info("Wrote %s (%s/%s, %.1f img/s)",
+                        shard_path(shard).name, stats['shards_written'], len(pending),
+                        stats['images'] / max(time.perf_counter() - start_time, 1e-9))
+            rows = {column: [] for column in COLUMNS}
+            shard = next(shard_iter, None)
+        mark = time.perf_counter()
+
+    stats['seconds'] = time.perf_counter() - start_time
+    stats['images_per_sec'] = stats['images'] / max(stats['seconds'], 1e-9)
+    for key in ('decode_seconds', 'model_seconds', 'write_seconds', 'seconds', 'images_per_sec'):
+        stats[key] = round(stats[key], 2)
+    return stats
+
+
+def load_scoring_model(
+    device: torch.device,
+    packaged: Optional[str] = None,
+    checkpoint: Optional[str] = None,
+    precision: str = 'fp32',
+) -> CLIPClassifier:
+    """
+    Classifier as the API serves it
+
+    With packaged, the packaged model (and its head, unless a head checkpoint
+    is given); otherwise CLIP with the checkpoint's weights.
+    """
+    if packaged is not None:
+        model = load_packaged_classifier(packaged, device)
+        if checkpoint is not None:
+            load_checkpoint(model, checkpoint, device)
+    else:
+        model = CLIPClassifier(load_clip_model(device), freeze_backbone=True).to(device)
+        load_checkpoint(model, checkpoint or 'models/best_model.pth', device)
+    model.eval()
+    return apply_inference_precision(model, precision)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Score stored images in bulk with resumable sharded output")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input-dir', default=None, help="Score every image under this folder")
+    source.add_argument('--manifest', default=None, help="CSV with a 'path' column, or one path per line")
+    parser.add_argument('--out', required=True, help="Output folder of the score shards")
+    parser.add_argument('--format', default='parquet', choices=FORMATS)
+    parser.add_argument('--packaged', default=None, help="Packaged model (src.models.package); no CLIP needed")
+    parser.add_argument('--checkpoint', default=None,
+                        help="Head/model checkpoint (default with CLIP: models/best_model.pth)")
+    parser.add_argument('--precision', default='fp32', choices=PRECISIONS)
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help="Images per output shard")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--num-workers', type=int, default=4, help="Decode processes")
+    parser.add_argument('--threads', type=int, default=None, help="torch intra-op threads")
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    args = parser.parse_args(argv)
+
+    _check_format(args.format)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = torch.device(args.device)
+
+    paths = read_input_paths(args.input_dir, args.manifest)
+    if not paths:
+        raise SystemExit("No images to score")
+    logger.info("Scoring %s images into %s", len(paths), args.out)
+
+    model = load_scoring_model(device, args.packaged, args.checkpoint, args.precision)
+    stats = score_paths(
+        model, paths, args.out, device,
+        shard_size=args.shard_size,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        fmt=args.format,
+    )
+    logger.info("Scored %s images in %ss (%s img/s), "
+                "%s unreadable; %s shards written, "
+                "%s already done; decode wait %ss, "
+                "model %ss, write %ss",
+                stats['images'], stats['seconds'], stats['images_per_sec'], stats['errors'], stats['shards_written'],
+                stats['shards_skipped'], stats['decode_seconds'], stats['model_seconds'], stats['write_seconds'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+CLIP ViT-L/14 based real vs fake face classifier and its preprocessing.
+
+Shared by the API, training and offline tooling so every entry point builds
+the exact same model and input pipeline.
+"""
+from pathlib import Path
+from typing import Optional, Union
+
+import torch
+import torch.nn as nn
+from torch.profiler import record_function
+from torchvision import transforms
+
+
+IMG_SIZE = 224
+CLIP_DIM = 768  # CLIP ViT-L/14 visual output dim
+CLIP_MEAN = [0.48145466, 0.4578275, 0.40821073]
+CLIP_STD = [0.26862954, 0.26130258, 0.27577711]
+
+
+def build_head() -> nn.Sequential:
+    """Trainable 3-layer MLP head, [B, 768] features -> [B, 1] fake probability."""
+    return nn.Sequential(
+        nn.Linear(CLIP_DIM, 64),
+        nn.ReLU(),
+        nn.Dropout(0.3),
+        nn.Linear(64, 32),
+        nn.ReLU(),
+        nn.Dropout(0.3),
+        nn.Linear(32, 1),
+        nn.Sigmoid(),
+    )
+
+
+def load_clip_model(device: torch.device, name: str = "ViT-L/14"):
+    """Load the pretrained CLIP model (requires the openai CLIP package)."""
+    import clip  # type: ignore
+
+    clip_model, _ = clip.load(name, device=device)
+    return clip_model
+
+
+class CLIPClassifier(nn.Module):
+    """CLIP visual backbone (frozen) + small linear head for binary classification."""
+    def __init__(self, clip_model, freeze_backbone: bool = True):
+        super().__init__()
+        self.clip_visual = clip_model.visual
+        self.clip_visual.eval()
+
+        if freeze_backbone:
+            for p in self.clip_visual.parameters():
+                p.requires_grad = False
+
+        self.head = build_head()
+        # Reduced-precision autocast for the backbone, see src.models.precision
+        self.autocast_dtype: Optional[torch.dtype] = None
+
+    def extract_features(self, x: torch.Tensor) -> torch.Tensor:
+        """Frozen backbone features, [B, 768] float32."""
+        # Match dtype expected by CLIP visual encoder
+        x = x.to(self.clip_visual.conv1.weight.dtype)
+        with torch.no_grad(), record_function('backbone'), torch.autocast(
+            device_type=x.device.type,
+            dtype=self.autocast_dtype or torch.bfloat16,
+            enabled=self.autocast_dtype is not None,
+        ):
+            features = self.clip_visual(x)
+        return features.float()
+
+    def classify(self, features: torch.Tensor) -> torch.Tensor:
+        """Head on precomputed features, [B, 768] -> [B] fake probability."""
+        with record_function('head'):
+            out = self.head(features)  # [B, 1]
+        return out.view(-1)  # [B]
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.classify(self.extract_features(x))
+
+
+def load_classifier_checkpoint(
+    model: CLIPClassifier,
+    path: Union[str, Path],
+    device: torch.device,
+) -> dict:
+    """
+    Load weights saved by the notebook (full model) or by src.training.train_head (head only).
+
+    Returns:
+        The raw checkpoint dict
+    """
+    checkpoint = torch.load(path, map_location=device)
+    restore_classifier_state(model, checkpoint)
+    return checkpoint
+
+
+def restore_classifier_state(model: CLIPClassifier, checkpoint: dict) -> None:
+    """Apply an already loaded notebook (full model) or head_state_dict checkpoint."""
+    if 'head_state_dict' in checkpoint:
+        # Head trained on precomputed features (src.training.train_head)
+        model.head.load_state_dict(checkpoint['head_state_dict'])
+    else:
+        state_dict = checkpoint.get('model_state_dict', checkpoint)
+        model.load_state_dict(state_dict)
+
+
+def build_preprocess() -> transforms.Compose:
+    """Validation-style preprocessing used during training in the notebook."""
+    return transforms.Compose([
+        transforms.Resize(IMG_SIZE),
+        transforms.CenterCrop(IMG_SIZE),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=CLIP_MEAN, std=CLIP_STD),
+    ])
+
+
+def build_train_transform() -> transforms.Compose:
+    """Training augmentation used in the notebook."""
+    return transforms.Compose([
+        transforms.Resize(256),
+        transforms.RandomCrop(IMG_SIZE),
+        transforms.RandomHorizontalFlip(p=0.5),
+        transforms.RandomRotation(15),
+        transforms.ColorJitter(brightness=0.2, contrast=0.2),
+        transforms.GaussianBlur(kernel_size=3, sigma=(0.1, 2.0)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=CLIP_MEAN, std=CLIP_STD),
+    ])
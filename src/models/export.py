@@ -0,0 +1,132 @@
+"""
+Export the trained CLIPClassifier (visual encoder + head) as one static-shape graph.
+
+The graph takes a [B, 3, 224, 224] float32 batch and returns both the 768-d
+features and the fake probability, so the API cache keeps working. Next to
+the graph the export writes:
+    <out>.json     format, static batch size, input size, head version
+    <out>.head.pt  head weights, for re-scoring cached features
+
+Usage:
+    python -m src.models.export --checkpoint models/best_model.pth --format onnx \
+        --batch-size 8 --out models/exported/classifier.onnx
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import torch
+import torch.nn as nn
+
+from configs.logger import get_logger
+from src.api.backends import EagerBackend, check_parity, load_exported_backend
+from src.api.cache import head_version
+from src.models.clip_classifier import (
+    IMG_SIZE,
+    CLIPClassifier,
+    load_clip_model,
+)
+from src.training.checkpoint import load_checkpoint
+
+
+logger = get_logger(__name__)
+
+EXPORT_FORMATS = ('onnx', 'torchscript')
+
+
+class ExportableClassifier(nn.Module):
+    """Wraps CLIPClassifier so the graph returns (features, fake probability)"""
+
+    def __init__(self, model: CLIPClassifier):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        features = self.model.extract_features(x)
+        return features, self.model.classify(features)
+
+
+def export_classifier(
+    model: CLIPClassifier,
+    out_path: Union[str, Path],
+    export_format: str,
+    batch_size: int,
+    opset: int = 17,
+) -> Path:
+    """
+    Write the exported graph, its metadata and the head weights
+
+    Args:
+        model: fp32 classifier with trained weights, on CPU
+        export_format: 'onnx' or 'torchscript'
+        batch_size: Static batch dimension of the graph
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}', expected one of {EXPORT_FORMATS}")
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    wrapper = ExportableClassifier(model.float().eval()).eval()
+    example = torch.randn(batch_size, 3, IMG_SIZE, IMG_SIZE)
+
+    with torch.no_grad():
+        if export_format == 'torchscript':
+            traced = torch.jit.trace(wrapper, example)
+            traced = torch.jit.freeze(traced)
+            traced.save(str(out_path))
+        else:
+            export_kwargs = dict(
+                input_names=['images'],
+                output_names=['features', 'prob_fake'],
+                opset_version=opset,
+                do_constant_folding=True,
+            )
+            try:
+                torch.onnx.export(wrapper, (example,), str(out_path), dynamo=False, **export_kwargs)
+            except TypeError:
+                # torch versions before the dynamo exporter have no `dynamo` argument
+                torch.onnx.export(wrapper, (example,), str(out_path), **export_kwargs)
+
+    torch.save(model.head.state_dict(), Path(str(out_path) + '.head.pt'))
+    meta = {
+        'format': export_format,
+        'batch_size': batch_size,
+        'input_shape': [batch_size, 3, IMG_SIZE, IMG_SIZE],
+        'outputs': ['features', 'prob_fake'],
+        'head_version': head_version(model.head),
+    }
+    with open(Path(str(out_path) + '.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    logger.info("Exported %s graph with static batch %s to %s", export_format, batch_size, out_path)
+    return out_path
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export CLIPClassifier to ONNX or TorchScript")
+    parser.add_argument('--checkpoint', default='models/best_model.pth')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='onnx')
+    parser.add_argument('--batch-size', type=int, default=8, help="Static batch size of the graph")
+    parser.add_argument('--out', required=True, help="Output graph path")
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--atol', type=float, default=1e-3, help="Parity tolerance vs eager PyTorch")
+    args = parser.parse_args(argv)
+
+    device = torch.device('cpu')
+    model = CLIPClassifier(load_clip_model(device), freeze_backbone=True).to(device)
+    load_checkpoint(model, args.checkpoint, device)
+    model.eval()
+
+    export_classifier(model, args.out, args.format, args.batch_size, opset=args.opset)
+
+    # Odd batch size exercises both padding and chunking of the static graph
+    inputs = torch.randn(args.batch_size + 3, 3, IMG_SIZE, IMG_SIZE)
+    report = check_parity(EagerBackend(model, device), load_exported_backend(args.format, args.out), inputs, args.atol)
+    logger.info("Parity vs eager: %s", report)
+    if not report['ok']:
+        raise SystemExit(f"Exported graph does not match eager PyTorch within {args.atol}: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Self-contained, memory-mappable weight file for serving CLIPClassifier.
+
+Packaging keeps only the visual encoder and the head (no text tower) plus the
+architecture needed to rebuild them, in torch's zip format. Loading builds
+the modules on the meta device and assigns tensors straight from the
+memory-mapped file: nothing is allocated or read up front, pages are mapped
+lazily on first use and are shared between replicas through the page cache.
+Neither step needs the CLIP package at serving time.
+
+Usage:
+    python -m src.models.package --checkpoint models/best_model.pth --out models/classifier_visual.pt
+"""
+import argparse
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Optional, Union
+
+import torch
+
+from configs.logger import get_logger
+from src.api.cache import head_version
+from src.models.clip_classifier import (
+    IMG_SIZE,
+    CLIPClassifier,
+    load_clip_model,
+)
+from src.models.vision_transformer import VisionTransformer, infer_vit_config
+from src.training.checkpoint import load_checkpoint
+
+
+logger = get_logger(__name__)
+
+PACKAGE_FORMAT = 'clip-visual-classifier-v1'
+DTYPES = {'fp32': torch.float32, 'fp16': torch.float16}
+
+
+def package_classifier(model: CLIPClassifier, out_path: Union[str, Path], dtype: str = 'fp32') -> Path:
+    """
+    Write the visual encoder + head weights of a trained classifier
+
+    Args:
+        model: Classifier with trained weights
+        dtype: Storage dtype of the backbone, 'fp32' (mmap-friendly on CPU)
+            or 'fp16' (half the size, for GPU serving). The head stays fp32.
+    """
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    state_dict = {}
+    for key, tensor in model.state_dict().items():
+        target = DTYPES[dtype] if key.startswith('clip_visual.') else torch.float32
+        state_dict[key] = tensor.detach().to('cpu', target).contiguous().clone()
+
+    package = {
+        'format': PACKAGE_FORMAT,
+        'vit_config': infer_vit_config(model.clip_visual.state_dict()),
+        'dtype': dtype,
+        'head_version': head_version(model.head),
+        'state_dict': state_dict,
+    }
+    tmp_path = out_path.with_suffix(out_path.suffix + '.tmp')
+    torch.save(package, tmp_path)
+    os.replace(tmp_path, out_path)
+
+    size_mb = out_path.stat().st_size / 1024 / 1024
+    logger.info("Packaged visual encoder + head (%s, %.1f MB) to %s", dtype, size_mb, out_path)
+    return out_path
+
+
+def load_packaged_classifier(path: Union[str, Path], device: torch.device, mmap: bool = True) -> CLIPClassifier:
+    """
+    Build CLIPClassifier from a packaged weight file, without CLIP
+
+    Args:
+        path: File written by package_classifier
+        device: Target device; on CPU the weights stay memory-mapped
+        mmap: Memory-map the file instead of reading it into RAM
+    """
+    package = torch.load(path, map_location='cpu', mmap=mmap, weights_only=True)
+    if package.get('format') != PACKAGE_FORMAT:
+        raise ValueError(f"{path} is not a packaged classifier ({PACKAGE_FORMAT})")
+
+    # Meta-device modules allocate nothing; assign=True adopts the mapped tensors
+    with torch.device('meta'):
+        visual = VisionTransformer(**package['vit_config'])
+        model = CLIPClassifier(SimpleNamespace(visual=visual), freeze_backbone=True)
+    model.load_state_dict(package['state_dict'], assign=True)
+
+    for p in model.clip_visual.parameters():
+        p.requires_grad_(False)
+    model.eval()
+
+    if device.type == 'cpu' and package['dtype'] != 'fp32':
+        logger.warning("fp16 package on CPU: converting to fp32 in memory, weights are no longer memory-mapped")
+        model.clip_visual.float()
+    return model.to(device)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Package visual encoder + head into one memory-mappable file")
+    parser.add_argument('--checkpoint', default='models/best_model.pth')
+    parser.add_argument('--out', default='models/classifier_visual.pt')
+    parser.add_argument('--dtype', choices=sorted(DTYPES), default='fp32')
+    args = parser.parse_args(argv)
+
+    device = torch.device('cpu')
+    model = CLIPClassifier(load_clip_model(device), freeze_backbone=True).to(device)
+    load_checkpoint(model, args.checkpoint, device)
+    model.eval()
+
+    package_classifier(model, args.out, args.dtype)
+
+    # Sanity check: the packaged model must reproduce the original outputs
+    packaged = load_packaged_classifier(args.out, device)
+    inputs = torch.randn(2, 3, IMG_SIZE, IMG_SIZE)
+    with torch.no_grad():
+        diff = (model(inputs) - packaged(inputs)).abs().max().item()
+    logger.info("Max probability difference vs original model: %.2e", diff)
+    if diff > (1e-4 if args.dtype == 'fp32' else 1e-2):
+        raise SystemExit(f"Packaged model does not reproduce the original outputs (max diff {diff})")
+
+
+if __name__ == "__main__":
+    main()
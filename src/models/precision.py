@@ -0,0 +1,186 @@
+"""
+Inference precision modes for CLIPClassifier and a parity/throughput benchmark.
+
+Modes:
+    fp32  full precision (reference)
+    bf16  bfloat16 autocast around the visual encoder
+    int8  dynamic int8 quantization of the visual transformer's nn.Linear
+          layers (CPU only); the head stays fp32
+
+Usage (compare modes on a held-out folder laid out like data/processed):
+    python -m src.models.precision --data-root data/processed/holdout --modes fp32 bf16 int8
+"""
+import argparse
+import copy
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+
+from configs.logger import get_logger
+from src.data.face_dataset import FAKE_SOURCES, REAL_SOURCES, FaceDataset, collect_images
+from src.models.clip_classifier import (
+    CLIPClassifier,
+    build_preprocess,
+    load_clip_model,
+)
+from src.training.checkpoint import load_checkpoint
+
+
+logger = get_logger(__name__)
+
+PRECISIONS = ('fp32', 'bf16', 'int8')
+
+
+def apply_inference_precision(model: CLIPClassifier, precision: str) -> CLIPClassifier:
+    """
+    Switch a loaded, eval-mode classifier to an inference precision (in place)
+
+    Args:
+        model: Classifier with trained weights already loaded
+        precision: One of PRECISIONS
+
+    Returns:
+        The same model, for chaining
+    """
+    precision = precision.lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+
+    device = model.clip_visual.conv1.weight.device
+    if precision == 'fp32':
+        model.autocast_dtype = None
+        model.clip_visual.float()
+    elif precision == 'bf16':
+        model.clip_visual.float()
+        model.autocast_dtype = torch.bfloat16
+    elif precision == 'int8':
+        if device.type != 'cpu':
+            raise ValueError("int8 dynamic quantization is only supported on CPU")
+        model.autocast_dtype = None
+        model.clip_visual = torch.ao.quantization.quantize_dynamic(
+            model.clip_visual.float(), {nn.Linear}, dtype=torch.qint8
+        )
+
+    logger.info("Inference precision: %s", precision)
+    return model
+
+
+@torch.no_grad()
+def _run_mode(model: CLIPClassifier, batches: List[torch.Tensor], warmup: int = 1) -> Dict:
+    for batch in batches[:warmup]:
+        model(batch)
+
+    probs = []
+    start = time.perf_counter()
+    for batch in batches:
+        probs.append(model(batch))
+    elapsed = time.perf_counter() - start
+
+    probs = torch.cat(probs)
+    return {'probs': probs, 'seconds': elapsed, 'images_per_sec': len(probs) / max(elapsed, 1e-9)}
+
+
+def benchmark_precisions(
+    model: CLIPClassifier,
+    loader: DataLoader,
+    modes: List[str],
+    limit: Optional[int] = None,
+) -> Dict[str, Dict]:
+    """
+    Accuracy, fp32 parity and images/sec for each precision mode
+
+    Images are decoded once up front so only model time is measured.
+
+    Args:
+        model: fp32 classifier with trained weights, on CPU
+        loader: Yields (images, labels) of the held-out set
+        modes: Precision modes to compare; fp32 is always run as reference
+        limit: Maximum number of images
+    """
+    batches, labels = [], []
+    seen = 0
+    for images, batch_labels in loader:
+        batches.append(images)
+        labels.append(batch_labels)
+        seen += len(images)
+        if limit is not None and seen >= limit:
+            break
+    labels = torch.cat(labels)
+
+    ordered = ['fp32'] + [mode for mode in modes if mode != 'fp32']
+    results: Dict[str, Dict] = {}
+    probs: Dict[str, torch.Tensor] = {}
+    for mode in ordered:
+        candidate = apply_inference_precision(copy.deepcopy(model).eval(), mode)
+        run = _run_mode(candidate, batches)
+        probs[mode] = run['probs']
+        results[mode] = {
+            'images': len(labels),
+            'images_per_sec': round(run['images_per_sec'], 2),
+            'accuracy': round(((probs[mode] > 0.5).float() == labels).float().mean().item(), 6),
+        }
+
+    reference = results['fp32']
+    for mode, result in results.items():
+        result['accuracy_delta_vs_fp32'] = round(result['accuracy'] - reference['accuracy'], 6)
+        result['speedup_vs_fp32'] = round(result['images_per_sec'] / max(reference['images_per_sec'], 1e-9), 3)
+        result['max_abs_prob_diff'] = round((probs[mode] - probs['fp32']).abs().max().item(), 6)
+        result['prediction_agreement'] = round(
+            ((probs[mode] > 0.5) == (probs['fp32'] > 0.5)).float().mean().item(), 6
+        )
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare inference precisions of CLIPClassifier")
+    parser.add_argument('--data-root', required=True, help="Held-out folder with the source sub-folders")
+    parser.add_argument('--checkpoint', default='models/best_model.pth')
+    parser.add_argument('--modes', nargs='+', default=list(PRECISIONS), choices=PRECISIONS)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--limit', type=int, default=512, help="Maximum number of images")
+    parser.add_argument('--num-workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=None, help="torch intra-op threads")
+    parser.add_argument('--output', default=None, help="Optional JSON report path")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    device = torch.device('cpu')
+    model = CLIPClassifier(load_clip_model(device), freeze_backbone=True).to(device)
+    load_checkpoint(model, args.checkpoint, device)
+    model.eval()
+
+    paths, labels = [], []
+    for sources, label in ((REAL_SOURCES, 0), (FAKE_SOURCES, 1)):
+        for source in sources:
+            source_path = Path(args.data_root) / source
+            images = collect_images(source_path) if source_path.exists() else []
+            paths.extend(str(p) for p in images)
+            labels.extend([label] * len(images))
+    if not paths:
+        raise SystemExit(f"No images found under {args.data_root}")
+
+    # Shuffle with a fixed seed so --limit keeps both classes
+    order = torch.randperm(len(paths), generator=torch.Generator().manual_seed(42)).tolist()
+    dataset = FaceDataset([paths[i] for i in order], [labels[i] for i in order], transform=build_preprocess())
+    loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=False, num_workers=args.num_workers)
+
+    results = benchmark_precisions(model, loader, args.modes, limit=args.limit)
+    for mode, result in results.items():
+        logger.info("%s: %s", mode, result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+CLIP visual encoder without the CLIP package.
+
+Re-implements the VisionTransformer of openai/CLIP (clip/model.py) with the
+same module and parameter names, so the `visual.*` weights of a CLIP model
+load into it unchanged. The serving path uses it to build the backbone from
+a packaged visual-only checkpoint, without the text tower or the CLIP
+dependency.
+"""
+from collections import OrderedDict
+from typing import Dict
+
+import torch
+import torch.nn as nn
+
+
+# Architecture of CLIP ViT-L/14's visual tower
+VIT_L_14 = {
+    'input_resolution': 224,
+    'patch_size': 14,
+    'width': 1024,
+    'layers': 24,
+    'heads': 16,
+    'output_dim': 768,
+}
+
+
+class LayerNorm(nn.LayerNorm):
+    """LayerNorm computed in fp32 to handle fp16 weights, as in CLIP."""
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        orig_type = x.dtype
+        ret = super().forward(x.type(torch.float32))
+        return ret.type(orig_type)
+
+
+class QuickGELU(nn.Module):
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return x * torch.sigmoid(1.702 * x)
+
+
+class ResidualAttentionBlock(nn.Module):
+    def __init__(self, d_model: int, n_head: int):
+        super().__init__()
+        self.attn = nn.MultiheadAttention(d_model, n_head)
+        self.ln_1 = LayerNorm(d_model)
+        self.mlp = nn.Sequential(OrderedDict([
+            ("c_fc", nn.Linear(d_model, d_model * 4)),
+            ("gelu", QuickGELU()),
+            ("c_proj", nn.Linear(d_model * 4, d_model)),
+        ]))
+        self.ln_2 = LayerNorm(d_model)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        h = self.ln_1(x)
+        x = x + self.attn(h, h, h, need_weights=False)[0]
+        x = x + self.mlp(self.ln_2(x))
+        return x
+
+
+class Transformer(nn.Module):
+    def __init__(self, width: int, layers: int, heads: int):
+        super().__init__()
+        self.width = width
+        self.layers = layers
+        self.resblocks = nn.Sequential(*[ResidualAttentionBlock(width, heads) for _ in range(layers)])
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.resblocks(x)
+
+
+class VisionTransformer(nn.Module):
+    """CLIP ViT image encoder, [B, 3, R, R] -> [B, output_dim]"""
+
+    def __init__(self, input_resolution: int, patch_size: int, width: int, layers: int, heads: int, output_dim: int):
+        super().__init__()
+        self.input_resolution = input_resolution
+        self.output_dim = output_dim
+        self.conv1 = nn.Conv2d(in_channels=3, out_channels=width, kernel_size=patch_size, stride=patch_size, bias=False)
+
+        scale = width ** -0.5
+        self.class_embedding = nn.Parameter(scale * torch.randn(width))
+        self.positional_embedding = nn.Parameter(scale * torch.randn((input_resolution // patch_size) ** 2 + 1, width))
+        self.ln_pre = LayerNorm(width)
+
+        self.transformer = Transformer(width, layers, heads)
+
+        self.ln_post = LayerNorm(width)
+        self.proj = nn.Parameter(scale * torch.randn(width, output_dim))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = self.conv1(x)  # [B, width, grid, grid]
+        x = x.reshape(x.shape[0], x.shape[1], -1)  # [B, width, grid ** 2]
+        x = x.permute(0, 2, 1)  # [B, grid ** 2, width]
+        class_token = self.class_embedding.to(x.dtype) + torch.zeros(
+            x.shape[0], 1, x.shape[-1], dtype=x.dtype, device=x.device
+        )
+        x = torch.cat([class_token, x], dim=1)  # [B, grid ** 2 + 1, width]
+        x = x + self.positional_embedding.to(x.dtype)
+        x = self.ln_pre(x)
+
+        x = x.permute(1, 0, 2)  # NLD -> LND
+        x = self.transformer(x)
+        x = x.permute(1, 0, 2)  # LND -> NLD
+
+        x = self.ln_post(x[:, 0, :])
+        return x @ self.proj
+
+
+def infer_vit_config(visual_state_dict: Dict[str, torch.Tensor]) -> Dict[str, int]:
+    """Recover the VisionTransformer arguments from its weights (as clip.model.build_model does)"""
+    width = visual_state_dict['conv1.weight'].shape[0]
+    patch_size = visual_state_dict['conv1.weight'].shape[-1]
+    layers = len({
+        key.split('.')[2] for key in visual_state_dict
+        if key.startswith('transformer.resblocks.') and key.endswith('.attn.in_proj_weight')
+    })
+    grid_size = round((visual_state_dict['positional_embedding'].shape[0] - 1) ** 0.5)
+    return {
+        'input_resolution': patch_size * grid_size,
+        'patch_size': patch_size,
+        'width': width,
+        'layers': layers,
+        'heads': width // 64,
+        'output_dim': visual_state_dict['proj'].shape[1],
+    }
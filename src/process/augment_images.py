@@ -1,6 +1,15 @@
 import cv2
 import numpy as np
 import random
+
+# Tham số của random_augmentation_pipeline (dùng chung với bản xử lý theo batch)
+AUGMENT_PROB = 0.5            # Xác suất áp dụng mỗi phép biến đổi
+MAX_ROTATION = 15             # Góc xoay tối đa (độ)
+MAX_SHIFT = 15                # Dịch chuyển tối đa (pixel)
+MAX_BRIGHTNESS = 30           # Độ sáng cộng thêm tối đa
+CONTRAST_RANGE = (0.7, 1.3)   # Hệ số tương phản
+NOISE_STD_RANGE = (5, 20)     # Độ lệch chuẩn của nhiễu Gaussian
+
 def augment_flip(image_array: np.ndarray, flip_code: int = 1) -> np.ndarray:
     """
     Thực hiện lật ảnh.
@@ -147,52 +156,140 @@ def augment_add_noise(image_array: np.ndarray, std_dev: float = 20.0) -> np.ndar
 # (Giả định: Các hàm augment_flip, augment_rotation, augment_shift, 
 # augment_brightness, augment_contrast, augment_add_noise đã được định nghĩa ở trên)
 
-def random_augmentation_pipeline(image_array: np.ndarray) -> np.ndarray:
+def fused_affine_matrix(height: int, width: int, flip: bool, angle: float, shift_x: int, shift_y: int) -> np.ndarray:
+    """
+    Gộp lật ngang -> xoay -> dịch chuyển thành một ma trận affine 2x3.
+
+    Tương đương gọi lần lượt augment_flip(flip_code=1), augment_rotation và
+    augment_shift, nhưng ảnh chỉ cần lấy mẫu lại một lần.
+
+    Args:
+        height, width: Kích thước ảnh.
+        flip: Có lật ngang hay không.
+        angle: Góc xoay (độ), quanh tâm (w // 2, h // 2).
+        shift_x, shift_y: Số pixel dịch chuyển.
+
+    Returns:
+        np.ndarray: Ma trận 2x3 cho cv2.warpAffine.
+    """
+    M = np.eye(3)
+    if flip:
+        M = np.array([[-1.0, 0, width - 1], [0, 1.0, 0], [0, 0, 1.0]])
+    if angle:
+        R = np.vstack([cv2.getRotationMatrix2D((width // 2, height // 2), angle, 1.0), [0, 0, 1.0]])
+        M = R @ M
+    M[0, 2] += shift_x
+    M[1, 2] += shift_y
+    return M[:2]
+
+def brightness_contrast_lut(brightness: int = 0, contrast: float = 1.0) -> np.ndarray:
+    """
+    Bảng tra 256 phần tử gộp augment_brightness rồi augment_contrast.
+
+    Kết quả giống hệt khi gọi hai hàm lần lượt (kể cả bước clip và cắt phần
+    thập phân), nhưng chỉ tính trên 256 giá trị thay vì trên từng pixel.
+
+    Returns:
+        np.ndarray: LUT uint8 cho cv2.LUT.
+    """
+    values = np.clip(np.arange(256, dtype=np.int16) + brightness, 0, 255)
+    return np.clip(values.astype(float) * contrast, 0, 255).astype(np.uint8)
+
+# Ví dụ sử dụng:
+# lut = brightness_contrast_lut(brightness=20, contrast=1.2)
+# cv2.LUT(my_image, lut, dst=my_image)
+
+def _fused_augmentation(image_array: np.ndarray) -> np.ndarray:
+    """
+    Bản gộp của random_augmentation_pipeline: rút các số ngẫu nhiên theo đúng
+    thứ tự như bản gốc, sau đó một lần warpAffine và một lần LUT (tại chỗ).
+    """
+    h, w = image_array.shape[:2]
+
+    flip = random.random() < AUGMENT_PROB
+    angle = random.uniform(-MAX_ROTATION, MAX_ROTATION) if random.random() < AUGMENT_PROB else 0.0
+    shift_x = shift_y = 0
+    if random.random() < AUGMENT_PROB:
+        shift_x = random.randint(-MAX_SHIFT, MAX_SHIFT)
+        shift_y = random.randint(-MAX_SHIFT, MAX_SHIFT)
+    brightness = random.randint(-MAX_BRIGHTNESS, MAX_BRIGHTNESS) if random.random() < AUGMENT_PROB else 0
+    contrast = random.uniform(*CONTRAST_RANGE) if random.random() < AUGMENT_PROB else 1.0
+    std_dev = random.uniform(*NOISE_STD_RANGE) if random.random() < AUGMENT_PROB else 0.0
+
+    # Hình học: một lần lấy mẫu lại thay vì tối đa ba lần
+    if flip and not angle and not (shift_x or shift_y):
+        augmented_image = cv2.flip(image_array, 1)
+    elif flip or angle or shift_x or shift_y:
+        M = fused_affine_matrix(h, w, flip, angle, shift_x, shift_y)
+        augmented_image = cv2.warpAffine(image_array, M, (w, h))
+    else:
+        augmented_image = None
+
+    # Màu sắc: một bảng tra áp dụng tại chỗ, không tạo bản sao int16/float
+    if brightness or contrast != 1.0:
+        lut = brightness_contrast_lut(brightness, contrast)
+        if augmented_image is None:
+            augmented_image = cv2.LUT(image_array, lut)
+        else:
+            cv2.LUT(augmented_image, lut, dst=augmented_image)
+
+    if augmented_image is None:
+        augmented_image = image_array.copy()
+
+    if std_dev:
+        augmented_image = augment_add_noise(augmented_image, std_dev=std_dev)
+    return augmented_image
+
+def random_augmentation_pipeline(image_array: np.ndarray, fused: bool = False) -> np.ndarray:
     """
     Tạo một pipeline để áp dụng ngẫu nhiên các kỹ thuật tăng cường dữ liệu ảnh.
 
     Args:
         image_array (np.ndarray): Ảnh đầu vào (H x W x C, uint8).
+        fused (bool): Gộp lật/xoay/dịch chuyển thành một lần warpAffine và
+            độ sáng/độ tương phản thành một LUT. Cùng phân phối đầu ra, nhanh hơn.
 
     Returns:
         np.ndarray: Ảnh đã được tăng cường ngẫu nhiên.
     """
+    if fused:
+        return _fused_augmentation(image_array)
+
     # Tạo bản sao để tránh thay đổi ảnh gốc
     augmented_image = image_array.copy()
 
     # --- 1. Tăng cường Hình học (Geometric Augmentation) ---
 
     # Lật Ngang (Horizontal Flip)
-    if random.random() < 0.5: # 50% cơ hội lật ngang
+    if random.random() < AUGMENT_PROB: # 50% cơ hội lật ngang
         augmented_image = augment_flip(augmented_image, flip_code=1)
         
     # Xoay (Rotation)
-    if random.random() < 0.5: # 50% cơ hội xoay
-        angle = random.uniform(-15, 15)
+    if random.random() < AUGMENT_PROB: # 50% cơ hội xoay
+        angle = random.uniform(-MAX_ROTATION, MAX_ROTATION)
         augmented_image = augment_rotation(augmented_image, angle=angle)
         
     # Dịch chuyển (Shifting)
-    if random.random() < 0.5: # 50% cơ hội dịch chuyển
-        max_shift = 15 # Dịch chuyển tối đa 15 pixel
-        shift_x = random.randint(-max_shift, max_shift)
-        shift_y = random.randint(-max_shift, max_shift)
+    if random.random() < AUGMENT_PROB: # 50% cơ hội dịch chuyển
+        shift_x = random.randint(-MAX_SHIFT, MAX_SHIFT) # Dịch chuyển tối đa 15 pixel
+        shift_y = random.randint(-MAX_SHIFT, MAX_SHIFT)
         augmented_image = augment_shift(augmented_image, shift_x, shift_y)
 
     # --- 2. Tăng cường Màu sắc và Độ sáng (Color Augmentation) ---
     
     # Điều chỉnh Độ sáng (Brightness)
-    if random.random() < 0.5: # 50% cơ hội thay đổi độ sáng
-        brightness_factor = random.randint(-30, 30)
+    if random.random() < AUGMENT_PROB: # 50% cơ hội thay đổi độ sáng
+        brightness_factor = random.randint(-MAX_BRIGHTNESS, MAX_BRIGHTNESS)
         augmented_image = augment_brightness(augmented_image, factor=brightness_factor)
 
     # Điều chỉnh Độ tương phản (Contrast)
-    if random.random() < 0.5: # 50% cơ hội thay đổi độ tương phản
-        contrast_factor = random.uniform(0.7, 1.3) # Từ 70% đến 130%
+    if random.random() < AUGMENT_PROB: # 50% cơ hội thay đổi độ tương phản
+        contrast_factor = random.uniform(*CONTRAST_RANGE) # Từ 70% đến 130%
         augmented_image = augment_contrast(augmented_image, factor=contrast_factor)
         
     # Thêm Nhiễu (Noise)
-    if random.random() < 0.5: # 50% cơ hội thêm nhiễu
-        std_dev = random.uniform(5, 20)
+    if random.random() < AUGMENT_PROB: # 50% cơ hội thêm nhiễu
+        std_dev = random.uniform(*NOISE_STD_RANGE)
         augmented_image = augment_add_noise(augmented_image, std_dev=std_dev)
 
     # Ghi chú: Kỹ thuật Random Cropping thường được xử lý riêng 
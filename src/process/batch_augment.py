@@ -0,0 +1,287 @@
+"""
+Tăng cường dữ liệu theo batch, vector hóa bằng torch.
+
+Cùng phân phối với random_augmentation_pipeline (lật, xoay, dịch chuyển, độ
+sáng, độ tương phản, nhiễu, mỗi phép có xác suất AUGMENT_PROB) nhưng xử lý cả
+batch (N, H, W, C) uint8 một lần:
+    - lật/xoay/dịch chuyển của từng ảnh được gộp thành một ma trận affine và
+      áp dụng bằng một lần grid_sample cho cả batch;
+    - độ sáng/độ tương phản là phép broadcast trên tensor của batch;
+    - nhiễu của mọi ảnh trong batch được sinh bằng một lần torch.randn.
+Tham số ngẫu nhiên của mỗi ảnh sinh từ seed riêng của ảnh đó nên không phụ
+thuộc vào thứ tự hay số worker của DataLoader; riêng nhiễu được sinh chung cho
+batch từ seed của các ảnh trong batch, nên chỉ tái lập được với cùng cách chia
+batch (cùng sampler và batch_size).
+
+Không khớp từng pixel với bản cv2: grid_sample nội suy khác cv2.warpAffine
+(lệch ±1 khi chỉ xoay, lệch lớn ở viền khi xoay + dịch chuyển) và nhiễu dùng
+bộ sinh số của torch thay vì numpy. Phân phối tham số thì giống hệt.
+
+Ví dụ:
+    loader = DataLoader(IndexedDataset(ShardedImageDataset(root, as_pil=False)),
+                        batch_size=64, collate_fn=AugmentCollate(crop_size=224))
+"""
+import multiprocessing
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import Dataset
+
+from src.models.clip_classifier import CLIP_MEAN, CLIP_STD
+from src.process.augment_images import (
+    AUGMENT_PROB,
+    CONTRAST_RANGE,
+    MAX_BRIGHTNESS,
+    MAX_ROTATION,
+    MAX_SHIFT,
+    NOISE_STD_RANGE,
+)
+from src.process.resize_images import resize_short_side
+
+
+SEED = 42
+
+
+def sample_seeds(indices: Sequence[int], seed: int = SEED, epoch: int = 0) -> List[int]:
+    """
+    Seed của từng ảnh, suy ra từ (seed, epoch, chỉ số ảnh).
+
+    Returns:
+        List[int]: Một seed cho mỗi chỉ số.
+    """
+    return [int(np.random.SeedSequence([seed, epoch, int(i)]).generate_state(1)[0]) for i in indices]
+
+
+def sample_augmentation_params(seeds: Sequence[int]) -> Dict[str, np.ndarray]:
+    """
+    Sinh tham số tăng cường cho từng ảnh theo đúng thứ tự và xác suất của
+    random_augmentation_pipeline.
+
+    Args:
+        seeds (Sequence[int]): Seed của từng ảnh.
+
+    Returns:
+        Dict[str, np.ndarray]: Mảng độ dài N cho mỗi tham số (flip, angle,
+            shift_x, shift_y, brightness, contrast, noise_std, noise_seed).
+    """
+    n = len(seeds)
+    params = {
+        'flip': np.zeros(n, dtype=bool),
+        'angle': np.zeros(n, dtype=np.float64),
+        'shift_x': np.zeros(n, dtype=np.int64),
+        'shift_y': np.zeros(n, dtype=np.int64),
+        'brightness': np.zeros(n, dtype=np.int64),
+        'contrast': np.ones(n, dtype=np.float64),
+        'noise_std': np.zeros(n, dtype=np.float64),
+        'noise_seed': np.zeros(n, dtype=np.int64),
+    }
+    for i, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        params['flip'][i] = rng.random() < AUGMENT_PROB
+        if rng.random() < AUGMENT_PROB:
+            params['angle'][i] = rng.uniform(-MAX_ROTATION, MAX_ROTATION)
+        if rng.random() < AUGMENT_PROB:
+            params['shift_x'][i] = rng.integers(-MAX_SHIFT, MAX_SHIFT, endpoint=True)
+            params['shift_y'][i] = rng.integers(-MAX_SHIFT, MAX_SHIFT, endpoint=True)
+        if rng.random() < AUGMENT_PROB:
+            params['brightness'][i] = rng.integers(-MAX_BRIGHTNESS, MAX_BRIGHTNESS, endpoint=True)
+        if rng.random() < AUGMENT_PROB:
+            params['contrast'][i] = rng.uniform(*CONTRAST_RANGE)
+        if rng.random() < AUGMENT_PROB:
+            params['noise_std'][i] = rng.uniform(*NOISE_STD_RANGE)
+        params['noise_seed'][i] = rng.integers(0, 2 ** 62)
+    return params
+
+
+def affine_matrices(params: Dict[str, np.ndarray], height: int, width: int) -> np.ndarray:
+    """
+    Ma trận affine 3x3 (tọa độ pixel) của lật -> xoay -> dịch chuyển cho từng ảnh.
+
+    Xoay quanh tâm (w // 2, h // 2) giống cv2.getRotationMatrix2D trong augment_rotation.
+
+    Returns:
+        np.ndarray: (N, 3, 3) biến đổi từ ảnh gốc sang ảnh đích.
+    """
+    n = len(params['flip'])
+    matrices = np.tile(np.eye(3), (n, 1, 1))
+
+    # Lật ngang: x' = (w - 1) - x
+    flip = params['flip']
+    matrices[flip, 0, 0] = -1.0
+    matrices[flip, 0, 2] = width - 1
+
+    # Xoay quanh tâm; góc dương là ngược chiều kim đồng hồ như OpenCV
+    radians = np.deg2rad(params['angle'])
+    cos, sin = np.cos(radians), np.sin(radians)
+    cx, cy = width // 2, height // 2
+    rotation = np.tile(np.eye(3), (n, 1, 1))
+    rotation[:, 0, 0], rotation[:, 0, 1], rotation[:, 0, 2] = cos, sin, (1 - cos) * cx - sin * cy
+    rotation[:, 1, 0], rotation[:, 1, 1], rotation[:, 1, 2] = -sin, cos, sin * cx + (1 - cos) * cy
+
+    shift = np.tile(np.eye(3), (n, 1, 1))
+    shift[:, 0, 2] = params['shift_x']
+    shift[:, 1, 2] = params['shift_y']
+
+    return shift @ rotation @ matrices
+
+
+def _to_theta(matrices: np.ndarray, height: int, width: int) -> torch.Tensor:
+    """Đổi ma trận pixel (gốc -> đích) thành theta (đích -> gốc, tọa độ chuẩn hóa) cho affine_grid."""
+    to_norm = np.array([[2.0 / (width - 1), 0, -1], [0, 2.0 / (height - 1), -1], [0, 0, 1]])
+    from_norm = np.linalg.inv(to_norm)
+    theta = to_norm @ np.linalg.inv(matrices) @ from_norm
+    return torch.from_numpy(theta[:, :2, :]).float()
+
+
+def batch_augment(
+    images: Union[np.ndarray, torch.Tensor],
+    seeds: Optional[Sequence[int]] = None,
+    params: Optional[Dict[str, np.ndarray]] = None,
+) -> Union[np.ndarray, torch.Tensor]:
+    """
+    Tăng cường ngẫu nhiên cả batch ảnh một lần.
+
+    Args:
+        images: Batch (N, H, W, C) uint8, dạng np.ndarray hoặc torch.Tensor.
+        seeds: Seed của từng ảnh; mặc định sinh ngẫu nhiên.
+        params: Tham số đã sinh sẵn (bỏ qua seeds), xem sample_augmentation_params.
+
+    Returns:
+        Batch đã tăng cường, cùng kiểu, kích thước và dtype uint8 với đầu vào.
+    """
+    is_numpy = isinstance(images, np.ndarray)
+    batch = torch.from_numpy(images) if is_numpy else images
+    if batch.dtype != torch.uint8 or batch.dim() != 4:
+        raise ValueError(f"Expected an (N, H, W, C) uint8 batch, got {batch.dtype} {tuple(batch.shape)}")
+
+    n, height, width, _ = batch.shape
+    if params is None:
+        if seeds is None:
+            seeds = np.random.SeedSequence().generate_state(n).tolist()
+        params = sample_augmentation_params(seeds)
+
+    x = batch.permute(0, 3, 1, 2).float()  # (N, C, H, W)
+
+    # --- 1. Hình học: một lần lấy mẫu cho các ảnh có lật/xoay/dịch chuyển ---
+    geometric = params['flip'] | (params['angle'] != 0) | (params['shift_x'] != 0) | (params['shift_y'] != 0)
+    if geometric.any():
+        idx = torch.from_numpy(np.flatnonzero(geometric))
+        theta = _to_theta(affine_matrices(params, height, width)[geometric], height, width).to(x.device)
+        grid = F.affine_grid(theta, [len(idx), x.shape[1], height, width], align_corners=True)
+        # Viền đen như cv2.warpAffine; làm tròn về số nguyên như ảnh uint8
+        x[idx] = F.grid_sample(x[idx], grid, mode='bilinear', padding_mode='zeros', align_corners=True).round_()
+
+    # --- 2. Màu sắc: chỉ trên các ảnh cần, cắt về [0, 255] sau mỗi bước như bản gốc ---
+    photometric = np.flatnonzero((params['brightness'] != 0) | (params['contrast'] != 1))
+    if len(photometric):
+        idx = torch.from_numpy(photometric)
+        brightness = torch.from_numpy(params['brightness'][photometric]).float().view(-1, 1, 1, 1).to(x.device)
+        contrast = torch.from_numpy(params['contrast'][photometric]).float().view(-1, 1, 1, 1).to(x.device)
+        x[idx] = x[idx].add_(brightness).clamp_(0, 255).mul_(contrast).clamp_(0, 255).floor_()
+
+    # Nhiễu: một lần randn cho mọi ảnh cần nhiễu, generator lấy seed từ seed nhiễu của các ảnh đó
+    noisy = np.flatnonzero(params['noise_std'] > 0)
+    if len(noisy):
+        idx = torch.from_numpy(noisy)
+        batch_seed = int(np.random.SeedSequence(params['noise_seed'][noisy].tolist()).generate_state(1)[0])
+        generator = torch.Generator(device=x.device).manual_seed(batch_seed)
+        noise = torch.randn((len(noisy), *x.shape[1:]), generator=generator, device=x.device)
+        std = torch.from_numpy(params['noise_std'][noisy]).float().view(-1, 1, 1, 1).to(x.device)
+        x[idx] = x[idx].add_(noise.mul_(std)).clamp_(0, 255).floor_()
+
+    out = x.to(torch.uint8).permute(0, 2, 3, 1).contiguous()
+    return out.numpy() if is_numpy else out
+
+
+class IndexedDataset(Dataset):
+    """Bọc một Dataset để trả thêm chỉ số mẫu, dùng làm seed tăng cường của AugmentCollate."""
+
+    def __init__(self, dataset: Dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        return (*self.dataset[idx], idx)
+
+
+class AugmentCollate:
+    """
+    collate_fn tăng cường cả batch một lần thay vì từng ảnh trong __getitem__.
+
+    Mỗi mẫu là (ảnh H x W x C uint8, nhãn) hoặc (ảnh, nhãn, chỉ số) khi dùng
+    IndexedDataset; có chỉ số thì seed tăng cường của ảnh được suy ra từ
+    (seed, epoch, chỉ số) nên tái lập được.
+
+    epoch nằm trong bộ nhớ chia sẻ nên set_epoch có tác dụng cả với worker
+    của DataLoader đã khởi động (persistent_workers=True). Gọi set_epoch trước
+    khi bắt đầu duyệt loader của epoch đó.
+
+    Args:
+        crop_size (int): Cắt mỗi ảnh về crop_size x crop_size trước khi tăng cường.
+        seed (int): Seed gốc.
+        random_crop (bool): Cắt ở vị trí ngẫu nhiên (theo seed của ảnh) thay vì ở giữa.
+        augment (bool): Tắt để chỉ cắt và chuẩn hóa (tập val/test).
+        normalize (bool): Trả về float (N, C, H, W) chuẩn hóa theo CLIP;
+            nếu không trả về uint8 (N, H, W, C).
+    """
+
+    def __init__(
+        self,
+        crop_size: int = 224,
+        seed: int = SEED,
+        random_crop: bool = True,
+        augment: bool = True,
+        normalize: bool = True,
+    ):
+        self.crop_size = crop_size
+        self.seed = seed
+        self.random_crop = random_crop
+        self.augment = augment
+        self.normalize = normalize
+        # Worker nhận collate_fn một lần khi khởi động; giá trị chia sẻ giữ epoch đồng bộ với tiến trình chính
+        self._epoch = multiprocessing.RawValue('q', 0)
+        self._mean = torch.tensor(CLIP_MEAN).view(1, 3, 1, 1) * 255.0
+        self._std = torch.tensor(CLIP_STD).view(1, 3, 1, 1) * 255.0
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch.value
+
+    def set_epoch(self, epoch: int) -> None:
+        """Gọi trước mỗi epoch (trước khi duyệt loader) để ảnh được tăng cường khác nhau giữa các epoch."""
+        self._epoch.value = epoch
+
+    def _crop(self, image: np.ndarray, seed: int) -> np.ndarray:
+        image = np.asarray(image)
+        if min(image.shape[:2]) < self.crop_size:
+            image = resize_short_side(image, self.crop_size)
+        height, width = image.shape[:2]
+        if self.random_crop and self.augment:
+            # Dùng luồng ngẫu nhiên tách biệt với luồng tham số tăng cường
+            rng = np.random.default_rng([seed, 1])
+            top = int(rng.integers(0, height - self.crop_size, endpoint=True))
+            left = int(rng.integers(0, width - self.crop_size, endpoint=True))
+        else:
+            top = (height - self.crop_size) // 2
+            left = (width - self.crop_size) // 2
+        return image[top:top + self.crop_size, left:left + self.crop_size]
+
+    def __call__(self, batch):
+        if len(batch[0]) == 3:
+            seeds = sample_seeds([item[2] for item in batch], self.seed, self.epoch)
+        else:
+            seeds = np.random.SeedSequence().generate_state(len(batch)).tolist()
+
+        images = np.stack([self._crop(item[0], seed) for item, seed in zip(batch, seeds)])
+        if self.augment:
+            images = batch_augment(images, seeds=seeds)
+        labels = torch.tensor([float(item[1]) for item in batch], dtype=torch.float32)
+
+        images = torch.from_numpy(images)
+        if self.normalize:
+            images = (images.permute(0, 3, 1, 2).float() - self._mean) / self._std
+        return images, labels
@@ -0,0 +1,300 @@
+"""
+Pipeline tiền xử lý song song, chạy tăng dần (incremental) trên data/raw.
+
+Duyệt data/raw/<source>, giải mã và resize ảnh trên một process pool rồi ghi
+ra data/processed/<source>/... với cùng cấu trúc thư mục. Manifest lưu đường
+dẫn, kích thước, mtime và SHA-256 của từng ảnh đầu vào nên lần chạy sau chỉ
+xử lý ảnh mới hoặc đã thay đổi.
+
+Cách dùng:
+    python -m src.process.pipeline --raw-root data/raw --out data/processed/full --short-side 256
+"""
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from configs.logger import get_logger
+from src.process.resize_images import resize_image, resize_short_side
+
+
+logger = get_logger(__name__)
+
+ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+MANIFEST_FILE = 'preprocess_manifest.csv'
+PARAMS_FILE = 'preprocess_params.json'
+MANIFEST_FIELDS = ['path', 'size', 'mtime_ns', 'sha256', 'output']
+JPEG_QUALITY = 95
+
+
+def scan_source(source_dir: Path) -> List[Tuple[str, int, int]]:
+    """
+    Liệt kê ảnh trong một thư mục nguồn bằng một lần os.walk.
+
+    Returns:
+        List[Tuple[str, int, int]]: (đường dẫn, kích thước byte, mtime_ns) của từng ảnh.
+    """
+    entries = []
+    for root, _, files in os.walk(source_dir):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in ALLOWED_EXT:
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime_ns))
+    entries.sort()
+    return entries
+
+
+def read_preprocess_manifest(path: Path) -> Dict[str, Dict]:
+    """Đọc manifest của lần chạy trước, khóa theo đường dẫn đầu vào."""
+    if not path.exists():
+        return {}
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return {row['path']: row for row in csv.DictReader(f)}
+
+
+def write_preprocess_manifest(path: Path, rows: Dict[str, Dict]) -> None:
+    """Ghi manifest (ghi ra file tạm rồi đổi tên để không bị hỏng khi dừng giữa chừng)."""
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        for key in sorted(rows):
+            writer.writerow({field: rows[key][field] for field in MANIFEST_FIELDS})
+    os.replace(tmp_path, path)
+
+
+def output_path_for(rel_path: str, out_root: Path, image_format: str) -> Path:
+    """Đường dẫn ảnh đầu ra, giữ nguyên cấu trúc thư mục của data/raw."""
+    out_path = out_root / rel_path
+    if image_format != 'keep':
+        out_path = out_path.with_suffix('.' + image_format)
+    return out_path
+
+
+def _init_worker() -> None:
+    # Mỗi process xử lý một ảnh; tắt luồng nội bộ của OpenCV để tránh tranh chấp CPU
+    cv2.setNumThreads(1)
+
+
+def process_image(task: Tuple) -> Dict:
+    """
+    Xử lý một ảnh trong worker: băm nội dung, giải mã, resize và ghi ra đích.
+
+    Ảnh chỉ được đọc từ đĩa một lần; nếu nội dung trùng hash đã lưu và file
+    đích còn tồn tại thì bỏ qua bước giải mã.
+    """
+    path, rel_path, out_path, known_hash, params = task
+    result = {'path': rel_path, 'output': str(out_path), 'status': 'processed', 'error': None, 'bytes': 0}
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+        result['bytes'] = len(content)
+        result['sha256'] = hashlib.sha256(content).hexdigest()
+        if result['sha256'] == known_hash and os.path.exists(out_path):
+            result['status'] = 'unchanged'
+            return result
+
+        # Giữ thứ tự kênh BGR của OpenCV: ảnh được mã hóa lại bằng cv2.imencode
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR) if content else None
+        if image is None:
+            raise ValueError("cannot decode image")
+
+        if params['size']:
+            image = resize_image(image, tuple(params['size']))
+        elif params['short_side']:
+            image = resize_short_side(image, params['short_side'])
+
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        suffix = os.path.splitext(out_path)[1]
+        encode_params = [cv2.IMWRITE_JPEG_QUALITY, params['jpeg_quality']] if suffix.lower() in ('.jpg', '.jpeg') else []
+        ok, encoded = cv2.imencode(suffix, image, encode_params)
+        if not ok:
+            raise ValueError(f"cannot encode image as {suffix}")
+        tmp_path = f"{out_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded.tobytes())
+        os.replace(tmp_path, out_path)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    return result
+
+
+def run_pipeline(
+    raw_root: Path,
+    out_root: Path,
+    sources: Optional[List[str]] = None,
+    short_side: Optional[int] = 256,
+    size: Optional[Tuple[int, int]] = None,
+    image_format: str = 'keep',
+    jpeg_quality: int = JPEG_QUALITY,
+    num_workers: int = 4,
+    prune: bool = False,
+) -> Dict:
+    """
+    Tiền xử lý toàn bộ ảnh mới hoặc đã thay đổi trong raw_root.
+
+    Args:
+        raw_root (Path): Thư mục data/raw, mỗi thư mục con là một nguồn.
+        out_root (Path): Thư mục đích trong data/processed.
+        sources (List[str]): Các nguồn cần xử lý; mặc định là mọi thư mục con.
+        short_side (int): Resize để cạnh ngắn bằng giá trị này (bỏ qua nếu có size).
+        size (Tuple[int, int]): Kích thước cố định (W, H).
+        image_format (str): 'keep' (giữ đuôi file gốc), 'jpg' hoặc 'png'.
+        num_workers (int): Số process giải mã/resize.
+        prune (bool): Xóa ảnh đầu ra của những ảnh đầu vào đã bị xóa.
+
+    Returns:
+        Dict: Báo cáo số ảnh đã xử lý/bỏ qua/lỗi và thông lượng.
+    """
+    raw_root, out_root = Path(raw_root), Path(out_root)
+    out_root.mkdir(parents=True, exist_ok=True)
+    params = {
+        'short_side': short_side,
+        'size': list(size) if size else None,
+        'format': image_format,
+        'jpeg_quality': jpeg_quality,
+    }
+
+    # Đổi tham số thì mọi ảnh đều phải xử lý lại
+    params_path = out_root / PARAMS_FILE
+    manifest_path = out_root / MANIFEST_FILE
+    previous = read_preprocess_manifest(manifest_path)
+    if params_path.exists() and json.loads(params_path.read_text(encoding='utf-8')) != params:
+        logger.info("Preprocessing parameters changed, reprocessing every image")
+        previous = {}
+    params_path.write_text(json.dumps(params, indent=2), encoding='utf-8')
+
+    if sources is None:
+        sources = sorted(entry.name for entry in os.scandir(raw_root) if entry.is_dir())
+
+    start = time.time()
+    manifest: Dict[str, Dict] = {}
+    tasks = []
+    seen = set()
+    for source in sources:
+        for path, file_size, mtime_ns in scan_source(raw_root / source):
+            rel_path = os.path.relpath(path, raw_root)
+            seen.add(rel_path)
+            out_path = output_path_for(rel_path, out_root, image_format)
+            row = previous.get(rel_path)
+            # Kích thước và mtime không đổi: bỏ qua mà không cần đọc file
+            if row and int(row['size']) == file_size and int(row['mtime_ns']) == mtime_ns and out_path.exists():
+                manifest[rel_path] = row
+                continue
+            known_hash = row['sha256'] if row else None
+            tasks.append(((path, rel_path, str(out_path), known_hash, params), file_size, mtime_ns))
+    scan_seconds = time.time() - start
+
+    report = {
+        'scanned': len(seen),
+        'skipped': len(manifest),
+        'processed': 0,
+        'unchanged': 0,
+        'failed': 0,
+        'removed': 0,
+        'failures': [],
+    }
+    stats = {task[1]: (file_size, mtime_ns) for task, file_size, mtime_ns in tasks}
+    bytes_read = 0
+    try:
+        with multiprocessing.Pool(num_workers, initializer=_init_worker) as pool:
+            for done, result in enumerate(
+                pool.imap_unordered(process_image, [task for task, _, _ in tasks], chunksize=16), start=1
+            ):
+                bytes_read += result['bytes']
+                if result['status'] == 'failed':
+                    report['failed'] += 1
+                    report['failures'].append({'path': result['path'], 'error': result['error']})
+                    continue
+                report[result['status']] += 1
+                file_size, mtime_ns = stats[result['path']]
+                manifest[result['path']] = {
+                    'path': result['path'],
+                    'size': file_size,
+                    'mtime_ns': mtime_ns,
+                    'sha256': result['sha256'],
+                    'output': result['output'],
+                }
+                if done % 10000 == 0:
+                    logger.info("%s/%s images", done, len(tasks))
+    finally:
+        # Lưu tiến độ cả khi bị dừng giữa chừng để lần chạy sau tiếp tục
+        for rel_path, row in previous.items():
+            if rel_path in seen or Path(rel_path).parts[0] not in sources:
+                # Ảnh chưa xử lý xong hoặc thuộc nguồn không chạy lần này: giữ dòng cũ
+                manifest.setdefault(rel_path, row)
+                continue
+            report['removed'] += 1
+            if prune and os.path.exists(row['output']):
+                os.remove(row['output'])
+        write_preprocess_manifest(manifest_path, manifest)
+
+    elapsed = time.time() - start
+    work_seconds = max(elapsed - scan_seconds, 1e-9)
+    report.update({
+        'scan_seconds': round(scan_seconds, 2),
+        'seconds': round(elapsed, 2),
+        'images_per_sec': round((report['processed'] + report['unchanged']) / work_seconds, 2),
+        'mb_per_sec': round(bytes_read / 1024 / 1024 / work_seconds, 2),
+    })
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Parallel, incremental image preprocessing over data/raw")
+    parser.add_argument('--raw-root', default='data/raw', help="Folder with one sub-folder per source")
+    parser.add_argument('--out', default='data/processed/full', help="Output folder")
+    parser.add_argument('--sources', nargs='+', default=None, help="Sources to process (default: all)")
+    parser.add_argument('--short-side', type=int, default=256, help="Resize so the short side has this length")
+    parser.add_argument('--size', type=int, nargs=2, metavar=('W', 'H'), default=None, help="Resize to a fixed size instead")
+    parser.add_argument('--format', choices=('keep', 'jpg', 'png'), default='keep', help="Output image format")
+    parser.add_argument('--jpeg-quality', type=int, default=JPEG_QUALITY)
+    parser.add_argument('--num-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--prune', action='store_true', help="Delete outputs whose input was removed")
+    parser.add_argument('--report', default=None, help="Optional JSON report path")
+    args = parser.parse_args(argv)
+
+    report = run_pipeline(
+        Path(args.raw_root), Path(args.out),
+        sources=args.sources,
+        short_side=args.short_side,
+        size=tuple(args.size) if args.size else None,
+        image_format=args.format,
+        jpeg_quality=args.jpeg_quality,
+        num_workers=args.num_workers,
+        prune=args.prune,
+    )
+
+    logger.info(
+        "Scanned %s images in %ss: %s processed, "
+        "%s unchanged content, %s skipped, %s failed, "
+        "%s removed; %s img/s, %s MB/s",
+        report['scanned'], report['scan_seconds'], report['processed'], report['unchanged'], report['skipped'],
+        report['failed'], report['removed'], report['images_per_sec'], report['mb_per_sec']
+    )
+    for failure in report['failures'][:20]:
+        logger.warning("Failed: %s: %s", failure['path'], failure['error'])
+    if len(report['failures']) > 20:
+        logger.warning("... and %s more failures", len(report['failures']) - 20)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
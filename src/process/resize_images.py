@@ -35,6 +35,30 @@ def resize_image(image_array: np.ndarray, target_size: tuple) -> np.ndarray:
 # Ví dụ:
 # image_224 = resize_image(my_original_image, (224, 224))
 
+def resize_short_side(image_array: np.ndarray, short_side: int) -> np.ndarray:
+    """
+    Thay đổi kích thước ảnh sao cho cạnh ngắn bằng short_side, giữ nguyên tỉ lệ.
+
+    Args:
+        image_array (np.ndarray): Ảnh đầu vào (H x W x C).
+        short_side (int): Độ dài cạnh ngắn sau khi resize, ví dụ: 256.
+
+    Returns:
+        np.ndarray: Ảnh đã được thay đổi kích thước.
+    """
+    img_height, img_width = image_array.shape[:2]
+    scale = short_side / min(img_height, img_width)
+    if scale == 1.0:
+        return image_array
+
+    target_size = (max(1, round(img_width * scale)), max(1, round(img_height * scale)))
+    # INTER_AREA cho kết quả tốt hơn khi thu nhỏ ảnh
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+    return cv2.resize(image_array, target_size, interpolation=interpolation)
+
+# Ví dụ:
+# image_256 = resize_short_side(my_original_image, 256)
+
 def random_crop(image_array: np.ndarray, crop_width : float = 0.5, crop_height: float = 0.5) -> np.ndarray:
     """
     Cắt ngẫu nhiên một vùng từ ảnh.
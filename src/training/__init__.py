@@ -0,0 +1,3 @@
+"""
+Training module initialization
+"""
@@ -0,0 +1,238 @@
+"""
+Head-only checkpoints, written in the background.
+
+The backbone is frozen, so a checkpoint only needs the trainable parameters
+(the ~50K weights of the MLP head), the optimizer and scheduler state and an
+identifier of the backbone they were trained on, instead of the ~300M
+ViT-L/14 parameters that model.state_dict() carries.
+
+    {
+        'format': 'clip-head-checkpoint-v1',
+        'trainable_state_dict': {'head.0.weight': ..., ...},  # model key names
+        'optimizer_state_dict': ..., 'scheduler_state_dict': ...,
+        'backbone': {'hash': ..., 'num_params': ...},
+        'epoch': ..., 'metrics': {...},
+    }
+
+AsyncCheckpointer snapshots the state on the training thread (a copy of a few
+small tensors) and serializes it on a background thread to a temporary file
+that is renamed into place, so training never waits on the disk and readers
+never see a partial file.
+
+load_checkpoint restores a checkpoint into a classifier whose backbone was
+loaded separately (CLIP or src.models.package), checking the backbone hash,
+and still reads the older full-model and head_state_dict checkpoints.
+"""
+import copy
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import torch
+import torch.nn as nn
+
+from configs.logger import get_logger
+from src.models.clip_classifier import restore_classifier_state
+
+
+logger = get_logger(__name__)
+
+CHECKPOINT_FORMAT = 'clip-head-checkpoint-v1'
+FINGERPRINT_SAMPLES = 1024  # values hashed from each end of every backbone tensor
+
+
+def backbone_fingerprint(backbone: nn.Module) -> Dict[str, Any]:
+    """
+    Cheap identifier of a backbone's weights
+
+    Hashes every tensor's name, shape and its first and last values (rounded
+    to float16, so fp16 and fp32 copies of the same weights agree) instead of
+    all ~300M values, which keeps it fast enough for server startup.
+    """
+    digest = hashlib.sha256()
+    num_params = 0
+    for name, tensor in backbone.state_dict().items():
+        flat = tensor.detach().reshape(-1)
+        num_params += flat.numel()
+        digest.update(f"{name}:{tuple(tensor.shape)};".encode('utf-8'))
+        if flat.numel() > 2 * FINGERPRINT_SAMPLES:
+            flat = torch.cat([flat[:FINGERPRINT_SAMPLES], flat[-FINGERPRINT_SAMPLES:]])
+        digest.update(flat.to('cpu', torch.float16).numpy().tobytes())
+    return {'hash': digest.hexdigest(), 'num_params': num_params}
+
+
+def trainable_state_dict(model: nn.Module) -> Dict[str, torch.Tensor]:
+    """Parameters that require grad and the buffers of the modules that own them"""
+    trainable_modules = set()
+    state = {}
+    for name, param in model.named_parameters():
+        if param.requires_grad:
+            state[name] = param
+            trainable_modules.add(name.rpartition('.')[0])
+    for name, buffer in model.named_buffers():
+        if name.rpartition('.')[0] in trainable_modules:
+            state[name] = buffer
+    return state
+
+
+def _snapshot(value):
+    """Detached CPU copy of every tensor in a (nested) state dict"""
+    if isinstance(value, torch.Tensor):
+        return value.detach().to('cpu', copy=True)
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_snapshot(item) for item in value)
+    return copy.deepcopy(value)
+
+
+def build_checkpoint(
+    model: nn.Module,
+    backbone: Dict[str, Any],
+    optimizer: Optional[torch.optim.Optimizer] = None,
+    scheduler: Optional[Any] = None,
+    epoch: Optional[int] = None,
+    metrics: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    """
+    Snapshot of the trainable state, safe to serialize while training continues
+
+    Args:
+        backbone: backbone_fingerprint of the frozen backbone (computed once per run)
+    """
+    checkpoint = {
+        'format': CHECKPOINT_FORMAT,
+        'trainable_state_dict': _snapshot(trainable_state_dict(model)),
+        'backbone': dict(backbone),
+        'epoch': epoch,
+        'metrics': dict(metrics or {}),
+    }
+    if optimizer is not None:
+        checkpoint['optimizer_state_dict'] = _snapshot(optimizer.state_dict())
+    if scheduler is not None:
+        checkpoint['scheduler_state_dict'] = _snapshot(scheduler.state_dict())
+    # Flat copies of the metrics for readers of the older head checkpoints
+    for key in ('val_loss', 'val_acc'):
+        if key in checkpoint['metrics']:
+            checkpoint[key] = checkpoint['metrics'][key]
+    return checkpoint
+
+
+def save_checkpoint(checkpoint: Dict[str, Any], path: Union[str, Path]) -> Path:
+    """Write a checkpoint atomically: temporary file, fsync, rename"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        torch.save(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+class AsyncCheckpointer:
+    """
+    Serialize checkpoints on a background thread
+
+    Writes happen in submission order. A write that has not started yet is
+    dropped when a newer checkpoint for the same path arrives, since only the
+    latest one would survive anyway. Errors of a background write are raised
+    by the next save() or by close().
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        self._pending: Dict[Path, Future] = {}
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+
+    def _write(self, checkpoint: Dict[str, Any], path: Path) -> None:
+        try:
+            save_checkpoint(checkpoint, path)
+        except BaseException as e:
+            logger.error("Failed to write checkpoint %s: %s", path, e)
+            self._error = e
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("A background checkpoint write failed") from error
+
+    def save(self, checkpoint: Dict[str, Any], path: Union[str, Path]) -> None:
+        """Queue a checkpoint built with build_checkpoint; returns immediately"""
+        self._raise_error()
+        path = Path(path)
+        with self._lock:
+            previous = self._pending.get(path)
+            if previous is not None:
+                previous.cancel()  # no-op when it is already being written
+            self._pending[path] = self._executor.submit(self._write, checkpoint, path)
+
+    def wait(self) -> None:
+        """Block until every queued checkpoint is on disk"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            if not future.cancelled():
+                future.result()
+        self._raise_error()
+
+    def close(self) -> None:
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_checkpoint(
+    model: nn.Module,
+    path: Union[str, Path],
+    device: torch.device,
+    strict_backbone: bool = True,
+) -> Dict[str, Any]:
+    """
+    Load a checkpoint into a classifier whose backbone is already loaded
+
+    Head-only checkpoints are recombined with the model's backbone after
+    checking its fingerprint; older checkpoints are applied as by
+    load_classifier_checkpoint.
+
+    Args:
+        model: CLIPClassifier with its backbone weights in place
+        strict_backbone: Raise instead of warning when the backbone differs
+            from the one the head was trained on
+
+    Returns:
+        The raw checkpoint dict
+    """
+    checkpoint = torch.load(path, map_location=device)
+    if checkpoint.get('format') != CHECKPOINT_FORMAT:
+        restore_classifier_state(model, checkpoint)
+        return checkpoint
+
+    expected = checkpoint.get('backbone', {}).get('hash')
+    if expected is not None:
+        actual = backbone_fingerprint(model.clip_visual)['hash']
+        if actual != expected:
+            message = (f"{path} was trained on backbone {expected[:12]}, "
+                       f"but the loaded backbone is {actual[:12]}")
+            if strict_backbone:
+                raise ValueError(message)
+            logger.warning(message)
+
+    missing, unexpected = model.load_state_dict(checkpoint['trainable_state_dict'], strict=False)
+    missing_trainable = [key for key in missing if not key.startswith('clip_visual.')]
+    if missing_trainable or unexpected:
+        raise ValueError(f"{path} does not match the model: missing {missing_trainable}, unexpected {unexpected}")
+    return checkpoint
@@ -0,0 +1,432 @@
+"""
+Data-parallel feature extraction and head training on CPU nodes (torch.distributed, gloo).
+
+Every process runs its own copy of the frozen backbone on a contiguous shard
+of each split and writes it as a part of the feature store; rank 0 then writes
+a meta.json/manifest.csv that reference the part shards, so the result is a
+regular src.data.feature_store split (readable by train_head) without copying
+any features:
+
+    <out>/<split>/part_00000/...   shards + manifest of rank 0
+    <out>/<split>/part_00001/...
+    <out>/<split>/meta.json        shards of all parts, in index order
+
+The head is then trained with DistributedDataParallel: each process reads its
+share of every epoch's permutation from the memory-mapped store and gradients
+are all-reduced; loss/accuracy sums are all-reduced once per epoch so every
+rank takes the same LR-schedule and early-stopping decisions. Rank 0 writes
+head-only checkpoints (src.training.checkpoint).
+
+Processes can be started by torchrun (several hosts; the output folder must
+then be on shared storage) or locally with --procs. The scaling command
+measures throughput for several process counts on one machine and reports
+the efficiency relative to one process.
+
+Usage:
+    python -m src.training.distributed extract --procs 4 --data-root data/processed/sample_1pct \\
+        --packaged models/classifier_visual.pt --out data/features
+    torchrun --nnodes 2 --nproc-per-node 8 --rdzv-endpoint host0:29500 -m src.training.distributed train \\
+        --features data/features --out models/best_head.pth
+    python -m src.training.distributed scaling --procs 1 2 4 --data-root data/processed/sample_1pct \\
+        --packaged models/classifier_visual.pt --limit 512 --report reports/scaling.json
+"""
+import argparse
+import json
+import os
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel
+
+from configs.logger import ProjectLogger, get_logger
+from src.data.dataset_index import load_splits
+from src.data.face_dataset import SEED, SPLITS
+from src.data.feature_store import MANIFEST_FILE, META_FILE, FeatureStore, extract_split, read_manifest, write_manifest
+from src.models.clip_classifier import build_head
+from src.training.checkpoint import AsyncCheckpointer, backbone_fingerprint, build_checkpoint
+from src.training.trainer import load_backbone
+
+
+logger = get_logger(__name__)
+
+PART_DIR = 'part_{rank:05d}'
+
+
+def init_distributed(threads: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Join the gloo process group described by the environment (torchrun or --procs)
+
+    Args:
+        threads: Intra-op threads per process; by default the host's cores are
+            split evenly between its local processes
+
+    Returns:
+        (rank, world_size)
+    """
+    if not dist.is_initialized():
+        dist.init_process_group('gloo')
+    if threads is None:
+        local_world = int(os.environ.get('LOCAL_WORLD_SIZE', dist.get_world_size()))
+        threads = max(1, (os.cpu_count() or 1) // local_world)
+    torch.set_num_threads(threads)
+    return dist.get_rank(), dist.get_world_size()
+
+
+def shard_range(count: int, rank: int, world_size: int) -> Tuple[int, int]:
+    """Contiguous [start, end) of rank's shard; shard sizes differ by at most one"""
+    base, extra = divmod(count, world_size)
+    start = rank * base + min(rank, extra)
+    return start, start + base + (1 if rank < extra else 0)
+
+
+def merge_parts(split_dir: Path, world_size: int, backbone: Optional[Dict] = None) -> int:
+    """Write meta.json and manifest.csv of a split from its per-rank parts, without copying shards"""
+    shards, paths, labels = [], [], []
+    dim = None
+    for rank in range(world_size):
+        part = PART_DIR.format(rank=rank)
+        with open(split_dir / part / META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        dim = meta['dim']
+        shards.extend({'file': f"{part}/{shard['file']}", 'count': shard['count']} for shard in meta['shards'])
+        part_paths, part_labels = read_manifest(split_dir / part / MANIFEST_FILE)
+        paths.extend(part_paths)
+        labels.extend(part_labels)
+
+    write_manifest(split_dir / MANIFEST_FILE, paths, labels)
+    meta = {'dim': dim, 'dtype': 'float16', 'count': len(paths), 'shards': shards, 'parts': world_size}
+    if backbone is not None:
+        meta['backbone'] = backbone
+    tmp_path = split_dir / (META_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, split_dir / META_FILE)
+    return len(paths)
+
+
+def _gather_timings(count: int, seconds: float) -> Dict[str, Any]:
+    """Aggregate throughput of one phase over all ranks"""
+    rows = [None] * dist.get_world_size()
+    dist.all_gather_object(rows, (count, seconds))
+    counts = [c for c, _ in rows]
+    times = [s for _, s in rows]
+    wall = max(times)
+    return {
+        'processes': len(rows),
+        'samples': int(sum(counts)),
+        'seconds': round(wall, 3),
+        'samples_per_sec': round(sum(counts) / max(wall, 1e-9), 2),
+        'per_rank_samples_per_sec': [round(c / max(s, 1e-9), 2) for c, s in rows],
+        # 1.0 when every rank finishes together; lower means stragglers
+        'load_balance': round(float(np.mean(times)) / max(wall, 1e-9), 3),
+    }
+
+
+def extract_distributed(
+    model,
+    splits: Dict[str, Tuple[List[str], List[int]]],
+    out_dir: Path,
+    device: torch.device,
+    split_names: Sequence[str] = SPLITS,
+    batch_size: int = 64,
+    num_workers: int = 2,
+) -> Dict[str, Dict]:
+    """Extract the features of each split, one contiguous shard per rank"""
+    rank, world_size = dist.get_rank(), dist.get_world_size()
+    backbone = backbone_fingerprint(model.clip_visual) if rank == 0 else None
+    report = {}
+    for split in split_names:
+        paths, labels = splits[split]
+        start, end = shard_range(len(paths), rank, world_size)
+        split_dir = Path(out_dir) / split
+
+        begin = time.perf_counter()
+        written = extract_split(
+            model, paths[start:end], labels[start:end], split_dir / PART_DIR.format(rank=rank), device,
+            batch_size=batch_size,
+            num_workers=num_workers,
+        )
+        timings = _gather_timings(written, time.perf_counter() - begin)
+
+        dist.barrier()  # every part is complete before rank 0 links them
+        if rank == 0:
+            merge_parts(split_dir, world_size, backbone)
+            logger.info("%s: %s images by %s processes, %.1f img/s, load balance %s",
+                        split, timings['samples'], world_size, timings['samples_per_sec'], timings['load_balance'])
+        dist.barrier()
+        report[split] = timings
+    return report
+
+
+def _epoch_indices(count: int, rank: int, world_size: int, seed: int, epoch: int) -> np.ndarray:
+    """This rank's share of an epoch permutation, padded so all ranks get the same number of samples"""
+    order = np.random.default_rng(seed + epoch).permutation(count)
+    total = -(-count // world_size) * world_size
+    order = np.concatenate([order, order[:total - count]])
+    return order[rank::world_size]
+
+
+def _all_reduce_sums(*values: torch.Tensor) -> List[float]:
+    stacked = torch.stack([v.double() for v in values])
+    dist.all_reduce(stacked)
+    return stacked.tolist()
+
+
+def train_distributed(
+    features_dir: Path,
+    out_path: Path,
+    num_epochs: int = 20,
+    batch_size: int = 256,
+    learning_rate: float = 1e-3,
+    patience: int = 5,
+    seed: int = SEED,
+) -> Dict[str, List[float]]:
+    """
+    Train the head with DDP on a feature store
+
+    Same loss, optimizer, schedule and early stopping as train_head; batch_size
+    is the global batch, split evenly between the processes.
+    """
+    rank, world_size = dist.get_rank(), dist.get_world_size()
+    torch.manual_seed(seed)
+    train_store = FeatureStore(Path(features_dir) / 'train')
+    val_store = FeatureStore(Path(features_dir) / 'val')
+    local_batch = max(1, -(-batch_size // world_size))
+    if rank == 0:
+        ProjectLogger.log_data_info('features/train', len(train_store), 2)
+        ProjectLogger.log_data_info('features/val', len(val_store), 2)
+
+    # The container gives the checkpoint the same key names as CLIPClassifier ('head.0.weight', ...)
+    model = nn.ModuleDict({'head': build_head()})
+    ddp_head = DistributedDataParallel(model['head'])
+    criterion = nn.BCELoss()
+    optimizer = optim.Adam(ddp_head.parameters(), lr=learning_rate)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=2)
+    backbone = train_store.meta.get('backbone', {})
+    checkpointer = AsyncCheckpointer() if rank == 0 else None
+
+    history: Dict[str, List[float]] = {
+        'train_loss': [], 'train_acc': [], 'val_loss': [], 'val_acc': [], 'samples_per_sec': [],
+    }
+    best_val_loss = float('inf')
+    patience_counter = 0
+    try:
+        for epoch in range(num_epochs):
+            begin = time.perf_counter()
+            ddp_head.train()
+            indices = _epoch_indices(len(train_store), rank, world_size, seed, epoch)
+            loss_sum, correct = torch.zeros(()), torch.zeros(())
+            for start in range(0, len(indices), local_batch):
+                idx = indices[start:start + local_batch]
+                x = torch.from_numpy(train_store.gather(idx))
+                y = torch.from_numpy(train_store.labels[idx])
+                outputs = ddp_head(x).view(-1)
+                loss = criterion(outputs, y)
+                optimizer.zero_grad()
+                loss.backward()  # gradients are all-reduced here
+                optimizer.step()
+                loss_sum += loss.detach() * len(y)
+                correct += ((outputs.detach() > 0.5).float() == y).sum()
+            train_seconds = time.perf_counter() - begin
+            train_loss, train_correct, train_total = _all_reduce_sums(
+                loss_sum, correct, torch.tensor(float(len(indices))))
+
+            # Validation shards need no padding: no gradients are synchronized
+            model.eval()
+            start, end = shard_range(len(val_store), rank, world_size)
+            loss_sum, correct = torch.zeros(()), torch.zeros(())
+            with torch.no_grad():
+                for batch_start in range(start, end, local_batch):
+                    idx = np.arange(batch_start, min(batch_start + local_batch, end))
+                    outputs = model['head'](torch.from_numpy(val_store.gather(idx))).view(-1)
+                    y = torch.from_numpy(val_store.labels[idx])
+                    loss_sum += criterion(outputs, y) * len(y)
+                    correct += ((outputs > 0.5).float() == y).sum()
+            val_loss, val_correct, val_total = _all_reduce_sums(loss_sum, correct, torch.tensor(float(end - start)))
+
+            train_loss, train_acc = train_loss / max(train_total, 1), train_correct / max(train_total, 1)
+            val_loss, val_acc = val_loss / max(val_total, 1), val_correct / max(val_total, 1)
+            samples_per_sec = train_total / max(train_seconds, 1e-9)
+            for key, value in zip(history, (train_loss, train_acc, val_loss, val_acc, samples_per_sec)):
+                history[key].append(value)
+            if rank == 0:
+                ProjectLogger.log_training_metrics(
+                    epoch + 1, train_loss, val_loss, train_acc, val_acc, samples_per_sec=samples_per_sec)
+
+            scheduler.step(val_loss)
+
+            if val_loss < best_val_loss:
+                best_val_loss = val_loss
+                patience_counter = 0
+                if rank == 0:
+                    checkpointer.save(build_checkpoint(
+                        model, backbone,
+                        optimizer=optimizer,
+                        scheduler=scheduler,
+                        epoch=epoch,
+                        metrics={'val_loss': val_loss, 'val_acc': val_acc},
+                    ), out_path)
+                    logger.info("Saving best head to %s", out_path)
+            else:
+                patience_counter += 1
+                if patience_counter >= patience:
+                    if rank == 0:
+                        logger.info("Early stopping triggered")
+                    break
+    finally:
+        if checkpointer is not None:
+            checkpointer.close()
+    return history
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _local_worker(rank: int, world_size: int, port: int, args: argparse.Namespace) -> None:
+    os.environ.update({
+        'MASTER_ADDR': '127.0.0.1',
+        'MASTER_PORT': str(port),
+        'RANK': str(rank),
+        'LOCAL_RANK': str(rank),
+        'WORLD_SIZE': str(world_size),
+        'LOCAL_WORLD_SIZE': str(world_size),
+    })
+    _run(args)
+
+
+def launch_local(args: argparse.Namespace, procs: int) -> None:
+    """Run a command in procs local processes, as torchrun --nproc-per-node would"""
+    mp.spawn(_local_worker, args=(procs, _free_port(), args), nprocs=procs, join=True)
+
+
+def _run(args: argparse.Namespace) -> None:
+    """Entry point of one process"""
+    rank, world_size = init_distributed(args.threads)
+    try:
+        if args.command == 'train':
+            train_distributed(
+                Path(args.features), Path(args.out),
+                num_epochs=args.epochs,
+                batch_size=args.batch_size,
+                learning_rate=args.lr,
+                patience=args.patience,
+                seed=args.seed,
+            )
+            return
+
+        device = torch.device('cpu')
+        model = load_backbone(device, Path(args.packaged) if args.packaged else None)
+        splits = load_splits(args.data_root, args.index, random_state=args.seed)
+        if args.limit:
+            splits = {name: (paths[:args.limit], labels[:args.limit]) for name, (paths, labels) in splits.items()}
+        report = extract_distributed(
+            model, splits, Path(args.out), device,
+            split_names=args.splits,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+        )
+        if rank == 0 and args.report:
+            report = {'world_size': world_size, 'threads': torch.get_num_threads(), 'splits': report}
+            Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+    finally:
+        dist.destroy_process_group()
+
+
+def measure_scaling(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Extraction throughput for each process count in args.procs on this machine
+
+    Efficiency is throughput(N) / (N * throughput(1)); 1.0 is linear scaling.
+    """
+    counts = sorted(set(args.procs) | {1})
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for procs in counts:
+            run_args = argparse.Namespace(**vars(args))
+            run_args.command = 'extract'
+            run_args.out = os.path.join(tmp, f"features_{procs}")
+            run_args.report = os.path.join(tmp, f"report_{procs}.json")
+            run_args.splits = ['train']
+            launch_local(run_args, procs)
+            with open(run_args.report, 'r', encoding='utf-8') as f:
+                timings = json.load(f)['splits']['train']
+            results.append({'processes': procs, **timings})
+
+    baseline = results[0]['samples_per_sec']
+    for row in results:
+        row['speedup'] = round(row['samples_per_sec'] / max(baseline, 1e-9), 3)
+        row['efficiency'] = round(row['speedup'] / row['processes'], 3)
+        logger.info("%s processes: %.1f img/s, speedup %sx, efficiency %.0f%%, load balance %s",
+                    row['processes'], row['samples_per_sec'], row['speedup'], 100 * row['efficiency'],
+                    row['load_balance'])
+
+    report = {'cpu_count': os.cpu_count(), 'images': results[0]['samples'], 'runs': results}
+    if args.report:
+        Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Data-parallel feature extraction and head training (gloo)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--threads', type=int, default=None,
+                        help="Torch threads per process (default: cores / local processes)")
+    common.add_argument('--seed', type=int, default=SEED)
+
+    data = argparse.ArgumentParser(add_help=False)
+    data.add_argument('--data-root', required=True, help="Folder with the source sub-folders")
+    data.add_argument('--index', default=None, help="SQLite dataset index to take the splits from")
+    data.add_argument('--packaged', default=None,
+                      help="Packaged model (src.models.package) to take the backbone from instead of CLIP")
+    data.add_argument('--batch-size', type=int, default=64, help="Images per forward pass, per process")
+    data.add_argument('--num-workers', type=int, default=2, help="Decode workers per process")
+    data.add_argument('--limit', type=int, default=None, help="Only the first N images of each split")
+    data.add_argument('--report', default=None, help="Write a JSON throughput report here")
+
+    extract = commands.add_parser('extract', parents=[common, data], help="Extract backbone features")
+    extract.add_argument('--out', required=True, help="Feature store root (shared by all hosts)")
+    extract.add_argument('--splits', nargs='+', default=list(SPLITS), choices=SPLITS)
+    extract.add_argument('--procs', type=int, default=1, help="Local processes when not started by torchrun")
+
+    train = commands.add_parser('train', parents=[common], help="Train the head with DDP on a feature store")
+    train.add_argument('--features', required=True, help="Feature store root (with train/ and val/)")
+    train.add_argument('--out', default='models/best_head.pth', help="Best head checkpoint path")
+    train.add_argument('--epochs', type=int, default=20)
+    train.add_argument('--batch-size', type=int, default=256, help="Global batch size")
+    train.add_argument('--lr', type=float, default=1e-3)
+    train.add_argument('--patience', type=int, default=5)
+    train.add_argument('--procs', type=int, default=1, help="Local processes when not started by torchrun")
+
+    scaling = commands.add_parser('scaling', parents=[common, data],
+                                  help="Measure extraction scaling over local process counts")
+    scaling.add_argument('--procs', type=int, nargs='+', default=[1, 2, 4])
+
+    args = parser.parse_args(argv)
+    if args.command == 'scaling':
+        measure_scaling(args)
+    elif 'RANK' in os.environ:
+        _run(args)  # started by torchrun
+    else:
+        launch_local(args, args.procs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Train the classifier head directly on precomputed CLIP features.
+
+Uses the same loss, optimizer, LR schedule and early stopping as the
+training notebook, but every epoch only touches the 768-d feature arrays
+written by src.data.feature_store, so it takes seconds instead of a full
+ViT-L/14 pass over the dataset. When the train split has augmented views
+(src.data.feature_store --views K), one view per image is sampled each epoch.
+
+Usage:
+    python -m src.training.train_head --features data/features --out models/best_head.pth
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from configs.logger import ProjectLogger, get_logger
+from src.data.feature_store import VIEWS_DIR, FeatureStore, MultiViewFeatureStore
+from src.models.clip_classifier import build_head
+from src.training.checkpoint import AsyncCheckpointer, build_checkpoint
+
+
+logger = get_logger(__name__)
+
+
+def iterate_minibatches(
+    store: Union[FeatureStore, MultiViewFeatureStore],
+    batch_size: int,
+    shuffle: bool,
+    rng: Optional[np.random.Generator] = None,
+    features: Optional[np.ndarray] = None,
+):
+    """
+    Yield (features, labels) float32 tensors
+
+    Args:
+        features: Whole split already loaded in memory; read from the
+            memory-mapped shards batch by batch when None
+    """
+    order = rng.permutation(len(store)) if shuffle else np.arange(len(store))
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        batch = features[idx] if features is not None else store.gather(idx)
+        yield torch.from_numpy(batch), torch.from_numpy(store.labels[idx])
+
+
+def run_epoch(
+    head: nn.Module,
+    store: Union[FeatureStore, MultiViewFeatureStore],
+    criterion: nn.Module,
+    device: torch.device,
+    batch_size: int,
+    optimizer: Optional[optim.Optimizer] = None,
+    rng: Optional[np.random.Generator] = None,
+    features: Optional[np.ndarray] = None,
+) -> Tuple[float, float]:
+    """One pass over a split; trains when an optimizer is given. Returns (loss, accuracy)."""
+    training = optimizer is not None
+    head.train(training)
+
+    loss_sum = torch.zeros((), device=device)
+    correct = torch.zeros((), device=device)
+    total = 0
+
+    with torch.set_grad_enabled(training):
+        for x, y in iterate_minibatches(store, batch_size, training, rng, features):
+            x, y = x.to(device), y.to(device)
+            outputs = head(x).view(-1)
+            loss = criterion(outputs, y)
+
+            if training:
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+
+            loss_sum += loss.detach() * len(y)
+            correct += ((outputs > 0.5).float() == y).sum()
+            total += len(y)
+
+    total = max(total, 1)
+    return loss_sum.item() / total, correct.item() / total
+
+
+def train_head(
+    features_dir: Path,
+    out_path: Path,
+    num_epochs: int = 20,
+    batch_size: int = 256,
+    learning_rate: float = 1e-3,
+    patience: int = 5,
+    seed: int = 42,
+    in_memory: bool = True,
+    use_views: bool = True,
+) -> Dict[str, List[float]]:
+    """
+    Fit the head on the train split and keep the best one by validation loss
+
+    Args:
+        features_dir: Feature store root with train/ and val/ splits
+        out_path: Where the best head checkpoint is saved
+        in_memory: Load whole splits into RAM instead of reading the mmap per batch
+        use_views: Train on augmented views of the train split when present
+
+    Returns:
+        Training history
+    """
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    train_dir = Path(features_dir) / 'train'
+    multi_view = use_views and (train_dir / VIEWS_DIR).exists()
+    if multi_view:
+        # Views are read from the mmap: K copies of the split rarely fit in RAM
+        train_store = MultiViewFeatureStore(train_dir, seed=seed)
+        train_features = None
+        logger.info("Training on %s augmented views per image", train_store.num_views)
+    else:
+        train_store = FeatureStore(train_dir)
+        train_features = train_store.load_all() if in_memory else None
+    val_store = FeatureStore(Path(features_dir) / 'val')
+    val_features = val_store.load_all() if in_memory else None
+    ProjectLogger.log_data_info('features/train', len(train_store), 2)
+    ProjectLogger.log_data_info('features/val', len(val_store), 2)
+
+    # The container gives the checkpoint the same key names as CLIPClassifier ('head.0.weight', ...)
+    model = nn.ModuleDict({'head': build_head()}).to(device)
+    head = model['head']
+    criterion = nn.BCELoss()
+    optimizer = optim.Adam(head.parameters(), lr=learning_rate)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=2)
+    # Views.json has no fingerprint, but every split and view is extracted by the same backbone
+    backbone = val_store.meta.get('backbone')
+    if backbone is None:
+        logger.warning("%s records no backbone fingerprint; re-extract it so "
+                       "load_checkpoint can check the head against the backbone", features_dir)
+        backbone = {}
+    checkpointer = AsyncCheckpointer()
+
+    history = {'train_loss': [], 'train_acc': [], 'val_loss': [], 'val_acc': []}
+    best_val_loss = float('inf')
+    patience_counter = 0
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    try:
+        for epoch in range(num_epochs):
+            start_time = time.time()
+            if multi_view:
+                train_store.set_epoch(epoch)
+            train_loss, train_acc = run_epoch(
+                head, train_store, criterion, device, batch_size, optimizer, rng, train_features
+            )
+            val_loss, val_acc = run_epoch(head, val_store, criterion, device, batch_size, features=val_features)
+
+            for key, value in zip(history, (train_loss, train_acc, val_loss, val_acc)):
+                history[key].append(value)
+            ProjectLogger.log_training_metrics(epoch + 1, train_loss, val_loss, train_acc, val_acc)
+            logger.info("Epoch %s took %.2fs", epoch + 1, time.time() - start_time)
+
+            scheduler.step(val_loss)
+
+            if val_loss < best_val_loss:
+                best_val_loss = val_loss
+                patience_counter = 0
+                checkpointer.save(build_checkpoint(
+                    model, backbone,
+                    optimizer=optimizer,
+                    scheduler=scheduler,
+                    epoch=epoch,
+                    metrics={'val_loss': val_loss, 'val_acc': val_acc},
+                ), out_path)
+                logger.info("Saving best head to %s", out_path)
+            else:
+                patience_counter += 1
+                if patience_counter >= patience:
+                    logger.info("Early stopping triggered")
+                    break
+    finally:
+        checkpointer.close()
+
+    return history
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Train the classifier head on precomputed CLIP features")
+    parser.add_argument('--features', required=True, help="Feature store root (with train/ and val/)")
+    parser.add_argument('--out', default='models/best_head.pth', help="Best head checkpoint path")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--patience', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mmap', action='store_true', help="Read batches from the memory-mapped shards instead of RAM")
+    parser.add_argument('--no-views', action='store_true', help="Ignore augmented views of the train split")
+    args = parser.parse_args(argv)
+
+    train_head(
+        Path(args.features), Path(args.out),
+        num_epochs=args.epochs,
+        batch_size=args.batch_size,
+        learning_rate=args.lr,
+        patience=args.patience,
+        seed=args.seed,
+        in_memory=not args.mmap,
+        use_views=not args.no_views,
+    )
+
+
+if __name__ == "__main__":
+    main()
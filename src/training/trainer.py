@@ -0,0 +1,346 @@
+"""
+End-to-end training of the classifier on images, as a script.
+
+Same model, loss, optimizer, LR schedule and early stopping as the training
+notebook (train_epoch / validate / early-stopping loop), tuned for
+throughput:
+
+    - DataLoader with persistent workers, prefetch factor and pinned memory
+    - optional channels_last inputs/weights and torch.compile
+    - bf16 autocast (CPU or CUDA) and gradient accumulation
+    - loss and accuracy accumulated on the device: no .item() sync per step,
+      one host transfer per epoch
+    - samples/sec and data-wait vs compute time logged every epoch
+
+The backbone comes from a packaged model (src.models.package, no CLIP needed)
+or from the CLIP package. Only the head is trained; the best head is saved in
+a head-only checkpoint (src.training.checkpoint), written in the background.
+
+Usage:
+    python -m src.training.trainer --data-root data/processed/sample_1pct --packaged models/classifier_visual.pt \\
+        --out models/best_head.pth --num-workers 8 --bf16
+"""
+import argparse
+import os
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, Dataset
+
+from configs.logger import ProjectLogger, get_logger
+from src.data.dataset_index import load_splits
+from src.data.face_dataset import SEED, FaceDataset
+from src.models.clip_classifier import (
+    CLIPClassifier,
+    build_head,
+    build_preprocess,
+    build_train_transform,
+    load_clip_model,
+)
+from src.models.package import load_packaged_classifier
+from src.training.checkpoint import AsyncCheckpointer, backbone_fingerprint, build_checkpoint
+from src.utils.profiling import TorchProfiler
+
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class TrainerConfig:
+    """Hyper-parameters and throughput settings of a training run"""
+    num_epochs: int = 20
+    batch_size: int = 32
+    learning_rate: float = 1e-3
+    patience: int = 5
+    seed: int = SEED
+    # DataLoader
+    num_workers: int = min(8, os.cpu_count() or 1)
+    prefetch_factor: int = 4
+    persistent_workers: bool = True
+    pin_memory: Optional[bool] = None  # default: when training on CUDA
+    # Compute
+    accumulation_steps: int = 1
+    bf16: bool = False
+    channels_last: bool = False
+    compile: bool = False
+    # Profiling (src.utils.profiling): steps profiled from the start, and a trigger file polled every step
+    profile_steps: int = 0
+    profile_trigger: Optional[str] = None
+
+
+@dataclass
+class EpochStats:
+    loss: float
+    accuracy: float
+    samples: int
+    seconds: float
+    data_seconds: float
+    compute_seconds: float
+
+    @property
+    def samples_per_sec(self) -> float:
+        return self.samples / max(self.seconds, 1e-9)
+
+
+def build_loader(dataset: Dataset, config: TrainerConfig, shuffle: bool, device: torch.device) -> DataLoader:
+    """DataLoader with the throughput settings of the config"""
+    workers = config.num_workers
+    pin_memory = device.type == 'cuda' if config.pin_memory is None else config.pin_memory
+    return DataLoader(
+        dataset,
+        batch_size=config.batch_size,
+        shuffle=shuffle,
+        num_workers=workers,
+        pin_memory=pin_memory,
+        # Keep workers (and their decoded state) alive across epochs
+        persistent_workers=config.persistent_workers and workers > 0,
+        prefetch_factor=config.prefetch_factor if workers > 0 else None,
+    )
+
+
+def load_backbone(device: torch.device, packaged: Optional[Path] = None) -> CLIPClassifier:
+    """Classifier with a frozen backbone and a freshly initialised head"""
+    if packaged is not None:
+        model = load_packaged_classifier(packaged, device)
+        # Packaged head weights are memory-mapped and already trained: start over
+        model.head = build_head()
+    else:
+        model = CLIPClassifier(load_clip_model(device), freeze_backbone=True)
+    return model.to(device)
+
+
+class Trainer:
+    """
+    Train the head of a CLIPClassifier on image batches
+
+    Args:
+        model: Classifier with a frozen backbone
+        config: Training and throughput settings
+        device: Device the model lives on
+    """
+
+    def __init__(self, model: CLIPClassifier, config: TrainerConfig, device: torch.device):
+        self.config = config
+        self.device = device
+        self.memory_format = torch.channels_last if config.channels_last else torch.contiguous_format
+
+        model = model.to(device)
+        if config.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        self.model = model
+        # bf16 autocast of the backbone through the model's own switch (see src.models.precision);
+        # the head is tiny and stays fp32 so BCELoss sees fp32 probabilities
+        model.autocast_dtype = torch.bfloat16 if config.bf16 else None
+        self.forward = torch.compile(model) if config.compile else model
+
+        self.criterion = nn.BCELoss()
+        self.optimizer = optim.Adam(model.head.parameters(), lr=config.learning_rate)
+        self.scheduler = optim.lr_scheduler.ReduceLROnPlateau(self.optimizer, mode='min', factor=0.5, patience=2)
+
+        # Stored in every checkpoint so the head is only recombined with the same backbone
+        self.backbone = backbone_fingerprint(model.clip_visual)
+        self.checkpointer = AsyncCheckpointer()
+        self.profiler = TorchProfiler(trigger_file=config.profile_trigger)
+        if config.profile_steps > 0:
+            self.profiler.arm_steps(config.profile_steps)
+
+    def _to_device(self, images: torch.Tensor, labels: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        non_blocking = self.device.type == 'cuda'
+        images = images.to(self.device, non_blocking=non_blocking, memory_format=self.memory_format)
+        return images, labels.to(self.device, non_blocking=non_blocking).view(-1)
+
+    def run_epoch(self, loader: DataLoader, train: bool) -> EpochStats:
+        """One pass over a loader; trains when train is True"""
+        model = self.model
+        model.train(train)
+        model.clip_visual.eval()  # frozen backbone always runs in eval mode
+
+        loss_sum = torch.zeros((), device=self.device)
+        correct = torch.zeros((), device=self.device)
+        samples = 0
+        data_seconds = 0.0
+        steps = len(loader)
+        accumulation = max(1, self.config.accumulation_steps)
+
+        if train:
+            self.optimizer.zero_grad(set_to_none=True)
+        start = time.perf_counter()
+        wait_start = start
+        with torch.set_grad_enabled(train):
+            for step, (images, labels) in enumerate(loader):
+                data_seconds += time.perf_counter() - wait_start
+                if train:
+                    self.profiler.poll_trigger()
+                with self.profiler.step() if train else nullcontext():
+                    images, labels = self._to_device(images, labels)
+
+                    outputs = self.forward(images).view(-1)
+                    loss = self.criterion(outputs, labels)
+
+                    if train:
+                        (loss / accumulation).backward()
+                        if (step + 1) % accumulation == 0 or step + 1 == steps:
+                            self.optimizer.step()
+                            self.optimizer.zero_grad(set_to_none=True)
+
+                # Stays on the device; read once at the end of the epoch
+                loss_sum += loss.detach() * labels.numel()
+                correct += ((outputs.detach() > 0.5).float() == labels).sum()
+                samples += labels.numel()
+                wait_start = time.perf_counter()
+
+        total_loss, total_correct = torch.stack([loss_sum, correct]).tolist()
+        seconds = time.perf_counter() - start
+        samples = max(samples, 1)
+        return EpochStats(
+            loss=total_loss / samples,
+            accuracy=total_correct / samples,
+            samples=samples,
+            seconds=seconds,
+            data_seconds=data_seconds,
+            compute_seconds=seconds - data_seconds,
+        )
+
+    def save_head(self, path: Path, epoch: int, val: EpochStats) -> None:
+        """Queue a head-only checkpoint; the write happens on the checkpointer's thread"""
+        checkpoint = build_checkpoint(
+            self.model, self.backbone,
+            optimizer=self.optimizer,
+            scheduler=self.scheduler,
+            epoch=epoch,
+            metrics={'val_loss': val.loss, 'val_acc': val.accuracy},
+        )
+        self.checkpointer.save(checkpoint, path)
+
+    def fit(self, train_loader: DataLoader, val_loader: DataLoader, out_path: Path) -> Dict[str, List[float]]:
+        """Train with ReduceLROnPlateau and early stopping, keeping the best head by val loss"""
+        history: Dict[str, List[float]] = {
+            'train_loss': [], 'train_acc': [], 'val_loss': [], 'val_acc': [], 'samples_per_sec': [],
+        }
+        best_val_loss = float('inf')
+        patience_counter = 0
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            for epoch in range(self.config.num_epochs):
+                train = self.run_epoch(train_loader, train=True)
+                val = self.run_epoch(val_loader, train=False)
+
+                values = (train.loss, train.accuracy, val.loss, val.accuracy, train.samples_per_sec)
+                for key, value in zip(history, values):
+                    history[key].append(value)
+                ProjectLogger.log_training_metrics(
+                    epoch + 1, train.loss, val.loss, train.accuracy, val.accuracy,
+                    samples_per_sec=train.samples_per_sec,
+                    data_seconds=train.data_seconds,
+                    compute_seconds=train.compute_seconds,
+                )
+
+                self.scheduler.step(val.loss)
+
+                if val.loss < best_val_loss:
+                    best_val_loss = val.loss
+                    patience_counter = 0
+                    self.save_head(out_path, epoch, val)
+                    logger.info("Saving best head to %s", out_path)
+                else:
+                    patience_counter += 1
+                    if patience_counter >= self.config.patience:
+                        logger.info("Early stopping triggered")
+                        break
+        finally:
+            self.profiler.close()
+            # The best checkpoint is on disk once fit returns, and the writer thread is gone
+            self.checkpointer.close()
+        return history
+
+
+def train(
+    data_root: Path,
+    out_path: Path,
+    config: TrainerConfig,
+    packaged: Optional[Path] = None,
+    index_path: Optional[Path] = None,
+) -> Dict[str, List[float]]:
+    """Build data, model and trainer from paths and run the training"""
+    torch.manual_seed(config.seed)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    splits = load_splits(data_root, index_path, random_state=config.seed)
+    train_dataset = FaceDataset(*splits['train'], transform=build_train_transform())
+    val_dataset = FaceDataset(*splits['val'], transform=build_preprocess())
+    ProjectLogger.log_data_info('train', len(train_dataset), 2)
+    ProjectLogger.log_data_info('val', len(val_dataset), 2)
+
+    model = load_backbone(device, packaged)
+    trainer = Trainer(model, config, device)
+    return trainer.fit(
+        build_loader(train_dataset, config, shuffle=True, device=device),
+        build_loader(val_dataset, config, shuffle=False, device=device),
+        out_path,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    defaults = TrainerConfig()
+    parser = argparse.ArgumentParser(description="Train the classifier head end-to-end on images")
+    parser.add_argument('--data-root', required=True, help="Folder with the source sub-folders")
+    parser.add_argument('--index', default=None, help="SQLite dataset index to take the splits from")
+    parser.add_argument('--packaged', default=None,
+                        help="Packaged model (src.models.package) to take the backbone from instead of CLIP")
+    parser.add_argument('--out', default='models/best_head.pth', help="Best head checkpoint path")
+    parser.add_argument('--epochs', type=int, default=defaults.num_epochs)
+    parser.add_argument('--batch-size', type=int, default=defaults.batch_size)
+    parser.add_argument('--lr', type=float, default=defaults.learning_rate)
+    parser.add_argument('--patience', type=int, default=defaults.patience)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--num-workers', type=int, default=defaults.num_workers)
+    parser.add_argument('--prefetch-factor', type=int, default=defaults.prefetch_factor,
+                        help="Batches loaded in advance per worker")
+    parser.add_argument('--no-persistent-workers', action='store_true')
+    parser.add_argument('--pin-memory', action=argparse.BooleanOptionalAction, default=None,
+                        help="Page-locked batches (default: on when training on CUDA)")
+    parser.add_argument('--accumulation-steps', type=int, default=defaults.accumulation_steps,
+                        help="Batches per optimizer step")
+    parser.add_argument('--bf16', action='store_true', help="bfloat16 autocast (CPU or CUDA)")
+    parser.add_argument('--channels-last', action='store_true', help="channels_last inputs and weights")
+    parser.add_argument('--compile', action='store_true', help="torch.compile the model")
+    parser.add_argument('--profile-steps', type=int, default=0,
+                        help="Profile the first N training steps with torch.profiler (traces in logs/profiles)")
+    parser.add_argument('--profile-trigger', default=None,
+                        help='Poll this file for {"steps": N} to profile N steps of a running training')
+    args = parser.parse_args(argv)
+
+    config = TrainerConfig(
+        num_epochs=args.epochs,
+        batch_size=args.batch_size,
+        learning_rate=args.lr,
+        patience=args.patience,
+        seed=args.seed,
+        num_workers=args.num_workers,
+        prefetch_factor=args.prefetch_factor,
+        persistent_workers=not args.no_persistent_workers,
+        pin_memory=args.pin_memory,
+        accumulation_steps=args.accumulation_steps,
+        bf16=args.bf16,
+        channels_last=args.channels_last,
+        compile=args.compile,
+        profile_steps=args.profile_steps,
+        profile_trigger=args.profile_trigger,
+    )
+    train(
+        Path(args.data_root), Path(args.out), config,
+        packaged=Path(args.packaged) if args.packaged else None,
+        index_path=Path(args.index) if args.index else None,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Opt-in torch.profiler sessions for training steps and API requests.
+
+torch.profiler only records the thread it was started on, so every session
+runs on the thread doing the work:
+
+    training  the next N training steps, wrapped by TorchProfiler.step()
+    serving   a sampled fraction of /predict requests is decoded and run
+              through the backend unbatched on the inference thread, under
+              the profiler (profile_call)
+
+The model and the serving path mark their stages with record_function
+ranges (decode, preprocess, backbone, head), so they show up as named blocks
+in the trace and as rows in the summary. Each session writes a Chrome trace
+(chrome://tracing or ui.perfetto.dev) and a top-ops table to
+<logs>/profiles/, and logs the table. Exports run on a background thread.
+
+Sessions are armed from config (TrainerConfig.profile_steps, the API's
+PROFILE_REQUESTS), from the API's /admin/profile endpoint, or by writing a
+trigger file ({"steps": N}) that a running trainer picks up, so profiling
+never needs a restart. A session still running when the profiler is closed
+(more steps armed than were left) is stopped and exported with the steps it
+recorded.
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import torch
+from torch.profiler import ProfilerActivity, profile, record_function
+
+from configs.logger import ProjectLogger, get_logger
+
+
+logger = get_logger(__name__)
+
+SORT_BY = 'self_cpu_time_total'
+MAX_HISTORY = 20  # sessions listed by status()
+
+
+class TorchProfiler:
+    """
+    Arms and runs torch.profiler sessions, and exports their results
+
+    Args:
+        out_dir: Where traces and summaries go (default: <logs>/profiles)
+        profile_memory: Record tensor allocations and frees
+        record_shapes: Record input shapes of every op
+        with_stack: Record Python stacks (much larger traces)
+        row_limit: Rows of the top-ops summary
+        trigger_file: JSON file polled by poll_trigger() to arm a session
+    """
+
+    def __init__(
+        self,
+        out_dir: Optional[Union[str, Path]] = None,
+        profile_memory: bool = True,
+        record_shapes: bool = True,
+        with_stack: bool = False,
+        row_limit: int = 25,
+        trigger_file: Optional[Union[str, Path]] = None,
+    ):
+        self.out_dir = Path(out_dir) if out_dir else Path(ProjectLogger.get_log_dir()) / 'profiles'
+        self.profile_memory = profile_memory
+        self.record_shapes = record_shapes
+        self.with_stack = with_stack
+        self.row_limit = row_limit
+        self.trigger_file = Path(trigger_file) if trigger_file else None
+
+        self._lock = threading.Lock()
+        self._steps = 0          # training steps of the next session
+        self._fraction = 0.0     # share of requests to profile
+        self._traces = 0         # request sessions left
+        self._active: Optional[List[Any]] = None  # [profile, steps left, steps] of a running training session
+        self._exporter: Optional[ThreadPoolExecutor] = None
+        self._sessions = 0
+        self.history: List[Dict] = []
+
+    @property
+    def activities(self) -> List[ProfilerActivity]:
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        return activities
+
+    def arm_steps(self, steps: int) -> None:
+        """Profile the next steps training steps"""
+        if steps < 1:
+            raise ValueError("steps must be >= 1")
+        with self._lock:
+            self._steps = steps
+        logger.info("Profiling armed for the next %s training steps", steps)
+
+    def arm_requests(self, fraction: float, traces: int = 1) -> None:
+        """Profile each request with probability fraction, until traces requests were profiled"""
+        if not 0.0 < fraction <= 1.0:
+            raise ValueError("fraction must be in (0, 1]")
+        if traces < 1:
+            raise ValueError("traces must be >= 1")
+        with self._lock:
+            self._fraction, self._traces = fraction, traces
+        logger.info("Profiling armed for %s requests at a %.1f%% sampling rate", traces, 100 * fraction)
+
+    def disarm(self) -> None:
+        """Cancel armed sessions; a running training session finishes its steps"""
+        with self._lock:
+            self._steps, self._fraction, self._traces = 0, 0.0, 0
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'armed_steps': self._steps,
+                'training_session_active': self._active is not None,
+                'request_fraction': self._fraction,
+                'request_traces_left': self._traces,
+                'out_dir': str(self.out_dir),
+                'sessions': list(self.history),
+            }
+
+    def poll_trigger(self, serving: bool = False) -> bool:
+        """
+        Arm from the trigger file if it exists, then remove it; cheap enough to call every step
+
+        Args:
+            serving: Also accept request sampling ({"fraction": F, "traces": K});
+                rejected by default, since only the API has requests to sample
+        """
+        if self.trigger_file is None or not self.trigger_file.exists():
+            return False
+        try:
+            with open(self.trigger_file, 'r', encoding='utf-8') as f:
+                request = json.load(f)
+            if 'steps' in request:
+                self.arm_steps(int(request['steps']))
+            elif not serving:
+                raise ValueError('expected {"steps": N}; request sampling needs a serving process')
+            else:
+                self.arm_requests(float(request['fraction']), int(request.get('traces', 1)))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring profiling trigger %s: %s", self.trigger_file, e)
+        finally:
+            self.trigger_file.unlink(missing_ok=True)
+        return True
+
+    def _profile(self) -> profile:
+        return profile(
+            activities=self.activities,
+            profile_memory=self.profile_memory,
+            record_shapes=self.record_shapes,
+            with_stack=self.with_stack,
+        )
+
+    def _export(self, prof: profile, tag: str, count: int) -> None:
+        """Write the trace and summary of a stopped session on the export thread"""
+        with self._lock:
+            self._sessions += 1
+            stem = f"{tag}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{self._sessions}"
+
+        def write() -> None:
+            try:
+                self.out_dir.mkdir(parents=True, exist_ok=True)
+                trace_path = self.out_dir / f"{stem}.trace.json"
+                summary_path = self.out_dir / f"{stem}.summary.txt"
+                prof.export_chrome_trace(str(trace_path))
+                table = prof.key_averages().table(sort_by=SORT_BY, row_limit=self.row_limit)
+                summary_path.write_text(table, encoding='utf-8')
+                logger.info("Profile of %s %s step(s) written to %s\n%s", count, tag, trace_path, table)
+                with self._lock:
+                    self.history.append({'tag': tag, 'count': count, 'trace': str(trace_path),
+                                         'summary': str(summary_path)})
+                    del self.history[:-MAX_HISTORY]
+            except Exception as e:
+                logger.error("Failed to export %s profile: %s", tag, e)
+
+        with self._lock:
+            if self._exporter is None:
+                self._exporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-export')
+            exporter = self._exporter
+        exporter.submit(write)
+
+    @contextmanager
+    def step(self, name: str = 'train_step'):
+        """
+        Wrap one training step; profiled while a step session is armed
+
+        A session starts with the first step after arming and stops after its
+        last step, so the data loading between those steps is in the trace.
+        """
+        if self._active is None and self._steps <= 0:
+            yield
+            return
+
+        if self._active is None:
+            with self._lock:
+                steps, self._steps = self._steps, 0
+            prof = self._profile()
+            prof.start()
+            self._active = [prof, steps, steps]
+        try:
+            with record_function(name):
+                yield
+        finally:
+            self._active[1] -= 1
+            if self._active[1] <= 0:
+                prof, _, steps = self._active
+                self._active = None
+                prof.stop()
+                self._export(prof, 'train', steps)
+
+    def sample_request(self) -> bool:
+        """Whether to profile this request; a positive answer uses up one trace"""
+        if self._traces <= 0 or random.random() >= self._fraction:
+            return False
+        with self._lock:
+            if self._traces <= 0:
+                return False
+            self._traces -= 1
+            return True
+
+    def profile_call(self, tag: str, fn: Callable, *args) -> Any:
+        """Run fn(*args) under the profiler on the calling thread and export the session"""
+        prof = self._profile()
+        prof.start()
+        try:
+            with record_function(tag):
+                return fn(*args)
+        finally:
+            prof.stop()
+            self._export(prof, tag, 1)
+
+    def close(self) -> None:
+        """
+        Stop and export a running step session, then wait for pending exports
+
+        Call it from the thread that runs the steps: torch.profiler has to be
+        stopped on the thread it was started on.
+        """
+        if self._active is not None:
+            prof, left, steps = self._active
+            self._active = None
+            prof.stop()
+            logger.info("Profiling stopped after %s of %s armed training steps", steps - left, steps)
+            self._export(prof, 'train', steps - left)
+        with self._lock:
+            exporter, self._exporter = self._exporter, None
+        if exporter is not None:
+            exporter.shutdown(wait=True)
@@ -0,0 +1,177 @@
+"""
+src.data.fetch against a local http.server stand-in that honours Range and If-Range.
+"""
+import hashlib
+import json
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.data import fetch
+
+
+class RangeServerState:
+    def __init__(self, content: bytes, etag: str = '"v1"'):
+        self.content = content
+        self.etag = etag
+        self.content_type = 'application/zip'
+        self.cut_after = None  # bytes sent before dropping the next response
+        self.requests = []
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        state = self.server.state
+        state.requests.append({'range': self.headers.get('Range'), 'if_range': self.headers.get('If-Range')})
+        body, total = state.content, len(state.content)
+
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and (if_range is None or if_range == state.etag):
+            start = int(range_header.split('=')[1].rstrip('-'))
+            if start >= total:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{total}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{total - 1}/{total}')
+            payload = body[start:]
+        else:
+            self.send_response(200)
+            payload = body
+        self.send_header('Content-Type', state.content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('ETag', state.etag)
+        self.end_headers()
+
+        if state.cut_after is not None:
+            payload, state.cut_after = payload[:state.cut_after], None
+            self.close_connection = True
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def server():
+    state = RangeServerState(bytes(range(256)) * 400)  # 102 400 bytes
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.state = state
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}/archive.zip', state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(fetch.time, 'sleep', lambda seconds: None)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_partial(dest, url, data: bytes, validator='"v1"'):
+    part = dest.with_name(dest.name + '.part')
+    part.write_bytes(data)
+    if validator is not None:
+        part.with_name(part.name + '.json').write_text(json.dumps({'url': url, 'validator': validator}))
+    return part
+
+
+def test_download_verifies_checksum(server, tmp_path):
+    url, state = server
+    dest = fetch.download_file(url, tmp_path / 'a.zip', sha256=_sha256(state.content))
+    assert dest.read_bytes() == state.content
+    assert not (tmp_path / 'a.zip.part').exists()
+    assert not (tmp_path / 'a.zip.part.json').exists()
+
+
+def test_checksum_mismatch_removes_partial(server, tmp_path):
+    url, _ = server
+    with pytest.raises(fetch.ChecksumError):
+        fetch.download_file(url, tmp_path / 'a.zip', sha256='0' * 64)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_existing_download_is_kept(server, tmp_path):
+    url, state = server
+    dest = tmp_path / 'a.zip'
+    dest.write_bytes(state.content)
+    fetch.download_file(url, dest, sha256=_sha256(state.content))
+    assert state.requests == []
+
+
+def test_interrupted_download_resumes_with_if_range(server, tmp_path):
+    url, state = server
+    state.cut_after = 40000
+    dest = fetch.download_file(url, tmp_path / 'a.zip', sha256=_sha256(state.content))
+    assert dest.read_bytes() == state.content
+    assert state.requests[-1] == {'range': 'bytes=40000-', 'if_range': '"v1"'}
+
+
+def test_changed_file_is_not_spliced(server, tmp_path):
+    url, state = server
+    state.cut_after = 40000
+    with pytest.raises(Exception):
+        fetch.download_file(url, tmp_path / 'a.zip', retries=0)
+    assert (tmp_path / 'a.zip.part').stat().st_size == 40000
+
+    state.content, state.etag = bytes(reversed(state.content)), '"v2"'
+    dest = fetch.download_file(url, tmp_path / 'a.zip')
+    assert dest.read_bytes() == state.content
+
+
+def test_partial_without_validator_restarts(server, tmp_path):
+    url, state = server
+    _write_partial(tmp_path / 'a.zip', url, b'x' * 40000, validator=None)
+    dest = fetch.download_file(url, tmp_path / 'a.zip')
+    assert dest.read_bytes() == state.content
+    assert state.requests == [{'range': None, 'if_range': None}]
+
+
+def test_416_promotes_complete_partial(server, tmp_path):
+    url, state = server
+    _write_partial(tmp_path / 'a.zip', url, state.content)
+    dest = fetch.download_file(url, tmp_path / 'a.zip', sha256=_sha256(state.content))
+    assert dest.read_bytes() == state.content
+    assert len(state.requests) == 1
+
+
+def test_416_with_stale_larger_partial_restarts(server, tmp_path):
+    url, state = server
+    _write_partial(tmp_path / 'a.zip', url, b'y' * 200000)
+    dest = fetch.download_file(url, tmp_path / 'a.zip')
+    assert dest.read_bytes() == state.content
+    assert state.requests[-1] == {'range': None, 'if_range': None}
+
+
+def test_html_page_is_rejected(server, tmp_path):
+    url, state = server
+    state.content_type = 'text/html; charset=utf-8'
+    with pytest.raises(fetch.UnexpectedContentError):
+        fetch.download_file(url, tmp_path / 'a.zip')
+    assert not (tmp_path / 'a.zip').exists()
+
+
+def test_extract_skips_existing_members(tmp_path):
+    zip_path = tmp_path / 'images.zip'
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i in range(5):
+            archive.writestr(f'sub/{i}.jpg', bytes([i]) * (1000 + i))
+    out_dir = tmp_path / 'out'
+
+    assert fetch.extract_zip(zip_path, out_dir, num_workers=2)['extracted'] == 5
+    (out_dir / 'sub' / '3.jpg').write_bytes(b'corrupt')
+    stats = fetch.extract_zip(zip_path, out_dir, num_workers=2)
+    assert (stats['extracted'], stats['skipped'], stats['failed']) == (1, 4, [])
+    assert (out_dir / 'sub' / '3.jpg').read_bytes() == bytes([3]) * 1003